@@ -0,0 +1,77 @@
+# Backend/benchmarks/json_bench.py
+"""
+Record response encoding: the old path (to_dict(orient="records") →
+jsonable_encoder → JSONResponse) vs Backend/responses.py (summary via
+FastJSONResponse's encoder, records written from the columns).
+
+    python -m Backend.benchmarks.json_bench [--rows 100000]
+
+Both bodies are decoded and compared before timing is reported.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from Backend import responses
+
+
+def _frame(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    doctors = np.array(["د. محمد العتيبي", "Yosaf Almotairy", "Sara Ali", "نورة الحربي"], dtype=object)
+    net = rng.uniform(0, 6000, n).round(3)
+    net[rng.random(n) < 0.05] = np.nan
+    return pd.DataFrame(
+        {
+            "id": np.arange(1, n + 1),
+            "doctor_name": doctors[rng.integers(0, len(doctors), n)],
+            "service_description": "G.P  Consultation",
+            "quantity": rng.integers(1, 20, n).astype(float),
+            "net_amount": net,
+            "date": "2025-09-04",
+            "has_alert": rng.random(n) < 0.1,
+        }
+    )
+
+
+def _time(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100_000)
+    args = ap.parse_args()
+
+    df = _frame(args.rows).fillna("")
+    payload = {"total_operations": len(df), "alerts_count": int(df["has_alert"].sum())}
+
+    def old():
+        content = {**payload, "records": df.to_dict(orient="records")}
+        return JSONResponse(jsonable_encoder(content)).body
+
+    def new():
+        return responses.records_response(payload, df).body
+
+    t_old, body_old = _time(old)
+    t_new, body_new = _time(new)
+    if json.loads(body_old) != json.loads(body_new):
+        raise SystemExit("records_response output differs from the old response")
+
+    encoder = "orjson" if responses.orjson is not None else "json"
+    print(f"rows={args.rows:,} encoder={encoder} bytes={len(body_new):,}")
+    print(f"{'path':<18}{'seconds':>10}")
+    print(f"{'to_dict+encoder':<18}{t_old:>10.3f}")
+    print(f"{'records_response':<18}{t_new:>10.3f}  ({t_old / t_new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
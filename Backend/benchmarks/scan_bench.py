@@ -0,0 +1,69 @@
+# Backend/benchmarks/scan_bench.py
+"""
+Substring search over distinct values: the per-value Python loop
+(search_index.scan_values) vs ValueText.find in Backend/parallel_scan.py,
+in-process and, when HASEEF_SCAN_PROCESSES > 1, sharded across the pool.
+
+    python -m Backend.benchmarks.scan_bench [--distinct 500000] [--processes 4]
+
+Every result is checked against the loop before timing is reported.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from Backend import parallel_scan as P
+from Backend.search_index import scan_values
+
+_PARTS = ["محمد", "العتيبي", "Yosaf", "Almotairy", "J45", "E11.9", "PARACETAMOL", "500MG", "نورة", "Sara"]
+
+
+def _values(n: int) -> np.ndarray:
+    rnd = random.Random(42)
+    out = {f"{' '.join(rnd.choices(_PARTS, k=3))} {i}" for i in range(n)}
+    return np.array(sorted(out), dtype=object)
+
+
+def _time(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--distinct", type=int, default=500_000)
+    ap.add_argument("--processes", type=int, default=P.PROCESSES)
+    args = ap.parse_args()
+
+    values = _values(args.distinct)
+    keys = ["ال", "9", "Yosaf Alm", "MG 1"]
+
+    P.PROCESSES, P.MIN_CHARS = 1, 0
+    local = P.ValueText.of(values)
+    P.PROCESSES = args.processes
+    sharded = P.ValueText.of(values) if args.processes > 1 else None
+
+    print(f"{len(values):,} values, {local.size:,} code points, {args.processes} processes")
+    for key in keys:
+        expected = scan_values(values, key)
+        assert np.array_equal(local.find(key), expected), key
+        if sharded is not None:
+            assert np.array_equal(sharded.find(key), expected), key
+        line = f"  {key!r:14} loop {_time(lambda: scan_values(values, key)):.4f}s"
+        line += f"  vectorized {_time(lambda: local.find(key)):.4f}s"
+        if sharded is not None:
+            line += f"  sharded {_time(lambda: sharded.find(key)):.4f}s"
+        print(f"{line}  ({len(expected):,} hits)")
+    P.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# Backend/broadcast.py
+"""
+In-process pub/sub for server-sent events.
+
+Each open stream subscribes with its own bounded asyncio queue. publish()
+puts the item on every queue right away, so a waiting stream wakes on the
+next loop iteration, and an idle stream costs nothing but its queue (no
+polling). A subscriber whose queue is full is too slow to keep up: it is
+dropped instead of growing memory or holding back the others; it still gets
+what is already queued, then its stream ends and the client reconnects.
+
+publish() may be called from any thread (e.g. the query executor or the
+dataset watcher); items are handed to each subscriber's event loop with
+call_soon_threadsafe.
+
+Every published item gets an event id, one more than the previous. Ids start
+at the process start time in microseconds, so they keep increasing across
+restarts and an id from an older process is never mistaken for a current
+one. The last HASEEF_SSE_REPLAY items stay in a ring buffer: subscribe(after)
+hands a reconnecting stream everything published after the id it last saw
+(its Last-Event-ID), taken under the same lock as publish(), so nothing is
+lost or sent twice between the replay and the live items. When that id is
+older than the buffer (or unknown) the history is incomplete and the stream
+has to resync instead. A dropped slow subscriber resumes the same way.
+
+    HASEEF_SSE_QUEUE   items buffered per subscriber before it is dropped (default 256)
+    HASEEF_SSE_REPLAY  recent items kept for Last-Event-ID replay (default 512, 0 = off)
+    HASEEF_SSE_HEARTBEAT  seconds of silence before a stream sends a keep-alive
+                          comment (default 15, 0 = off)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Generic, Iterator, List, Optional, Set, Tuple, TypeVar
+
+HEARTBEAT = float(os.getenv("HASEEF_SSE_HEARTBEAT", "15"))
+
+T = TypeVar("T")
+Event = Tuple[int, T]  # (event id, item)
+_TIMEOUT: Any = object()  # يضعه مؤقّت get(timeout) في طابور فارغ
+
+
+class Subscriber(Generic[T]):
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue_size: int) -> None:
+        self.loop = loop
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+        # تُملأ في subscribe(): آخر id نُشر قبل الاشتراك، وما فات العميل منذ after
+        # (None إذا لم يُطلب استئناف أو كان السجل ناقصًا)
+        self.last_id = 0
+        self.backlog: Optional[List[Event]] = None
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """
+        (id, العنصر) التالي، أو None بعد إغلاق الاشتراك وتفريغ ما في الطابور.
+        مع timeout يرفع asyncio.TimeoutError إذا لم يصل شيء خلاله.
+        """
+        if self.closed and self.queue.empty():
+            return None
+        if not timeout or not self.queue.empty():
+            return await self.queue.get()
+        # مؤقّت على الـ loop بدل wait_for (الذي يلف get() في task لكل رسالة)
+        timer = self.loop.call_later(timeout, self._wake)
+        try:
+            item = await self.queue.get()
+        finally:
+            timer.cancel()
+        if item is _TIMEOUT:
+            raise asyncio.TimeoutError
+        return item
+
+    def _wake(self) -> None:
+        if self.queue.empty():
+            self.queue.put_nowait(_TIMEOUT)
+
+    def close(self) -> None:
+        """ينهي الاشتراك: get() يعيد ما بقي في الطابور ثم None."""
+        if not self.closed:
+            self.closed = True
+            try:
+                self.queue.put_nowait(None)  # يوقظ من ينتظر في get()
+            except asyncio.QueueFull:
+                pass  # لا أحد ينتظر طابورًا ممتلئًا
+
+
+class Broadcaster(Generic[T]):
+    def __init__(self, queue_size: int, replay: int = 0) -> None:
+        self.queue_size = max(1, queue_size)
+        self._subs: Set[Subscriber[T]] = set()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {"published": 0, "delivered": 0, "dropped": 0}
+        self._seq = time.time_ns() // 1000
+        self._recent: Deque[Event] = deque(maxlen=max(0, replay))
+
+    def _since(self, after: int) -> Optional[List[Event]]:
+        """ما نُشر بعد after، أو None إذا سقط بعضه من الـ buffer أو كان after غريبًا (تحت القفل)."""
+        oldest = self._recent[0][0] if self._recent else self._seq + 1
+        if not oldest - 1 <= after <= self._seq:
+            return None
+        return [e for e in self._recent if e[0] > after]
+
+    @contextmanager
+    def subscribe(self, after: Optional[int] = None) -> Iterator[Subscriber[T]]:
+        """
+        اشتراك طوال كتلة with (داخل event loop)؛ يُلغى عند الخروج أو الإلغاء.
+        after: آخر id وصل العميل (Last-Event-ID)؛ ما نُشر بعده يوضع في sub.backlog.
+        """
+        sub: Subscriber[T] = Subscriber(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            sub.last_id = self._seq
+            if after is not None:
+                sub.backlog = self._since(after)
+            self._subs.add(sub)
+        try:
+            yield sub
+        finally:
+            with self._lock:
+                self._subs.discard(sub)
+
+    def publish(self, item: T) -> int:
+        """ينشر العنصر لكل المشتركين ويعيد الـ id الذي أخذه."""
+        with self._lock:
+            self._seq += 1
+            event = (self._seq, item)
+            self._recent.append(event)
+            subs = list(self._subs)
+            self._stats["published"] += 1
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for sub in subs:
+            if sub.loop is current:
+                self._offer(sub, event)
+                continue
+            try:
+                sub.loop.call_soon_threadsafe(self._offer, sub, event)
+            except RuntimeError:
+                # loop أُغلق: الاشتراك لم يعد له من يقرؤه
+                with self._lock:
+                    self._subs.discard(sub)
+        return event[0]
+
+    def _offer(self, sub: Subscriber[T], event: Event) -> None:
+        if sub.closed:
+            return
+        try:
+            sub.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # مشترك بطيء: نفصله بدل أن تكبر الذاكرة أو يتأخر الباقون
+            sub.closed = True
+            with self._lock:
+                self._subs.discard(sub)
+                self._stats["dropped"] += 1
+            return
+        with self._lock:
+            self._stats["delivered"] += 1
+
+    def close(self) -> None:
+        """ينهي كل الاشتراكات (عند إيقاف السيرفر)."""
+        with self._lock:
+            subs, self._subs = list(self._subs), set()
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub.close)
+            except RuntimeError:
+                pass
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "subscribers": len(self._subs),
+                "queue_size": self.queue_size,
+                "last_id": self._seq,
+                "replay": len(self._recent),
+            }
+
+
+notification_bus: Broadcaster = Broadcaster(
+    int(os.getenv("HASEEF_SSE_QUEUE", "256")),
+    replay=int(os.getenv("HASEEF_SSE_REPLAY", "512")),
+)
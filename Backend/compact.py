@@ -0,0 +1,129 @@
+# Backend/compact.py
+"""
+Compact in-memory layout for the dataset views.
+
+The low-cardinality text columns of a view (doctor, company, claim type,
+contract, refer/emer flags, ICD forms and their norm_* counterparts) are
+stored as pandas categoricals: one small integer code per row plus the
+distinct values once. The distinct strings go through a process-wide pool
+(sys.intern), so a doctor name shared by the medical and drug views, or kept
+across dataset versions, is a single string object. Views register the
+columns to encode (see DatasetRegistry.register); the registry encodes every
+built, snapshot-loaded and appended frame, so the layout never depends on how
+a version was produced.
+
+Output paths call decode() on the page/chunk they emit, so API responses are
+unchanged. memory_report() backs /datasets/memory: bytes per column counting
+each string object once, next to what the same column costs as plain objects.
+"""
+from __future__ import annotations
+
+import sys
+from typing import Any, Dict, Iterable, Optional, Set
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+def _pooled(values: Iterable[Any]) -> pd.Index:
+    return pd.Index([sys.intern(v) if type(v) is str else v for v in values], dtype=object)
+
+
+def encode(frame: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+    """يحوّل الأعمدة المعطاة (الموجودة فقط) إلى category بقيم من المخزن المشترك، في نفس الإطار."""
+    for col in columns:
+        if col not in frame.columns:
+            continue
+        s = frame[col]
+        cat = s.array if isinstance(s.dtype, pd.CategoricalDtype) else pd.Categorical(s.to_numpy())
+        frame[col] = pd.Categorical.from_codes(cat.codes, categories=_pooled(cat.categories))
+    return frame
+
+
+def concat(old: pd.DataFrame, part: pd.DataFrame) -> pd.DataFrame:
+    """old ثم part (صفوف ملحقة)، مع دمج قيم الأعمدة المرمّزة بدل رجوعها إلى object."""
+    frame = pd.concat([old, part], ignore_index=True)
+    for col in old.columns[old.dtypes == "category"]:
+        if col not in part.columns or not isinstance(part[col].dtype, pd.CategoricalDtype):
+            continue
+        pair = [old[col].array, part[col].array]
+        try:
+            merged = union_categoricals(pair, sort_categories=True)
+        except TypeError:
+            merged = union_categoricals(pair)  # قيم لا تقبل الترتيب (نصوص وأرقام معًا)
+        frame[col] = merged
+    return frame
+
+
+def decode(df: pd.DataFrame) -> pd.DataFrame:
+    """نسخة بأعمدة object بدل category (لصفوف الصفحة/الدفعة قبل الإخراج)."""
+    cats = df.columns[df.dtypes == "category"]
+    if len(cats) == 0:
+        return df
+    return df.astype({col: object for col in cats})
+
+
+# ========================= Memory report =========================
+
+
+def _objects_bytes(values: np.ndarray, seen: Set[int]) -> int:
+    total = 0
+    for v in values:
+        if id(v) not in seen:
+            seen.add(id(v))
+            total += sys.getsizeof(v)
+    return total
+
+
+def array_bytes(arr: np.ndarray, seen: Optional[Set[int]] = None) -> int:
+    """حجم المصفوفة، ومع object حجم كائناتها (كل كائن يُحسب مرة واحدة عبر seen)."""
+    total = arr.nbytes
+    if arr.dtype == object:
+        total += _objects_bytes(arr.ravel(), set() if seen is None else seen)
+    return total
+
+
+def column_bytes(s: pd.Series, seen: Set[int]) -> Dict[str, Any]:
+    """bytes: الحجم الفعلي. object_bytes: حجم نفس العمود كمؤشرات object."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        cats = np.asarray(s.cat.categories, dtype=object)
+        used = array_bytes(s.cat.codes.to_numpy(), seen) + array_bytes(cats, seen)
+        plain = len(s) * 8 + _objects_bytes(cats, set())
+    else:
+        values = s.to_numpy()
+        used = array_bytes(values, seen)
+        plain = len(s) * 8 + _objects_bytes(values, set()) if values.dtype == object else values.nbytes
+    return {"dtype": str(s.dtype), "bytes": int(used), "object_bytes": int(plain)}
+
+
+def frame_report(frame: pd.DataFrame, seen: Set[int]) -> Dict[str, Any]:
+    columns = {col: column_bytes(frame[col], seen) for col in frame.columns}
+    return {
+        "rows": int(len(frame)),
+        "bytes": sum(c["bytes"] for c in columns.values()),
+        "object_bytes": sum(c["object_bytes"] for c in columns.values()),
+        "columns": columns,
+    }
+
+
+def object_bytes(obj: Any, seen: Set[int]) -> int:
+    """الحجم التقريبي لبنية فهارس/تجميعات: مصفوفات NumPy وما تحويه من كائنات."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return array_bytes(obj, seen)
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return array_bytes(np.asarray(obj), seen)
+    if isinstance(obj, (str, bytes, int, float)):
+        return sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            object_bytes(k, seen) + object_bytes(v, seen) for k, v in obj.items()
+        )
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(object_bytes(v, seen) for v in obj)
+    if hasattr(obj, "__dict__"):
+        return sys.getsizeof(obj) + object_bytes(vars(obj), seen)
+    return sys.getsizeof(obj)
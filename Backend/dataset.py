@@ -0,0 +1,454 @@
+# Backend/dataset.py
+"""
+Process-wide cache for the Excel-backed datasets.
+
+The workbook is parsed once per (path, mtime, size) by Backend/ingest.py. Every
+router registers a view builder that turns that shared base frame into its own
+normalized projection; all views
+of a workbook are built together and published as a single entry, so when the
+file changes no request can see medical rows from one version and drug rows
+from another. Built views are persisted as columnar snapshots (see
+Backend/snapshot.py) so a cold start skips the openpyxl parse entirely.
+
+A view may also register an indexer; its search indexes (Backend/search_index.py)
+are built right after the frame and published in the same entry, so
+registry.view() always hands out a frame together with the indexes built
+from it. A rollup builder (Backend/rollups.py) works the same way for the
+pre-aggregated totals behind the /stats endpoints.
+
+With HASEEF_INCREMENTAL=1 a workbook that only grew at the end is not rebuilt:
+Backend/ingest.py reads just the appended rows, each view builds and indexes
+those rows alone, and the results are merged into a new entry: indexes through
+merge_indexes, rollups through the view's rollup_merge (Backend/rollups.py),
+and the view snapshots are rewritten by a background writer rather than in
+the request or watcher that applied the append. Anything else, or an append
+the ingest step cannot confirm, falls back to a full reload. It is opt-in
+because edits above the last known row are not detected in this mode. The row
+count and last row it matches on are kept in a source snapshot, so an entry
+loaded from snapshots can be extended too.
+
+When the background watcher (Backend/watcher.py) runs, requests never reload:
+they keep getting the published entry while the watcher rebuilds a changed
+workbook on a worker thread via refresh(), which swaps the new entry in with a
+single assignment once it is complete.
+
+Views also declare their low-cardinality text columns; every frame is stored
+with those columns dictionary-encoded over a shared string pool
+(Backend/compact.py), whether it was built, loaded from a snapshot or extended
+by an append. memory() reports the resulting footprint per view.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+from Backend import compact, ingest, snapshot
+from Backend.search_index import merge_indexes
+
+ViewBuilder = Callable[[pd.DataFrame], pd.DataFrame]  # base frame -> view
+ViewIndexer = Callable[[pd.DataFrame], Dict[str, Any]]  # view frame -> indexes
+ViewRollup = Callable[[pd.DataFrame], Dict[str, Any]]  # view frame -> aggregates
+RollupMerge = Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]  # old, delta -> merged
+PathResolver = Callable[[], Path]
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WORKBOOK = Path(__file__).resolve().parent / "data" / "medical_records.xlsx"
+
+
+def resolve_workbook_path(env_var: str = "MEDICAL_XLSX") -> Path:
+    """
+    يقرأ المسار من متغير البيئة إن وُجد،
+    وإلا يستخدم Backend/data/medical_records.xlsx.
+    """
+    env = os.getenv(env_var)
+    if env:
+        return Path(env).expanduser().resolve()
+    return DEFAULT_WORKBOOK
+
+
+def _stamp(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def incremental_enabled() -> bool:
+    return os.getenv("HASEEF_INCREMENTAL", "0") == "1"
+
+
+@dataclass
+class _Entry:
+    path: Path
+    stamp: Optional[Tuple[int, int]]
+    version: int
+    base: Optional[pd.DataFrame]
+    views: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    indexes: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    rollups: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # من قراءة الإكسل، أو من لقطة المصدر عند التحميل من اللقطات
+    source: Optional[ingest.SourceInfo] = None
+
+
+@dataclass
+class _View:
+    builder: ViewBuilder
+    resolve_path: PathResolver
+    columns: Tuple[str, ...]
+    indexer: Optional[ViewIndexer] = None
+    rollup: Optional[ViewRollup] = None
+    rollup_merge: Optional[RollupMerge] = None
+    categories: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class RecordView:
+    """إطار الـ view مع الفهارس والتجميعات المبنية منه ورقم نسخة البيانات."""
+
+    frame: pd.DataFrame
+    indexes: Dict[str, Any]
+    version: int
+    rollups: Dict[str, Any] = field(default_factory=dict)
+
+
+class DatasetRegistry:
+    def __init__(self) -> None:
+        self._views: Dict[str, _View] = {}
+        self._entries: Dict[Path, _Entry] = {}
+        self._lock = threading.Lock()
+        self._version = 0
+        # True أثناء عمل المراقب: إعادة التحميل تتم في الخلفية لا في الطلب
+        self.background_reload = False
+        # كاتب واحد للقطات بعد الإلحاق: الكتابة بالترتيب وخارج مسار التحميل
+        self._snapshot_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+        self._stats: Dict[str, Any] = {
+            "hits": 0,
+            "misses": 0,
+            "reloads": 0,
+            "appends": 0,
+            "appended_rows": 0,
+            "snapshot_hits": 0,
+            "snapshot_misses": 0,
+            "snapshot_writes": 0,
+            "last_reload_seconds": None,
+            "build_seconds": {},
+            "index_seconds": {},
+            "rollup_seconds": {},
+        }
+
+    # ---------- registration ----------
+    def register(
+        self,
+        name: str,
+        builder: ViewBuilder,
+        resolve_path: PathResolver = resolve_workbook_path,
+        columns: Iterable[str] = (),
+        indexer: Optional[ViewIndexer] = None,
+        rollup: Optional[ViewRollup] = None,
+        rollup_merge: Optional[RollupMerge] = None,
+        categories: Iterable[str] = (),
+    ) -> None:
+        """
+        columns: أعمدة المصدر التي يحتاجها الـ view (تحدد ما يُقرأ من الإكسل).
+        indexer: يبني فهارس البحث من إطار الـ view بعد تحميله.
+        rollup: يبني التجميعات الجاهزة (لـ /stats) من نفس الإطار.
+        rollup_merge: يدمج تجميعات الصفوف الملحقة في تجميعات النسخة السابقة
+            (بدونه تُعاد التجميعات على الإطار كاملًا عند الإلحاق).
+        categories: أعمدة نصية قليلة القيم تُخزّن مرمّزة (category).
+        """
+        self._views[name] = _View(
+            builder=builder,
+            resolve_path=resolve_path,
+            columns=tuple(columns),
+            indexer=indexer,
+            rollup=rollup,
+            rollup_merge=rollup_merge,
+            categories=tuple(categories),
+        )
+
+    # ---------- lookup ----------
+    def get(self, name: str) -> pd.DataFrame:
+        return self._entry(name).views[name]
+
+    def view(self, name: str) -> RecordView:
+        entry = self._entry(name)
+        return RecordView(
+            entry.views[name],
+            entry.indexes.get(name, {}),
+            entry.version,
+            entry.rollups.get(name, {}),
+        )
+
+    def _entry(self, name: str) -> _Entry:
+        spec = self._views.get(name)
+        if spec is None:
+            raise KeyError(f"unknown dataset view: {name}")
+        path = spec.resolve_path().resolve()
+        entry = self._entries.get(path)
+        if entry is not None and name in entry.views and (
+            self.background_reload or entry.stamp == _stamp(path)
+        ):
+            self._stats["hits"] += 1
+            return entry
+
+        with self._lock:
+            self._stats["misses"] += 1
+            # طلب آخر ربما أعاد التحميل أثناء انتظارنا للقفل
+            entry = self._entries.get(path)
+            stamp = _stamp(path)
+            if entry is None or (entry.stamp != stamp and not self.background_reload):
+                entry = self._append(entry, path, stamp) or self._reload(path, stamp)
+            elif name not in entry.views:
+                self._publish_view(name, entry)
+            return entry
+
+    def paths(self) -> list:
+        """ملفات المصدر المسجّلة (مرة واحدة لكل ملف)."""
+        return sorted({spec.resolve_path().resolve() for spec in self._views.values()})
+
+    def refresh(self, path: Path) -> bool:
+        """
+        يبني نسخة path من جديد إن لم تُحمّل بعد أو تغيّر الملف، وينشرها دفعة
+        واحدة. True = نُشرت نسخة جديدة.
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            stamp = _stamp(path)
+            if entry is not None and entry.stamp == stamp:
+                return False
+            self._append(entry, path, stamp) or self._reload(path, stamp)
+            return True
+
+    def pending_stamp(self, path: Path) -> Optional[Tuple[int, int]]:
+        """بصمة الملف إن اختلفت عن النسخة المنشورة منه، وإلا None."""
+        stamp = _stamp(path)
+        entry = self._entries.get(path)
+        if stamp is None or (entry is not None and entry.stamp == stamp):
+            return None
+        return stamp
+
+    def is_loaded(self, path: Path) -> bool:
+        return path in self._entries
+
+    def version(self, path: Path) -> Optional[int]:
+        entry = self._entries.get(path)
+        return entry.version if entry is not None else None
+
+    def metrics(self) -> Dict[str, Any]:
+        out = dict(self._stats)
+        out["build_seconds"] = dict(self._stats["build_seconds"])
+        out["index_seconds"] = dict(self._stats["index_seconds"])
+        out["rollup_seconds"] = dict(self._stats["rollup_seconds"])
+        out["entries"] = [
+            {
+                "path": str(e.path),
+                "version": e.version,
+                "rows": max((int(len(v)) for v in e.views.values()), default=0),
+                "views": sorted(e.views),
+            }
+            for e in self._entries.values()
+        ]
+        return out
+
+    def memory(self) -> Dict[str, Any]:
+        """
+        حجم النسخ المنشورة في الذاكرة لكل view (الإطار بأعمدته + الفهارس + التجميعات).
+        النص المشترك بين الـ views يُحسب مرة واحدة، عند أول view يظهر فيه.
+        """
+        seen: set = set()
+        entries = []
+        for e in list(self._entries.values()):
+            views = {}
+            for name, frame in e.views.items():
+                report = compact.frame_report(frame, seen)
+                report["index_bytes"] = compact.object_bytes(e.indexes.get(name, {}), seen)
+                report["rollup_bytes"] = compact.object_bytes(e.rollups.get(name, {}), seen)
+                views[name] = report
+            entries.append({"path": str(e.path), "version": e.version, "views": views})
+        total = sum(
+            v["bytes"] + v["index_bytes"] + v["rollup_bytes"]
+            for e in entries
+            for v in e["views"].values()
+        )
+        return {"total_bytes": total, "entries": entries}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def compile_snapshots(self, source: Optional[Path] = None) -> Dict[str, str]:
+        """يبني كل الـ views من ملف الإكسل ويكتب لقطاتها (بدون المرور بالكاش)."""
+        groups: Dict[Path, list] = {}
+        for name, spec in self._views.items():
+            path = source or spec.resolve_path().resolve()
+            groups.setdefault(path, []).append(name)
+
+        written: Dict[str, str] = {}
+        for path, names in groups.items():
+            stamp = _stamp(path)
+            base = ingest.read_source(path, self._source_columns(names))
+            snapshot.save_source(path, stamp, ingest.SourceInfo.of(base))
+            for name in names:
+                if snapshot.save(path, stamp, name, self._build(name, base)):
+                    written[name] = str(snapshot.snapshot_path(path, name))
+        return written
+
+    # ---------- internals ----------
+    def _source_columns(self, names: Iterable[str]) -> list:
+        cols: list = []
+        for name in names:
+            cols.extend(c for c in self._views[name].columns if c not in cols)
+        return cols
+
+    def _build(self, name: str, base: pd.DataFrame) -> pd.DataFrame:
+        t0 = time.perf_counter()
+        spec = self._views[name]
+        view = compact.encode(spec.builder(base), spec.categories)
+        self._stats["build_seconds"][name] = round(time.perf_counter() - t0, 4)
+        return view
+
+    def _names_for(self, path: Path) -> list:
+        return [
+            name
+            for name, spec in self._views.items()
+            if spec.resolve_path().resolve() == path
+        ]
+
+    def _load_view(self, name: str, entry: _Entry) -> pd.DataFrame:
+        view = snapshot.load(entry.path, entry.stamp, name)
+        if view is not None:
+            self._stats["snapshot_hits"] += 1
+            # القيم المقروءة من اللقطة تُعاد إلى المخزن المشترك
+            return compact.encode(view, self._views[name].categories)
+        self._stats["snapshot_misses"] += 1
+        if entry.base is None:
+            entry.base = ingest.read_source(
+                entry.path, self._source_columns(self._names_for(entry.path))
+            )
+        view = self._build(name, entry.base)
+        snapshot.save(entry.path, entry.stamp, name, view)
+        return view
+
+    def _publish_view(self, name: str, entry: _Entry) -> None:
+        frame = self._load_view(name, entry)
+        indexer = self._views[name].indexer
+        if indexer is not None:
+            t0 = time.perf_counter()
+            # الفهارس تُسجّل قبل الإطار: من يرى الإطار يرى فهارسه
+            entry.indexes[name] = indexer(frame)
+            self._stats["index_seconds"][name] = round(time.perf_counter() - t0, 4)
+        self._publish_rollup(name, entry, frame)
+        entry.views[name] = frame
+
+    def _publish_rollup(self, name: str, entry: _Entry, frame: pd.DataFrame) -> None:
+        rollup = self._views[name].rollup
+        if rollup is not None:
+            t0 = time.perf_counter()
+            entry.rollups[name] = rollup(frame)
+            self._stats["rollup_seconds"][name] = round(time.perf_counter() - t0, 4)
+
+    def _reload(self, path: Path, stamp: Optional[Tuple[int, int]]) -> _Entry:
+        t0 = time.perf_counter()
+        self._version += 1
+        entry = _Entry(path=path, stamp=stamp, version=self._version, base=None)
+        for name in self._names_for(path):
+            self._publish_view(name, entry)
+        if entry.base is not None:
+            entry.source = ingest.SourceInfo.of(entry.base)
+            snapshot.save_source(path, stamp, entry.source)
+        elif incremental_enabled():
+            # كل الـ views من اللقطات: عدد الصفوف وآخر صف من لقطة المصدر
+            entry.source = snapshot.load_source(path, stamp)
+        # الإطار الأساسي لا نحتاجه بعد بناء كل الـ views
+        entry.base = None
+        # نشر النسخة الجديدة دفعة واحدة (استبدال مرجع واحد)
+        self._entries[path] = entry
+        self._stats["reloads"] += 1
+        self._stats["last_reload_seconds"] = round(time.perf_counter() - t0, 4)
+        return entry
+
+
+    def _append(
+        self, old: Optional[_Entry], path: Path, stamp: Optional[Tuple[int, int]]
+    ) -> Optional[_Entry]:
+        """نسخة جديدة من الصفوف الملحقة فقط، أو None ليُعاد التحميل كاملًا."""
+        if not incremental_enabled() or old is None or stamp is None:
+            return None
+        if old.source is None:
+            log.info("full reload of %s: no source snapshot to match appended rows on", path)
+            return None
+        names = self._names_for(path)
+        if any(name not in old.views for name in names):
+            return None
+        t0 = time.perf_counter()
+        delta = ingest.read_appended(path, self._source_columns(names), old.source)
+        if delta is None:
+            return None
+
+        self._version += 1
+        entry = _Entry(
+            path=path,
+            stamp=stamp,
+            version=self._version,
+            base=None,
+            source=old.source.extended(delta),
+        )
+        for name in names:
+            self._append_view(name, old, entry, delta)
+        self._entries[path] = entry
+        self._snapshot_writer.submit(self._save_appended, entry)
+        self._stats["appends"] += 1
+        self._stats["appended_rows"] += len(delta)
+        self._stats["last_reload_seconds"] = round(time.perf_counter() - t0, 4)
+        return entry
+
+    def _append_view(self, name: str, old: _Entry, entry: _Entry, delta: pd.DataFrame) -> None:
+        part = self._build(name, delta)
+        frame = compact.concat(old.views[name], part)
+        indexer = self._views[name].indexer
+        if indexer is not None:
+            t0 = time.perf_counter()
+            # فهارس الصفوف الجديدة وحدها ثم دمجها مع فهارس النسخة السابقة
+            part_indexes = indexer(part)
+            old_indexes = old.indexes.get(name, {})
+            if set(part_indexes) == set(old_indexes):
+                entry.indexes[name] = merge_indexes(old_indexes, part_indexes)
+            else:
+                entry.indexes[name] = indexer(frame)
+            self._stats["index_seconds"][name] = round(time.perf_counter() - t0, 4)
+        spec = self._views[name]
+        old_rollup = old.rollups.get(name)
+        if spec.rollup is not None and spec.rollup_merge is not None and old_rollup is not None:
+            t0 = time.perf_counter()
+            # تجميعات الصفوف الجديدة وحدها ثم دمجها مع تجميعات النسخة السابقة
+            entry.rollups[name] = spec.rollup_merge(old_rollup, spec.rollup(part))
+            self._stats["rollup_seconds"][name] = round(time.perf_counter() - t0, 4)
+        else:
+            self._publish_rollup(name, entry, frame)
+        entry.views[name] = frame
+
+    def _save_appended(self, entry: _Entry) -> None:
+        """
+        يكتب لقطات نسخة ملحقة (على خيط الكاتب). نسخة حلّت محلها أخرى لا تُكتب:
+        لقطتها لن تطابق بصمة الملف على أي حال.
+        """
+        if self._entries.get(entry.path) is not entry:
+            return
+        for name, frame in entry.views.items():
+            snapshot.save(entry.path, entry.stamp, name, frame)
+        if entry.source is not None:
+            snapshot.save_source(entry.path, entry.stamp, entry.source)
+        self._stats["snapshot_writes"] += 1
+
+
+registry = DatasetRegistry()
@@ -0,0 +1,196 @@
+# Backend/dates.py
+"""
+One date parser for every view of the workbook.
+
+The sheet mixes Excel serials, ddmmyyyy numbers (often read as floats, e.g.
+4092025.0) and free-form text. parse_date_series works on the distinct raw
+values only, sorts them into format classes with vectorized masks and
+converts each class with a single call:
+
+  - blank / "nan" / "none"         -> NaT
+  - Excel serial (3-5 digits)      -> 1899-12-30 + n days
+  - numeric (ddmmyyyy, yyyymmdd)   -> to_datetime(format=...) per layout
+  - everything else (free text)    -> grouped by the format pandas would
+                                      guess for each value, one call per group
+
+to_datetime_any is the scalar reference; the batch parser returns the same
+result for every input, including the malformed ones. Parsed values are kept
+in a bounded process-wide cache so reloads only parse dates they have not
+seen before.
+"""
+from __future__ import annotations
+
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+_EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+_SERIAL_RE = r"[0-9]{3,5}"
+_NUMERIC_RE = r"[0-9]+(?:\.[0-9]+)?"
+_NON_ASCII_DIGIT_RE = r"(?![0-9])\d"
+
+_CACHE_MAX = 200_000
+_cache: dict = {}
+
+
+def to_datetime_any(x):
+    """
+    يدعم:
+      - سيريال إكسل (مثل 45567) = أيام منذ 1899-12-30
+      - نصوص أرقام مثل ddmmyyyy أو yyyymmdd
+      - صيغ شائعة: 4/9/2025 أو 04-09-2025
+    """
+    s = str(x).strip()
+    if not s or s.lower() in ("nan", "none"):
+        return pd.NaT
+
+    # Excel serial: 3-5 digits
+    if re.fullmatch(r"\d{3,5}", s):
+        try:
+            n = int(s)
+            return _EXCEL_EPOCH + pd.to_timedelta(n, unit="D")
+        except Exception:
+            pass
+
+    if re.fullmatch(r"\d+(?:\.\d+)?", s):
+        s2 = s.split(".")[0].zfill(8)
+        for fmt in ("%d%m%Y", "%Y%m%d"):
+            try:
+                return datetime.strptime(s2, fmt)
+            except Exception:
+                pass
+
+    return pd.to_datetime(s, errors="coerce", dayfirst=True)
+
+
+def parse_date_series(s: pd.Series) -> pd.Series:
+    """عمود تواريخ datetime64 (NaT لغير المفهوم)، محسوب لكل قيمة مميزة مرة واحدة."""
+    codes, uniques = pd.factorize(s.astype(str).str.strip(), use_na_sentinel=False)
+    keys = pd.Index(uniques, dtype=object)
+
+    known = np.fromiter((k in _cache for k in keys), dtype=bool, count=len(keys))
+    values = np.empty(len(keys), dtype="datetime64[ns]")
+    values[known] = [_cache[k] for k in keys[known]]
+    if not known.all():
+        fresh = keys[~known]
+        parsed = _parse_distinct(pd.Series(fresh, dtype=object)).to_numpy()
+        values[~known] = parsed
+        if len(_cache) + len(fresh) > _CACHE_MAX:
+            _cache.clear()
+        _cache.update(zip(fresh, parsed))
+
+    return pd.Series(values[codes], index=s.index, name=s.name)
+
+
+def _parse_distinct(u: pd.Series) -> pd.Series:
+    """يفرز القيم المميزة إلى أصناف ويحوّل كل صنف باستدعاء واحد."""
+    out = pd.Series(pd.NaT, index=u.index, dtype="datetime64[ns]")
+    blank = (u == "") | u.str.lower().isin(["nan", "none"])
+
+    # أرقام غير لاتينية (٠١٢...): قليلة جدًا، نمرّرها على الدالة المرجعية كما هي
+    exotic = ~blank & u.str.contains(_NON_ASCII_DIGIT_RE)
+    if exotic.any():
+        out[exotic] = _naive(
+            pd.Series([_strip_tz(to_datetime_any(v)) for v in u[exotic]], index=u[exotic].index)
+        )
+    blank |= exotic
+
+    serial = ~blank & u.str.fullmatch(_SERIAL_RE)
+    if serial.any():
+        days = pd.to_numeric(u[serial])
+        out[serial] = _EXCEL_EPOCH + pd.to_timedelta(days, unit="D")
+
+    numeric = ~blank & ~serial & u.str.fullmatch(_NUMERIC_RE)
+    rest = ~blank & ~serial & ~numeric
+    if numeric.any():
+        digits = u[numeric].str.split(".", n=1).str[0].str.zfill(8)
+        for layout in ("dmy", "ymd"):
+            if digits.empty:
+                break
+            valid, got = _strict_8(digits, layout)
+            # صيغة مطابقة = النتيجة نهائية (حتى لو خارج مدى pandas → NaT)
+            out[got.index] = got
+            digits = digits[~valid]
+        # أرقام لا تطابق أي صيغة تُعامل كنص حر (كما في to_datetime_any)
+        rest[digits.index] = True
+
+    if rest.any():
+        text = u[rest]
+        formats = text.map(lambda v: guess_datetime_format(v, dayfirst=True))
+        for fmt, group in text.groupby(formats.fillna(""), sort=False):
+            if fmt:
+                got = pd.to_datetime(group, format=fmt, errors="coerce")
+            else:
+                got = pd.to_datetime(group, format="mixed", dayfirst=True, errors="coerce")
+            out[group.index] = _naive(got)
+    return out
+
+
+_NS_MIN = np.datetime64(pd.Timestamp.min.ceil("D").date())
+_NS_MAX = np.datetime64(pd.Timestamp.max.floor("D").date())
+_DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def _strict_8(digits: pd.Series, layout: str):
+    """
+    مكافئ strptime("%d%m%Y") / ("%Y%m%d") على نص من 8 أرقام: تقسيم ثابت
+    ثم تحقق تقويمي كامل. يعيد (قناع المطابقة، التواريخ المطابقة).
+    """
+    ok = (digits.str.len() == 8).to_numpy()
+    a = digits.where(ok, "01010001")
+    if layout == "dmy":
+        d, m, y = a.str[:2], a.str[2:4], a.str[4:]
+    else:
+        y, m, d = a.str[:4], a.str[4:6], a.str[6:]
+    d, m, y = (x.astype("int64").to_numpy() for x in (d, m, y))
+
+    leap = (y % 4 == 0) & ((y % 100 != 0) | (y % 400 == 0))
+    month_ok = (m >= 1) & (m <= 12)
+    last_day = _DAYS_IN_MONTH[np.clip(m, 1, 12) - 1] + ((m == 2) & leap)
+    valid = ok & (y >= 1) & month_ok & (d >= 1) & (d <= last_day)
+
+    y, m, d = y[valid], m[valid], d[valid]
+    days = (
+        (y - 1970).astype("datetime64[Y]").astype("datetime64[M]")
+        + (m - 1).astype("timedelta64[M]")
+    ).astype("datetime64[D]") + (d - 1).astype("timedelta64[D]")
+    # تواريخ صحيحة تقويميًا لكن خارج مدى datetime64[ns] → NaT (كما في التحويل النهائي)
+    in_range = (days >= _NS_MIN) & (days <= _NS_MAX)
+    values = np.where(in_range, days, np.datetime64("NaT")).astype("datetime64[ns]")
+    return valid, pd.Series(values, index=digits.index[valid])
+
+
+def _strip_tz(v):
+    return v.replace(tzinfo=None) if getattr(v, "tzinfo", None) is not None else v
+
+
+def _naive(s: pd.Series) -> pd.Series:
+    # مناطق التوقيت لا معنى لها في تاريخ العلاج: نكتفي بالوقت المحلي المكتوب
+    if isinstance(s.dtype, pd.DatetimeTZDtype):
+        return s.dt.tz_localize(None)
+    if s.dtype == object:  # إزاحات توقيت مختلفة داخل نفس الصيغة
+        return pd.to_datetime(s, errors="coerce", utc=True).dt.tz_localize(None)
+    return s
+
+
+def parse_day(value):
+    """يوم من نص فلتر (YYYY-MM-DD أو أي صيغة يفهمها pandas)، أو None إن لم يُفهم."""
+    if not value:
+        return None
+    try:
+        ts = pd.to_datetime(value)
+    except Exception:
+        return None
+    return None if pd.isna(ts) else ts.date()
+
+
+def format_ymd(s: pd.Series) -> pd.Series:
+    """YYYY-MM-DD أو "" للقيم الفارغة."""
+    return s.dt.strftime("%Y-%m-%d").fillna("")
@@ -0,0 +1,136 @@
+# Backend/executor.py
+"""
+Dedicated, bounded executor for the dataset routes.
+
+The record/stats/export handlers are plain functions doing pandas work. Run
+as sync routes they would share Starlette's threadpool with every other sync
+handler (/auth/login ...), so a burst of dashboard searches could hold all of
+its slots. @offload turns such a handler into an async route that runs it on
+this executor instead, which has its own worker count and a bounded queue:
+when workers and queue are all taken, new queries are refused right away with
+503 + Retry-After rather than piling up. Queue depth and wait times are
+reported under /datasets/metrics. The /export responses render each chunk
+on the same executor (run_chunk), so streaming a large export takes a worker
+per chunk instead of a Starlette threadpool slot for the whole download.
+
+    HASEEF_QUERY_WORKERS   worker threads (default min(4, CPUs))
+    HASEEF_QUERY_QUEUE     queries allowed to wait for a worker (default 32)
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+
+class QueryExecutor:
+    def __init__(self, workers: int, queue_limit: int) -> None:
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="haseef-query")
+        self._lock = threading.Lock()
+        self._pending = 0  # قيد التنفيذ + في الانتظار
+        self._running = 0
+        self._stats: Dict[str, Any] = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "peak_queued": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "run_seconds_total": 0.0,
+        }
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return await self._submit(fn, args, kwargs, admit=True)
+
+    async def run_chunk(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        عمل يكمل طلبًا قُبل من قبل (دفعات /export): ينتظر في نفس الطابور
+        ويُحسب في نفس المقاييس، لكن لا يُرفض بـ 503 حتى لا ينقطع ملف بدأ بثه.
+        """
+        return await self._submit(fn, args, kwargs, admit=False)
+
+    async def _submit(self, fn: Callable[..., T], args: Any, kwargs: Any, admit: bool) -> T:
+        with self._lock:
+            if admit and self._pending >= self.workers + self.queue_limit:
+                self._stats["rejected"] += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server is busy, please retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+            self._stats["submitted"] += 1
+            queued = self._pending - self._running
+            self._stats["peak_queued"] = max(self._stats["peak_queued"], queued)
+
+        submitted = time.perf_counter()
+
+        def task() -> T:
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                wait = started - submitted
+                self._stats["wait_seconds_total"] += wait
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+                    self._stats["completed" if ok else "failed"] += 1
+                    self._stats["run_seconds_total"] += time.perf_counter() - started
+
+        future = self._pool.submit(task)
+        future.add_done_callback(self._forget_cancelled)
+        # إلغاء الطلب (انقطع العميل) لا يوقف عملًا بدأ: يبقى محسوبًا حتى ينتهي
+        return await asyncio.wrap_future(future)
+
+    def _forget_cancelled(self, future: Any) -> None:
+        # أُلغي قبل أن يبدأ، فلن يُنقص task() العداد
+        if future.cancelled():
+            with self._lock:
+                self._pending -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["running"] = self._running
+            out["queued"] = self._pending - self._running
+        started = out["completed"] + out["failed"]
+        out["wait_seconds_avg"] = round(out["wait_seconds_total"] / started, 6) if started else 0.0
+        for key in ("wait_seconds_total", "wait_seconds_max", "run_seconds_total"):
+            out[key] = round(out[key], 6)
+        out["workers"] = self.workers
+        out["queue_limit"] = self.queue_limit
+        return out
+
+
+query_executor = QueryExecutor(
+    workers=int(os.getenv("HASEEF_QUERY_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    queue_limit=int(os.getenv("HASEEF_QUERY_QUEUE", "32")),
+)
+
+
+def offload(fn: Callable[..., T]) -> Callable[..., Any]:
+    """يجعل route متزامنًا async يعمل على query_executor (نفس التوقيع ونفس الـ Depends)."""
+
+    @functools.wraps(fn)
+    async def endpoint(*args: Any, **kwargs: Any) -> T:
+        return await query_executor.run(fn, *args, **kwargs)
+
+    return endpoint
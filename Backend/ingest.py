@@ -0,0 +1,109 @@
+# Backend/ingest.py
+"""
+Single-pass ingestion of the claims workbook.
+
+The sheet is read once, restricted to the columns some registered view
+actually uses, and every date column is parsed once. The resulting base frame
+is handed to each view builder (medical / drugs / insurance), which only
+projects, renames and normalizes its own columns.
+
+read_appended() supports incremental reloads: when a workbook only grew at
+the end, it returns just the new rows, built the same way as a full read.
+Appends are recognized by row count plus the last known row, which must
+reappear unchanged right before the new rows.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import pandas as pd
+from pandas.api.types import is_float_dtype, is_integer_dtype
+
+from Backend.dates import parse_date_series
+
+# عمود المصدر -> عمود التاريخ المحلَّل في الإطار الأساسي
+DATE_COLUMNS = {
+    "Treatment Date": "treatment_dt",
+    "INCUR_DATE_FROM": "incur_from_dt",
+    "INCUR_DATE_TO": "incur_to_dt",
+}
+
+
+@dataclass(frozen=True)
+class SourceInfo:
+    """ما يلزم لاكتشاف الإلحاق: عدد صفوف المصدر وأنواع أعمدته وآخر صف فيه."""
+
+    rows: int
+    dtypes: Dict[str, Any]
+    tail: pd.DataFrame
+
+    @classmethod
+    def of(cls, base: pd.DataFrame) -> "SourceInfo":
+        return cls(len(base), base.dtypes.to_dict(), base.iloc[-1:].reset_index(drop=True))
+
+    def extended(self, delta: pd.DataFrame) -> "SourceInfo":
+        return SourceInfo(
+            self.rows + len(delta), self.dtypes, delta.iloc[-1:].reset_index(drop=True)
+        )
+
+
+def _usecols(columns: Optional[Iterable[str]]) -> Optional[Callable[[str], bool]]:
+    if columns is None:
+        return None
+    wanted = set(columns) | set(DATE_COLUMNS)
+    return lambda c: c in wanted
+
+
+def read_source(path: Path, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """يقرأ الإكسل مرة واحدة (الأعمدة المطلوبة فقط) ويبني الإطار الأساسي."""
+    raw = pd.read_excel(path, engine="openpyxl", usecols=_usecols(columns))
+    return build_base(raw)
+
+
+def read_appended(
+    path: Path, columns: Optional[Iterable[str]], info: SourceInfo
+) -> Optional[pd.DataFrame]:
+    """
+    الصفوف الملحقة بعد info.rows صفًا كإطار أساسي، أو None إن لم يكن التغيير
+    إلحاقًا فقط (صفوف أقل، أعمدة مختلفة، آخر صف معروف تغيّر...) فيلزم تحميل كامل.
+    """
+    if info.rows == 0:
+        return None
+    # أعمدة object تُقرأ كما هي: الاستنتاج على الصفوف الجديدة وحدها قد يحوّل
+    # أكوادًا مثل 1046 إلى 1046.0
+    parsed = set(DATE_COLUMNS.values())
+    as_object = {c: object for c, t in info.dtypes.items() if t == object and c not in parsed}
+    # نتخطى كل الصفوف المعروفة عدا آخرها: هو المرساة التي نطابق عليها
+    raw = pd.read_excel(
+        path,
+        engine="openpyxl",
+        usecols=_usecols(columns),
+        skiprows=range(1, info.rows),
+        dtype=as_object,
+    )
+    delta = build_base(raw)
+    if len(delta) < 2 or list(delta.columns) != list(info.dtypes):
+        return None
+
+    # وفي الأعمدة الرقمية قد يعطي نوعًا أضيق (int بدل float)
+    for col, dtype in info.dtypes.items():
+        if delta[col].dtype == dtype:
+            continue
+        if dtype == object or (is_float_dtype(dtype) and is_integer_dtype(delta[col].dtype)):
+            delta[col] = delta[col].astype(dtype)
+        else:
+            return None
+
+    if not delta.iloc[:1].reset_index(drop=True).equals(info.tail):
+        return None
+    return delta.iloc[1:].reset_index(drop=True)
+
+
+def build_base(raw: pd.DataFrame) -> pd.DataFrame:
+    base = raw.copy(deep=False)
+    for src, dst in DATE_COLUMNS.items():
+        if src in base.columns:
+            base[dst] = parse_date_series(base[src])
+    return base
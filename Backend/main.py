@@ -1,4 +1,6 @@
 # Backend/main.py
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from Backend.database import Base, engine
@@ -9,13 +11,28 @@ from Backend.routes import (
     insurance_records,
     drug_records,
     notifications,   # ⬅️ أضفنا هذا
+    datasets,
 )
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
+from Backend.broadcast import notification_bus
+from Backend.responses import FastJSONResponse
+from Backend.watcher import watcher
 
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # مراقبة ملفات البيانات وإعادة بنائها في الخلفية بدل زمن الطلب
+    watcher.start()
+    yield
+    await watcher.stop()
+    # إنهاء اشتراكات SSE المفتوحة
+    notification_bus.close()
+
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
 
 # ✅ CORS للفرونت
 app.add_middleware(
@@ -27,6 +44,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # ⬅️ ربط جميع الراوترات
@@ -35,6 +53,7 @@ app.include_router(medical_records.router)
 app.include_router(insurance_records.router)
 app.include_router(drug_records.router)
 app.include_router(notifications.router)  # ⬅️ هنا ربطنا الإشعارات
+app.include_router(datasets.router)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
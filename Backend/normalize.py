@@ -0,0 +1,272 @@
+# Backend/normalize.py
+"""
+Arabic/English text normalization shared by the medical, drug and insurance
+views.
+
+The scalar functions (norm_common, strip_titles, norm_icd, ar_normalize,
+make_key) are the reference implementations and are used for request keys.
+Columns go through the *_series variants: they factorize the column, run
+bulk str.translate tables and pandas string ops over the distinct values only
+(doctor, company and claim-type values repeat heavily), and broadcast the
+result back to the rows. Both paths give identical output; see
+Backend/benchmarks/normalize_bench.py.
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+# ========================= Tables / patterns =========================
+
+_AR_DIACRITICS = r"[\u064B-\u065F\u0610-\u061A]"  # التشكيل العربي
+_AR_DIACRITICS_RE = re.compile(_AR_DIACRITICS)
+_AR_NUMS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+_ICD_RE = re.compile(r"([A-Za-z]\d{1,2}(?:\.\d+)?)")  # أمثلة: E11 أو E03.9
+
+TITLES = {
+    "dr",
+    "dr.",
+    "doctor",
+    "prof",
+    "prof.",
+    "mr",
+    "mrs",
+    "ms",
+    "د",
+    "د.",
+    "دكتور",
+    "الدكتور",
+    "أ.",
+    "أ.د",
+    "بروف",
+    "البروف",
+    "أستاذ",
+}
+
+# جداول الترجمة الجماعية (حرف ← حرف) المكافئة لسلاسل replace/re.sub
+_DIACRITIC_CODEPOINTS = [*range(0x064B, 0x0660), *range(0x0610, 0x061B)]
+_ALEF_TABLE = {"آ": "ا", "أ": "ا", "إ": "ا", "ى": "ي", "ة": "ه"}
+_AR_TABLE = str.maketrans({**dict.fromkeys(_DIACRITIC_CODEPOINTS), **_ALEF_TABLE})
+# الفواصل تتحول لمسافة ثم تُدمج المسافات، وهذا يساوي استبدال كل سلسلة منها بمسافة
+_COMMON_TABLE = str.maketrans(
+    {
+        **_AR_NUMS,
+        **dict.fromkeys(_DIACRITIC_CODEPOINTS),
+        **_ALEF_TABLE,
+        **dict.fromkeys("\\/|(),.;:", " "),
+    }
+)
+_TITLE_SEP_TABLE = str.maketrans(dict.fromkeys("\\/.,;:_", " "))
+_DASHES_RE = re.compile(r"[‐–—]+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def _ascii_ci(word: str) -> str:
+    # مطابقة lower() بالضبط: فقط حروف ASCII تتأثر بحالة الأحرف في الألقاب
+    return "".join(f"[{c}{c.upper()}]" if c.isascii() and c.isalpha() else re.escape(c) for c in word)
+
+
+# الألقاب بعد تحويل النقاط لمسافات (الألقاب المنقّطة لا يمكن أن تطابق كلمة كاملة)
+_TITLES_RE = re.compile(
+    r"(?<!\S)(?:"
+    + "|".join(_ascii_ci(t) for t in sorted(TITLES, key=len, reverse=True) if "." not in t)
+    + r")(?!\S)"
+)
+
+# english + arabic friendly cleaner -> used to build matching keys
+_RE_NON_WORD = re.compile(r"[^a-z0-9\u0600-\u06FF]+", re.IGNORECASE)
+_RE_LONG_NUM = re.compile(r"\d{3,}")  # policy/CR long codes
+_STOPWORDS = {
+    # english/common company boilerplate
+    "co", "company", "insurance", "cooperative", "co-operative", "coop",
+    "inc", "ltd", "limited", "sa", "ksa",
+    # arabic boilerplate (after ar_normalize)
+    "شركه", "تعاونيه", "تامين", "تعاوني", "محدوده",
+}
+_STOPWORDS_RE = re.compile(
+    r"(?<!\S)(?:" + "|".join(re.escape(w) for w in sorted(_STOPWORDS, key=len, reverse=True)) + r")(?!\S)"
+)
+
+
+# ========================= Per-distinct mapping =========================
+
+
+def map_distinct(s: pd.Series, fn: Callable[[Any], Any]) -> pd.Series:
+    """
+    يطبّق fn على كل قيمة مميزة مرة واحدة ثم يوزّع النتيجة على الصفوف.
+    مكافئ لـ s.apply(fn) لكن كلفته بعدد القيم المميزة لا بعدد الصفوف.
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    mapped[:-1] = [fn(u) for u in uniques]
+    missing = codes == -1
+    # القيم الفارغة تأخذ الخانة الأخيرة (codes = -1)
+    mapped[-1] = fn(s[missing].iloc[0]) if missing.any() else None
+    return pd.Series(mapped[codes], index=s.index, name=s.name)
+
+
+# ========================= Scalar normalizers =========================
+
+
+def strip_titles(txt: str) -> str:
+    s = str(txt or "").strip()
+    s = re.sub(r"[\\\/]+", " ", s)  # \ أو / → مسافة
+    s = re.sub(r"[.,;:_]+", " ", s)  # فواصل تعتبر فواصل كلمات
+    parts = re.split(r"\s+", s)
+    out = [p for p in parts if p and p.lower().strip(".") not in TITLES]
+    return " ".join(out).strip()
+
+
+def _norm_one(s: str) -> str:
+    s = s.translate(_AR_NUMS)
+    s = re.sub(_AR_DIACRITICS, "", s)
+    s = (
+        s.replace("آ", "ا")
+        .replace("أ", "ا")
+        .replace("إ", "ا")
+        .replace("ى", "ي")
+        .replace("ة", "ه")
+    )
+    s = re.sub(r"[‐–—]+", "-", s)
+    s = re.sub(r"[\\\/|]+", " ", s)
+    s = re.sub(r"[(),.;:]+", " ", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s.lower()
+
+
+def norm_common(x):
+    """
+    تطبيع عام: يحوّل الأرقام العربية/الفارسية، يزيل التشكيل،
+    يوحد همزات/ألفات، يحول \\ / | إلى مسافة، وينظف المسافات.
+    يدعم str و Series.
+    """
+    if isinstance(x, pd.Series):
+        return _apply_distinct(x.astype(str), _vec_norm_common)
+    return _norm_one(str(x or "").strip())
+
+
+def norm_name(x, drop_titles: bool = True):
+    if isinstance(x, pd.Series):
+        if not drop_titles:
+            return norm_common(x)
+        return _apply_distinct(
+            x.astype(str), lambda u: _vec_norm_common(_vec_strip_titles(u))
+        )
+    base = strip_titles(x) if drop_titles else str(x or "")
+    return norm_common(base)
+
+
+def norm_icd(txt: str) -> str:
+    if not txt:
+        return ""
+    m = _ICD_RE.search(str(txt))
+    return m.group(1).upper() if m else norm_common(str(txt)).upper()
+
+
+def icd_root(txt: str) -> str:
+    code = norm_icd(txt)
+    return code.split(".")[0] if code else ""
+
+
+def norm_icd_series(s: pd.Series) -> pd.Series:
+    return _apply_distinct(s.astype(str), _vec_norm_icd)
+
+
+def icd_root_series(s: pd.Series) -> pd.Series:
+    return _apply_distinct(
+        s.astype(str), lambda u: _vec_norm_icd(u).str.split(".", n=1).str[0]
+    )
+
+
+def ar_normalize(s: Any) -> str:
+    s = "" if s is None else str(s)
+    s = s.strip().lower()
+    s = _AR_DIACRITICS_RE.sub("", s)
+    s = s.replace("آ", "ا").replace("أ", "ا").replace("إ", "ا")
+    s = s.replace("ى", "ي").replace("ة", "ه")
+    s = re.sub(r"\s+", " ", s)
+    return s
+
+
+def make_key(s: Any) -> str:
+    """
+    A permissive key: lowercased, Arabic-normalized, drop punctuation & long numbers
+    and common boilerplate words, collapse spaces.
+    """
+    t = ar_normalize(s)
+    t = _RE_LONG_NUM.sub(" ", t)         # drop long number blocks
+    t = _RE_NON_WORD.sub(" ", t)         # punctuation & separators -> space
+    parts = [p for p in t.split() if p and p not in _STOPWORDS]
+    return " ".join(parts)
+
+
+def ar_normalize_series(s: pd.Series) -> pd.Series:
+    return _apply_distinct(s, _vec_ar_normalize)
+
+
+def make_key_series(s: pd.Series) -> pd.Series:
+    return _apply_distinct(s, _vec_make_key)
+
+
+# ========================= Vectorized engine =========================
+# كل دالة هنا تستقبل Series من القيم المميزة (نصوص) وتعيد Series بنفس الطول،
+# وتطابق مخرجات الدالة المرجعية المقابلة حرفيًا.
+
+
+def _as_text(v: Any) -> str:
+    return "" if v is None else str(v)
+
+
+def _apply_distinct(s: pd.Series, vec_fn: Callable[[pd.Series], pd.Series]) -> pd.Series:
+    """مثل map_distinct لكن الدالة تعمل دفعة واحدة على كل القيم المميزة."""
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    values = [_as_text(v) for v in uniques]
+    missing = np.flatnonzero(codes == -1)
+    if len(missing):
+        # None → "" أما NaN وأخواتها → str(v)، فلكلٍ خانة مستقلة في آخر الجدول
+        na = s.to_numpy()[missing]
+        is_none = np.equal(na, None)
+        codes = codes.copy()
+        codes[missing[is_none]] = len(values)
+        codes[missing[~is_none]] = len(values) + 1
+        values.append("")
+        values.append(_as_text(na[~is_none][0]) if (~is_none).any() else "")
+    out = vec_fn(pd.Series(values, dtype=object)).to_numpy(dtype=object)
+    return pd.Series(out[codes], index=s.index, name=s.name)
+
+
+def _vec_norm_common(u: pd.Series) -> pd.Series:
+    u = u.str.strip().str.translate(_COMMON_TABLE)
+    u = u.str.replace(_DASHES_RE, "-", regex=True)
+    u = u.str.replace(_SPACES_RE, " ", regex=True)
+    return u.str.strip().str.lower()
+
+
+def _vec_strip_titles(u: pd.Series) -> pd.Series:
+    u = u.str.strip().str.translate(_TITLE_SEP_TABLE)
+    u = u.str.replace(_TITLES_RE, " ", regex=True)
+    return u.str.replace(_SPACES_RE, " ", regex=True).str.strip()
+
+
+def _vec_norm_icd(u: pd.Series) -> pd.Series:
+    code = u.str.extract(_ICD_RE, expand=False).str.upper()
+    missing = code.isna()
+    if missing.any():
+        code[missing] = _vec_norm_common(u[missing]).str.upper()
+    return code
+
+
+def _vec_ar_normalize(u: pd.Series) -> pd.Series:
+    u = u.str.strip().str.lower().str.translate(_AR_TABLE)
+    return u.str.replace(_SPACES_RE, " ", regex=True)
+
+
+def _vec_make_key(u: pd.Series) -> pd.Series:
+    u = _vec_ar_normalize(u)
+    u = u.str.replace(_RE_LONG_NUM, " ", regex=True)
+    u = u.str.replace(_RE_NON_WORD, " ", regex=True)
+    u = u.str.replace(_STOPWORDS_RE, " ", regex=True)
+    return u.str.replace(_SPACES_RE, " ", regex=True).str.strip()
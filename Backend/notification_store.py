@@ -0,0 +1,408 @@
+# Backend/notification_store.py
+"""
+Indexed notification store, persisted to a local SQLite file.
+
+All notifications are kept in memory behind an id → record map. Every record
+has a sort key (created_at in ns, seq); secondary indexes keep the keys of
+each kind and each severity in sorted lists, so a listing walks only the
+matching entries, newest first, without re-sorting. Listings are paged with a
+cursor (the key of the last item returned), so the next page starts with a
+binary search instead of an offset. Counters by kind, severity and read
+state are updated on every write, so unread badges are O(1). Each write also
+bumps a revision; etag() combines it with a per-process token, so a client
+can revalidate the counters (If-None-Match) without downloading them again.
+
+Free-text search goes through a token index over title and body: text is
+Arabic-normalized (Backend/normalize.ar_normalize), split into words, and
+words with a leading article/conjunction (ال، وال، بال ...) are also indexed
+without it. Every word of the query must be the prefix of an indexed word.
+
+Every write goes to SQLite first (WAL, one statement per change) and is then
+applied in memory; on start-up the table is read back in insertion order, so
+notifications survive restarts. seq is the row id: it breaks ties between
+notifications created in the same nanosecond, the latest one first.
+
+    HASEEF_NOTIFICATIONS_DB   path of the SQLite file
+                              (default Backend/data/notifications.db)
+"""
+from __future__ import annotations
+
+import bisect
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from Backend.normalize import ar_normalize
+
+Key = Tuple[int, int]  # (created_at ns, seq)
+
+DEFAULT_DB = Path(__file__).resolve().parent / "data" / "notifications.db"
+
+_FIELDS = ("id", "title", "body", "kind", "severity", "time", "read")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    seq        INTEGER PRIMARY KEY,
+    id         TEXT NOT NULL UNIQUE,
+    title      TEXT NOT NULL,
+    body       TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    severity   TEXT NOT NULL,
+    time       TEXT NOT NULL,
+    read       INTEGER NOT NULL DEFAULT 0,
+    created_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def resolve_db_path() -> Path:
+    env = os.getenv("HASEEF_NOTIFICATIONS_DB")
+    if env:
+        return Path(env).expanduser().resolve()
+    return DEFAULT_DB
+
+
+def encode_cursor(key: Key) -> str:
+    return f"{key[0]}-{key[1]}"
+
+
+def decode_cursor(cursor: str) -> Key:
+    """ValueError إن لم يكن cursor صادرًا من encode_cursor."""
+    ts, _, seq = cursor.partition("-")
+    return (int(ts), int(seq))
+
+
+# ========================= Token index =========================
+
+_WORD_RE = re.compile(r"\w+")
+_CLITICS = ("وال", "بال", "كال", "فال", "لل", "ال")
+
+
+def tokens(text: str) -> List[str]:
+    """كلمات النص بعد التطبيع (بدون التطويل)."""
+    return _WORD_RE.findall(ar_normalize(text).replace("ـ", ""))
+
+
+def _strip_clitic(word: str) -> str:
+    for p in _CLITICS:
+        if word.startswith(p) and len(word) - len(p) >= 2:
+            return word[len(p):]
+    return word
+
+
+class TokenIndex:
+    """كلمة → seq الإشعارات التي تحويها؛ البحث بالبادئة على قاموس مرتب."""
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, List[int]] = {}
+        self._vocab: List[str] = []  # مرتب
+        self._dead = 0  # مواقع لإشعارات محذوفة لم تُنظّف بعد
+
+    def add(self, seq: int, text: str) -> None:
+        words = set()
+        for w in tokens(text):
+            words.add(w)
+            words.add(_strip_clitic(w))
+        for w in words:
+            postings = self._postings.get(w)
+            if postings is None:
+                postings = self._postings[w] = []
+                bisect.insort(self._vocab, w)
+            postings.append(seq)
+
+    def search(self, query: str) -> Optional[Set[int]]:
+        """
+        seq المطابقة لكل كلمات query. None لـ query فارغ (بدون فلتر)؛ نص غير فارغ
+        بلا كلمات (مثل "?" أو "--") لا يطابق شيئًا، كما كان البحث النصي القديم.
+        """
+        words = [_strip_clitic(w) for w in tokens(query)]
+        if not words:
+            return set() if query.strip() else None
+        out: Optional[Set[int]] = None
+        # الكلمات الأطول أولًا: مجموعاتها أصغر غالبًا
+        for w in sorted(set(words), key=len, reverse=True):
+            lo = bisect.bisect_left(self._vocab, w)
+            hi = bisect.bisect_left(self._vocab, w[:-1] + chr(ord(w[-1]) + 1))
+            hits: Set[int] = set()
+            for v in self._vocab[lo:hi]:
+                hits.update(self._postings[v])
+            out = hits if out is None else out & hits
+            if not out:
+                break
+        return out
+
+    def forget(self, live: Callable[[int], bool], live_count: int) -> None:
+        """يُستدعى بعد كل حذف؛ ينظّف القوائم عندما يزيد الميت على الحي."""
+        self._dead += 1
+        if self._dead < max(1024, live_count):
+            return
+        for w in list(self._postings):
+            kept = [s for s in self._postings[w] if live(s)]
+            if kept:
+                self._postings[w] = kept
+            else:
+                del self._postings[w]
+        self._vocab = sorted(self._postings)
+        self._dead = 0
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._vocab.clear()
+        self._dead = 0
+
+
+# ========================= Store =========================
+
+
+class NotificationStore:
+    def __init__(self, path: Path, model: Callable[..., BaseModel]) -> None:
+        self.path = path
+        self.model = model
+        self._lock = threading.RLock()
+        self._by_id: Dict[str, Tuple[Key, Any]] = {}
+        self._order: List[Key] = []  # كل المفاتيح مرتبة تصاعديًا
+        self._by_kind: Dict[str, List[Key]] = {}
+        self._by_severity: Dict[str, List[Key]] = {}
+        self._ids: Dict[Key, str] = {}
+        self._keys: Dict[int, Key] = {}  # seq → key
+        self._text = TokenIndex()
+        self._counts: Counter = Counter()  # ("kind"|"severity"|"unread_kind"|"unread_severity", value)
+        self._unread: set = set()
+        self._epoch = f"{time.time_ns():x}"  # يميّز عمر العملية: الـ revision يبدأ من جديد
+        self.revision = 0
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._migrate()
+        rows = self._db.execute(
+            "SELECT seq, created_at, " + ", ".join(_FIELDS) + " FROM notifications ORDER BY seq"
+        )
+        for seq, created_at, *values in rows:
+            record = dict(zip(_FIELDS, values))
+            record["read"] = bool(record["read"])
+            self._index((created_at, seq), self.model(**record))
+
+    def _migrate(self) -> None:
+        # قواعد أقدم بلا created_at: نأخذه من وقت العرض "YYYY-MM-DD HH:MM"
+        cols = {row[1] for row in self._db.execute("PRAGMA table_info(notifications)")}
+        if "created_at" not in cols:
+            self._db.execute("ALTER TABLE notifications ADD COLUMN created_at INTEGER")
+        missing = self._db.execute("SELECT seq, time FROM notifications WHERE created_at IS NULL").fetchall()
+        for seq, shown in missing:
+            try:
+                ns = int(datetime.strptime(shown, "%Y-%m-%d %H:%M").timestamp() * 1e9)
+            except ValueError:
+                ns = 0
+            self._db.execute("UPDATE notifications SET created_at = ? WHERE seq = ?", (ns, seq))
+
+    # ---------- reads ----------
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get(self, noti_id: str) -> Optional[Any]:
+        hit = self._by_id.get(noti_id)
+        return hit[1] if hit is not None else None
+
+    def latest(self) -> Optional[Any]:
+        with self._lock:
+            return self._by_id[self._ids[self._order[-1]]][1] if self._order else None
+
+    def query(
+        self,
+        kind: Optional[str] = None,
+        severity: Optional[str] = None,
+        q: Optional[str] = None,
+        cursor: Optional[Key] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[Any], Optional[Key]]:
+        """
+        الإشعارات المطابقة من الأحدث إلى الأقدم، الأقدم من cursor فقط، وبحد
+        أقصى limit. يعيد (الصفحة، cursor الصفحة التالية أو None).
+        """
+        with self._lock:
+            keys: List[Key] = self._order
+            if kind is not None:
+                keys = self._by_kind.get(kind, [])
+            if severity is not None:
+                by_severity = self._by_severity.get(severity, [])
+                if len(by_severity) < len(keys):
+                    keys = by_severity
+            end = len(keys) if cursor is None else bisect.bisect_left(keys, cursor)
+
+            hits = self._text.search(q) if q else None
+            if hits is not None and len(hits) < end // 8:
+                # نتائج بحث قليلة: نرتب مفاتيحها بدل المرور على الفهرس
+                found = (self._keys.get(s) for s in hits)
+                candidates: Iterable[Key] = sorted(
+                    (k for k in found if k is not None and (cursor is None or k < cursor)),
+                    reverse=True,
+                )
+                hits = None
+            else:
+                candidates = (keys[i] for i in range(end - 1, -1, -1))
+
+            out: List[Any] = []
+            last: Optional[Key] = None
+            for key in candidates:
+                if hits is not None and key[1] not in hits:
+                    continue
+                n = self._by_id[self._ids[key]][1]
+                if kind is not None and n.kind != kind:
+                    continue
+                if severity is not None and n.severity != severity:
+                    continue
+                if limit is not None and len(out) == limit:
+                    return out, last
+                out.append(n)
+                last = key
+            return out, None
+
+    def counts(self) -> Dict[str, Any]:
+        """العدد حسب النوع والأهمية وحالة القراءة (من العدّادات، بدون مرور على القائمة)."""
+        with self._lock:
+            c = self._counts
+            return {
+                "total": len(self._by_id),
+                "unread": len(self._unread),
+                "by_kind": {k: {"total": c["kind", k], "unread": c["unread_kind", k]} for k in self._by_kind},
+                "by_severity": {
+                    s: {"total": c["severity", s], "unread": c["unread_severity", s]}
+                    for s in self._by_severity
+                },
+            }
+
+    def etag(self) -> str:
+        return f'"{self._epoch}-{self.revision}"'
+
+    def summary(self) -> Tuple[str, Dict[str, Any]]:
+        """(etag, counts) من نفس الحالة."""
+        with self._lock:
+            return self.etag(), self.counts()
+
+    # ---------- writes ----------
+    def add(self, n: Any, at: Optional[datetime] = None) -> Any:
+        """at: وقت إنشاء الإشعار (للترتيب)، الآن إن لم يُعطَ."""
+        created = time.time_ns() if at is None else int(at.timestamp() * 1e9)
+        with self._lock:
+            record = n.dict()
+            cur = self._db.execute(
+                "INSERT INTO notifications (" + ", ".join(_FIELDS) + ", created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                tuple(int(record[f]) if f == "read" else record[f] for f in _FIELDS) + (created,),
+            )
+            self._index((created, cur.lastrowid), n)
+            self.revision += 1
+            return n
+
+    def set_read(self, noti_id: str, read: bool) -> Optional[Any]:
+        with self._lock:
+            hit = self._by_id.get(noti_id)
+            if hit is None:
+                return None
+            n = hit[1]
+            if n.read != read:
+                self._db.execute("UPDATE notifications SET read = ? WHERE id = ?", (int(read), noti_id))
+                self._count(n, -1)
+                n.read = read
+                self._count(n, +1)
+                self.revision += 1
+            return n
+
+    def mark_all_read(self) -> int:
+        with self._lock:
+            self._db.execute("UPDATE notifications SET read = 1 WHERE read = 0")
+            if self._unread:
+                self.revision += 1
+            for noti_id in list(self._unread):
+                n = self._by_id[noti_id][1]
+                self._count(n, -1)
+                n.read = True
+                self._count(n, +1)
+            return len(self._by_id)
+
+    def delete(self, noti_id: str) -> bool:
+        with self._lock:
+            hit = self._by_id.get(noti_id)
+            if hit is None:
+                return False
+            self._db.execute("DELETE FROM notifications WHERE id = ?", (noti_id,))
+            key, n = hit
+            _remove(self._order, key)
+            _remove(self._by_kind[n.kind], key)
+            _remove(self._by_severity[n.severity], key)
+            del self._ids[key]
+            del self._keys[key[1]]
+            del self._by_id[noti_id]
+            self._text.forget(self._keys.__contains__, len(self._keys))
+            self._count(n, -1)
+            self.revision += 1
+            return True
+
+    def clear(self) -> int:
+        with self._lock:
+            self._db.execute("DELETE FROM notifications")
+            count = len(self._by_id)
+            self._by_id.clear()
+            self._order.clear()
+            self._ids.clear()
+            self._keys.clear()
+            self._text.clear()
+            self._unread.clear()
+            self._counts.clear()
+            for index in (self._by_kind, self._by_severity):
+                for keys in index.values():
+                    keys.clear()
+            self.revision += 1
+            return count
+
+    def seed_once(self, make: Callable[[], Iterator[Tuple[Any, datetime]]]) -> None:
+        """يضيف الإشعارات التجريبية (مع وقت إنشائها) مرة واحدة فقط في عمر قاعدة البيانات."""
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM meta WHERE key = 'seeded'").fetchone():
+                return
+            for n, at in make():
+                self.add(n, at)
+            self._db.execute("INSERT INTO meta (key, value) VALUES ('seeded', '1')")
+
+    # ---------- internals ----------
+    def _index(self, key: Key, n: Any) -> None:
+        self._by_id[n.id] = (key, n)
+        self._ids[key] = n.id
+        self._keys[key[1]] = key
+        bisect.insort(self._order, key)
+        bisect.insort(self._by_kind.setdefault(n.kind, []), key)
+        bisect.insort(self._by_severity.setdefault(n.severity, []), key)
+        self._text.add(key[1], f"{n.title} {n.body}")
+        self._count(n, +1)
+
+    def _count(self, n: Any, step: int) -> None:
+        self._counts["kind", n.kind] += step
+        self._counts["severity", n.severity] += step
+        if not n.read:
+            self._counts["unread_kind", n.kind] += step
+            self._counts["unread_severity", n.severity] += step
+            if step > 0:
+                self._unread.add(n.id)
+            else:
+                self._unread.discard(n.id)
+
+
+def _remove(keys: List[Key], key: Key) -> None:
+    i = bisect.bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
@@ -0,0 +1,55 @@
+# Backend/paging.py
+"""
+Server-side sorting and offset pagination for the record endpoints.
+
+Callers compute their totals on all filtered rows first and only then cut the
+page, so totals never depend on the page. Sorting orders one column over the
+selected row positions (not the whole frame); only the rows of the requested
+page are ever materialized. Pages default to PAGE_SIZE rows, like
+/medical/records, so a response never grows with the dataset; whole result
+sets go through the /export endpoints.
+"""
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+PAGE_SIZE = 500
+
+
+def order_rows(
+    frame: pd.DataFrame,
+    sel: Optional[np.ndarray],
+    sort: Optional[str],
+    order: str,
+    sort_keys: Dict[str, str],
+) -> np.ndarray:
+    """
+    مواقع الصفوف المختارة (sel، None = الكل) مرتبة حسب مفتاح من sort_keys.
+    sort فارغ = بدون ترتيب؛ مفتاح غير معروف = 400 بدل نتائج غير مرتبة بصمت.
+    """
+    rows = np.arange(len(frame)) if sel is None else sel
+    key = (sort or "").strip().lower()
+    if not key:
+        return rows
+    if key not in sort_keys:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown sort key {sort!r}; expected one of: {', '.join(sort_keys)}",
+        )
+    col = sort_keys[key]
+    if col not in frame.columns:
+        return rows
+    values = frame[col].iloc[rows].reset_index(drop=True)
+    ordered = values.sort_values(
+        ascending=(order != "desc"), kind="stable", na_position="last"
+    ).index.to_numpy()
+    return rows[ordered]
+
+
+def page_slice(positions: np.ndarray, page: int, page_size: int) -> np.ndarray:
+    start = (page - 1) * page_size
+    return positions[start : start + page_size]
@@ -0,0 +1,215 @@
+# Backend/parallel_scan.py
+"""
+Substring search over the distinct values of an index, without a Python loop
+per value.
+
+ValueText keeps the values of a ColumnIndex as one array of UTF-32 code
+points separated by \\x00. A key is matched with vectorized comparisons (rows
+where the first code point matches, narrowed one code point at a time), and
+the match positions are mapped back to value ids. A key without \\x00 can
+never match across two values.
+
+Optionally, large texts are also placed in shared memory and split into
+shards on value boundaries; each shard is searched by a worker of a process
+pool and the positions are merged. The pool is off by default: turn it on only
+where Backend/benchmarks/scan_bench.py shows the sharded search beating the
+in-process one on the deployment machine. Small texts stay in-process.
+
+A worker keeps the blocks it has attached mapped between searches. Each task
+carries the names of the blocks still alive in the parent, and the worker
+closes any other attachment first, so a block replaced by a new dataset
+version stops being mapped by a worker on its next task.
+
+    HASEEF_SCAN_PROCESSES   worker processes (default 1 = off, search in-process)
+    HASEEF_SCAN_MIN_CHARS   smallest text, in code points, worth sharding
+                            (default 2000000)
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+
+PROCESSES = int(os.getenv("HASEEF_SCAN_PROCESSES", "1"))
+MIN_CHARS = int(os.getenv("HASEEF_SCAN_MIN_CHARS", "2000000"))
+
+log = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_broken = False
+
+
+def codepoints(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+def find_positions(buf: np.ndarray, key: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    """مواضع بداية key داخل buf[lo:hi] (مواضع مطلقة)."""
+    m = len(key)
+    if hi - lo < m:
+        return np.empty(0, dtype=np.int64)
+    pos = np.flatnonzero(buf[lo : hi - m + 1] == key[0]) + lo
+    for j in range(1, m):
+        if len(pos) == 0:
+            break
+        pos = pos[buf[pos + j] == key[j]]
+    return pos.astype(np.int64)
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if PROCESSES <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            methods = mp.get_all_start_methods()
+            # fork بعد تشغيل خيوط السيرفر غير آمن
+            ctx = mp.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=PROCESSES, mp_context=ctx)
+        return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+# ---------- worker side ----------
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _attach(name: str, live: FrozenSet[str]) -> shared_memory.SharedMemory:
+    # كتل حررها الأب (نسخة أحدث حلّت محلها): نغلقها حتى لا تبقى ذاكرتها محجوزة هنا
+    for stale in [n for n in _attached if n not in live]:
+        _attached.pop(stale).close()
+    shm = _attached.get(name)
+    if shm is None:
+        # العمال يتشاركون متتبّع الموارد مع الأب، والأب وحده يحذف الكتلة (unlink)
+        shm = _attached[name] = shared_memory.SharedMemory(name=name)
+    return shm
+
+
+def _find_shared(
+    name: str, size: int, lo: int, hi: int, key: np.ndarray, live: FrozenSet[str]
+) -> np.ndarray:
+    shm = _attach(name, live)
+    buf = np.ndarray((size,), dtype=np.uint32, buffer=shm.buf)
+    try:
+        return find_positions(buf, key, lo, hi)
+    finally:
+        del buf
+
+
+# ---------- parent side ----------
+_live: Set[str] = set()  # أسماء الكتل الحية (تُرسل مع كل مهمة)
+_live_lock = threading.Lock()
+
+
+class _SharedBlock:
+    """كتلة ذاكرة مشتركة تُحذف عند التخلص من النص الذي يملكها."""
+
+    def __init__(self, data: np.ndarray) -> None:
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+        self.array: Optional[np.ndarray] = np.ndarray(data.shape, dtype=data.dtype, buffer=self.shm.buf)
+        self.array[:] = data
+        with _live_lock:
+            _live.add(self.shm.name)
+
+    def release(self) -> None:
+        with _live_lock:
+            _live.discard(self.shm.name)
+        self.array = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ValueText:
+    """القيم المميزة كنص واحد: buf (code points)، starts (بداية كل خانة)، ids (id القيمة لكل خانة)."""
+
+    def __init__(self, buf: np.ndarray, starts: np.ndarray, ids: np.ndarray) -> None:
+        self.size = len(buf)
+        self.starts = starts
+        self.ids = ids
+        self._block: Optional[_SharedBlock] = None
+        self._shards: List[Tuple[int, int]] = []
+        if PROCESSES > 1 and self.size >= MIN_CHARS:
+            try:
+                self._block = _SharedBlock(buf)
+            except OSError:
+                self._block = None  # لا ذاكرة مشتركة متاحة: بحث داخل العملية
+        if self._block is not None:
+            weakref.finalize(self, self._block.release)
+            self._shards = self._shard_bounds(PROCESSES)
+        else:
+            self._buf = buf
+
+    @classmethod
+    def of(cls, values: np.ndarray) -> "ValueText":
+        lens = np.fromiter((len(v) for v in values), dtype=np.int64, count=len(values))
+        starts = np.zeros(len(values), dtype=np.int64)
+        np.cumsum(lens[:-1] + 1, out=starts[1:])
+        return cls(codepoints("\x00".join(values)), starts, np.arange(len(values), dtype=np.int64))
+
+    def concat(self, other: "ValueText", ids: np.ndarray, other_ids: np.ndarray) -> "ValueText":
+        """نص القيم من نصّين؛ ids / other_ids تترجم ids كل منهما (قد تتكرر القيم)."""
+        sep = np.zeros(1, dtype=np.uint32)
+        return ValueText(
+            np.concatenate([self.buf, sep, other.buf]),
+            np.concatenate([self.starts, other.starts + self.size + 1]),
+            np.concatenate([ids[self.ids], other_ids[other.ids]]),
+        )
+
+    @property
+    def buf(self) -> np.ndarray:
+        return self._block.array if self._block is not None else self._buf
+
+    def _shard_bounds(self, n: int) -> List[Tuple[int, int]]:
+        # الحدود على بدايات القيم حتى لا تنقسم قيمة بين عاملين
+        targets = np.linspace(0, self.size, n + 1)[1:-1]
+        cuts = [0] + [int(self.starts[i]) for i in np.searchsorted(self.starts, targets) if i < len(self.starts)]
+        cuts = sorted(set(cuts)) + [self.size]
+        return list(zip(cuts[:-1], cuts[1:]))
+
+    def find(self, key: str) -> np.ndarray:
+        """ids القيم التي تحتوي key (key بلا \\x00)، مرتبة بلا تكرار."""
+        k = codepoints(key)
+        if len(k) == 0 or len(self.starts) == 0:
+            return np.unique(self.ids)
+        pos = self._find_parallel(k) if self._block is not None else None
+        if pos is None:
+            pos = find_positions(self.buf, k, 0, self.size)
+        slots = np.searchsorted(self.starts, pos, side="right") - 1
+        return np.unique(self.ids[slots])
+
+    def _find_parallel(self, k: np.ndarray) -> Optional[np.ndarray]:
+        """البحث موزعًا على عمليات المجمّع، أو None ليُبحث داخل العملية."""
+        global _broken
+        pool = None if _broken else _get_pool()
+        if pool is None:
+            return None
+        name = self._block.shm.name
+        with _live_lock:
+            live = frozenset(_live)
+        try:
+            futures = [
+                pool.submit(_find_shared, name, self.size, lo, hi, k, live) for lo, hi in self._shards
+            ]
+            return np.concatenate([f.result() for f in futures])
+        except (BrokenProcessPool, RuntimeError):
+            # عامل توقف أو تعذّر تشغيل العمليات: نكمل داخل العملية ولا نعيد المحاولة
+            log.warning("scan process pool unavailable, searching in-process", exc_info=True)
+            _broken = True
+            shutdown()
+            return None
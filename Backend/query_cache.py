@@ -0,0 +1,132 @@
+# Backend/query_cache.py
+"""
+LRU + TTL cache for filtered query results.
+
+Keys are (dataset, dataset version, normalized filter tuple): the routers
+normalize the raw query parameters first (norm_name, norm_icd, make_key,
+parsed days ...), so "Dr. Yosaf" and "yosaf " hit the same entry. Values are
+row positions plus the totals computed from them, never frames.
+
+Entries are evicted least-recently-used when either the entry count or the
+total size of their NumPy arrays goes over budget, expire after a TTL, and a
+dataset's entries are dropped as soon as a newer version of it is seen.
+
+    HASEEF_QUERY_CACHE_ENTRIES   (default 256, 0 disables the cache)
+    HASEEF_QUERY_CACHE_MB        (default 128)
+    HASEEF_QUERY_CACHE_TTL       seconds (default 300)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+_ENTRY_OVERHEAD = 512  # تقدير تقريبي لحجم المفتاح والكائنات الصغيرة
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+class QueryCache:
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._items: "OrderedDict[Tuple, Tuple[Any, int, float]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get_or_compute(
+        self, dataset: str, version: int, key: Hashable, compute: Callable[[], T]
+    ) -> T:
+        if self.max_entries <= 0:
+            return compute()
+        full_key = (dataset, version, key)
+        now = time.monotonic()
+        with self._lock:
+            self._drop_old_versions(dataset, version)
+            item = self._items.get(full_key)
+            if item is not None:
+                if item[2] > now:
+                    self._items.move_to_end(full_key)
+                    self._stats["hits"] += 1
+                    return item[0]
+                self._remove(full_key)
+                self._stats["expired"] += 1
+            self._stats["misses"] += 1
+
+        # الحساب خارج القفل: طلبان متزامنان بنفس المفتاح قد يحسبان مرتين، لا مشكلة
+        value = compute()
+        size = _nbytes(value) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            if self._versions.get(dataset) != version:
+                return value  # نسخة أحدث نُشرت أثناء الحساب
+            if full_key in self._items:
+                self._remove(full_key)
+            self._items[full_key] = (value, size, now + self.ttl)
+            self._bytes += size
+            self._evict()
+        return value
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._versions.clear()
+            self._bytes = 0
+
+    # ---------- internals (تحت القفل) ----------
+    def _drop_old_versions(self, dataset: str, version: int) -> None:
+        known = self._versions.get(dataset)
+        if known is not None and known >= version:
+            return
+        self._versions[dataset] = version
+        if known is not None:
+            for k in [k for k in self._items if k[0] == dataset and k[1] != version]:
+                self._remove(k)
+
+    def _remove(self, key: Tuple) -> None:
+        _, size, _ = self._items.pop(key)
+        self._bytes -= size
+
+    def _evict(self) -> None:
+        while self._items and (
+            len(self._items) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._items))
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+
+
+query_cache = QueryCache(
+    max_entries=int(os.getenv("HASEEF_QUERY_CACHE_ENTRIES", "256")),
+    max_bytes=int(float(os.getenv("HASEEF_QUERY_CACHE_MB", "128")) * 1024 * 1024),
+    ttl=float(os.getenv("HASEEF_QUERY_CACHE_TTL", "300")),
+)
@@ -0,0 +1,125 @@
+# Backend/responses.py
+"""
+JSON responses for the API.
+
+FastJSONResponse is the app-wide default response class (see Backend/main.py).
+It encodes with orjson when installed (NumPy scalars and arrays included) and
+falls back to the standard json module otherwise.
+
+records_response() is the path for the /records endpoints: the summary fields
+are encoded as usual, while the record list is written by pandas' C encoder
+straight from the frame's columns, so no per-row dicts are built.
+
+stream_export() backs the /export endpoints: CSV or NDJSON written chunk by
+chunk from row positions, so memory does not grow with the export size. Each
+chunk is rendered on query_executor (see Backend/executor.py).
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, AsyncIterator, Callable, Dict
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from Backend.executor import query_executor
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    # قيم NumPy التي لا يعرفها json القياسي
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=_default,
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def records_json(records: pd.DataFrame) -> bytes:
+    """قائمة السجلات كـ JSON من الأعمدة مباشرة (NaN → null)."""
+    return records.to_json(
+        orient="records", force_ascii=False, double_precision=15
+    ).encode("utf-8")
+
+
+def records_response(payload: Dict[str, Any], records: pd.DataFrame) -> Response:
+    """payload (الإحصاءات) + "records" كآخر مفتاح في نفس الكائن."""
+    head = dumps(payload)
+    sep = b"," if payload else b""
+    body = head[:-1] + sep + b'"records":' + records_json(records) + b"}"
+    return Response(body, media_type="application/json")
+
+
+# ========================= Streaming export =========================
+
+EXPORT_CHUNK_ROWS = int(os.getenv("HASEEF_EXPORT_CHUNK_ROWS", "5000"))
+
+_EXPORT_MEDIA = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def stream_export(
+    frame: pd.DataFrame,
+    positions: np.ndarray,
+    to_output: Callable[[pd.DataFrame, int], pd.DataFrame],
+    fmt: str,
+    name: str,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+) -> StreamingResponse:
+    """
+    يبث الصفوف frame.iloc[positions] على دفعات من chunk_rows صفًا. كل دفعة
+    تُحوّل بـ to_output(chunk, offset) ثم تُكتب وتُترك، فالذاكرة لا تكبر مع حجم التصدير.
+    """
+
+    def render(start: int) -> str:
+        out = to_output(frame.iloc[positions[start : start + chunk_rows]], start)
+        if fmt == "csv":
+            return out.to_csv(index=False, header=(start == 0))
+        text = out.to_json(orient="records", lines=True, force_ascii=False, double_precision=15)
+        # بعض إصدارات pandas تضيف سطرًا جديدًا في النهاية وبعضها لا
+        return text if text.endswith("\n") else text + "\n"
+
+    async def chunks() -> AsyncIterator[str]:
+        # كل دفعة على query_executor (طابوره ومقاييسه) بدل threadpool الخاص بـ Starlette
+        if fmt == "csv":
+            yield "\ufeff"  # BOM ليفتح Excel النص العربي بشكل صحيح
+        if len(positions) == 0 and fmt == "csv":
+            yield await query_executor.run_chunk(
+                lambda: to_output(frame.iloc[:0], 0).to_csv(index=False)
+            )
+        for start in range(0, len(positions), chunk_rows):
+            yield await query_executor.run_chunk(render, start)
+
+    return StreamingResponse(
+        chunks(),
+        media_type=_EXPORT_MEDIA[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
@@ -0,0 +1,110 @@
+# Backend/rollups.py
+"""
+Pre-aggregated counts and sums for the /stats endpoints.
+
+A view registers a rollup builder next to its indexer (see Backend/dataset.py);
+it runs once per dataset version on the whole view, so charts read a few
+kilobytes of totals instead of downloading records. The same builders are run
+on filtered rows when a /stats request carries filters.
+
+When a workbook only grew (HASEEF_INCREMENTAL=1), the builder runs on the
+appended rows alone and merge_rollups() folds that result into the previous
+version's rollup: counts are added and the count_by lists are merged per key,
+so an append costs the size of the delta plus the number of distinct keys.
+Sums are stored rounded to 6 decimals, below the precision of the amounts,
+so a merged sum and one computed over all rows are the same float whatever
+the summation order; limit_rollup() rounds them to 3 decimals on the way out.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+Rollup = Dict[str, Any]
+
+_SUM_DECIMALS = 6  # دقة تخزين المجاميع (الإخراج بـ 3 منازل)
+
+
+def count_by(keys: pd.Series, by_key: bool = False, **measures: pd.Series) -> List[Dict[str, Any]]:
+    """
+    سجل لكل قيمة مميزة: {"key", "records", <مجموع كل مقياس>}.
+    الترتيب: الأكثر سجلات أولًا، أو حسب المفتاح (by_key) للأيام.
+    المفاتيح الفارغة/NaN تُهمل.
+    """
+    frame = pd.DataFrame({"key": keys.to_numpy()})
+    for name, s in measures.items():
+        # أعلام bool تُجمع كعدد صحيح، والباقي أرقام (NaN تُتجاهل في الجمع)
+        if s.dtype == bool:
+            frame[name] = s.to_numpy(dtype="int64")
+        else:
+            frame[name] = pd.to_numeric(s, errors="coerce").to_numpy(dtype=float)
+    text = frame["key"].astype(str).str.strip()
+    frame = frame[frame["key"].notna() & (text != "") & (text.str.lower() != "nan")]
+
+    grouped = frame.groupby("key", sort=False)
+    out = grouped.size().rename("records").to_frame()
+    for name in measures:
+        total = grouped[name].sum()
+        out[name] = total.round(_SUM_DECIMALS) if total.dtype.kind == "f" else total
+    return _sorted(out.reset_index(), by_key).to_dict(orient="records")
+
+
+def _sorted(out: pd.DataFrame, by_key: bool) -> pd.DataFrame:
+    if by_key:
+        return out.sort_values("key", kind="stable")
+    return out.sort_values(["records", "key"], ascending=[False, True], kind="stable")
+
+
+def merge_counts(old: List[Dict[str, Any]], new: List[Dict[str, Any]], by_key: bool = False) -> List[Dict[str, Any]]:
+    """يدمج نتيجتي count_by لنفس المفاتيح والمقاييس كما لو حُسبتا على الصفوف معًا."""
+    if not new:
+        return old
+    if not old:
+        return new
+    out = pd.DataFrame(old + new).groupby("key", sort=False).sum()
+    for name in out.columns:
+        if out[name].dtype.kind == "f":
+            out[name] = out[name].round(_SUM_DECIMALS)
+    return _sorted(out.reset_index(), by_key).to_dict(orient="records")
+
+
+def merge_rollups(old: Rollup, new: Rollup) -> Rollup:
+    """
+    تجميعات النسخة السابقة + تجميعات الصفوف الملحقة: الأعداد تُجمع وقوائم by_*
+    تُدمج (by_day بترتيب المفتاح). الحقول غير الجمعية يعيد الـ view حسابها بعد الدمج.
+    """
+    out: Rollup = {}
+    for name, value in old.items():
+        other = new.get(name)
+        if isinstance(value, list):
+            out[name] = merge_counts(value, other or [], by_key=name == "by_day")
+        elif isinstance(value, int) and not isinstance(value, bool) and isinstance(other, int):
+            out[name] = value + other
+        else:
+            out[name] = value
+    return out
+
+
+def _rounded(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {k: float(np.round(v, 3)) if isinstance(v, float) else v for k, v in row.items()}
+        for row in rows
+    ]
+
+
+def limit_rollup(rollup: Rollup, limit: int) -> Rollup:
+    """
+    يقص قوائم by_* (عدا by_day) إلى أول limit عنصرًا مع إبقاء عدد القيم الكلي،
+    ويقرّب المجاميع إلى 3 منازل.
+    """
+    out: Rollup = {}
+    for name, value in rollup.items():
+        if isinstance(value, list):
+            if name != "by_day":
+                out[f"{name}_total"] = len(value)
+                value = value[:limit]
+            value = _rounded(value)
+        out[name] = value
+    return out
@@ -0,0 +1,33 @@
+# Backend/routes/datasets.py
+from fastapi import APIRouter
+
+from Backend.dataset import registry
+from Backend.executor import query_executor
+from Backend.query_cache import query_cache
+from Backend.watcher import watcher
+
+router = APIRouter(prefix="/datasets", tags=["Datasets"])
+
+
+@router.get("/metrics")
+def dataset_metrics():
+    """
+    إحصاءات الكاش المشترك: hits / misses / reloads وزمن آخر تحميل
+    وزمن بناء كل view، مع إحصاءات كاش نتائج الاستعلامات تحت "query_cache"
+    ومراقب الملفات تحت "watcher" ومنفذ الاستعلامات (الطابور والرفض) تحت "executor".
+    """
+    return {
+        **registry.metrics(),
+        "query_cache": query_cache.metrics(),
+        "watcher": watcher.metrics(),
+        "executor": query_executor.metrics(),
+    }
+
+
+@router.get("/memory")
+def dataset_memory():
+    """
+    حجم البيانات المحمّلة لكل view: بايتات كل عمود (مع نوعه) وحجمه لو خُزّن
+    كنصوص object عادية (object_bytes)، وحجم الفهارس والتجميعات.
+    """
+    return registry.memory()
@@ -1,43 +1,54 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, Query
 import pandas as pd
 import numpy as np
-from pathlib import Path
-from datetime import datetime, timedelta
-import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+from Backend.compact import decode
+from Backend.dataset import RecordView, registry
+from Backend.dates import format_ymd, parse_day
+from Backend.executor import offload
+from Backend.normalize import ar_normalize, ar_normalize_series
+from Backend.paging import PAGE_SIZE, order_rows, page_slice
+from Backend.query_cache import query_cache
+from Backend.responses import records_response, stream_export
+from Backend.rollups import count_by, limit_rollup, merge_rollups
+from Backend.search_index import (
+    DateIndex,
+    Rows,
+    build_indexes,
+    intersect,
+    take,
+    union,
+)
 
 router = APIRouter(prefix="/drugs", tags=["Drug Records"])
 
 
-def ar_normalize(text: str) -> str:
-    if not isinstance(text, str):
-        text = str(text or "")
-    text = text.strip().lower()
-    text = re.sub(r"[\u064B-\u065F\u0610-\u061A]", "", text)
-    text = text.replace("أ", "ا").replace("إ", "ا").replace("آ", "ا")
-    text = text.replace("ى", "ي").replace("ة", "ه")
-    text = re.sub(r"\s+", " ", text)
-    return text
-
-
-def load_drug_records():
-    data_path = Path(__file__).resolve().parents[1] / "data" / "medical_records.xlsx"
-    df = pd.read_excel(data_path, engine="openpyxl")
-
-    columns = [
-        "Name",
-        "Patient Name",
-        "ServiceCode",
-        "ServiceDescription",
-        "QTY",
-        "Item_Unit_Price",
-        "Gross Amount",
-        "VAT Amount",
-        "Discount",
-        "Net Amount",
-        "Treatment Date",
-    ]
-    existing_cols = [c for c in columns if c in df.columns]
-    df = df[existing_cols].copy()
+def load_drug_records() -> pd.DataFrame:
+    """النسخة المطبّعة من الكاش المشترك (لا تعدّلها في مكانها)."""
+    return registry.get("drugs")
+
+
+COLUMNS = [
+    "Name",
+    "Patient Name",
+    "ServiceCode",
+    "ServiceDescription",
+    "QTY",
+    "Item_Unit_Price",
+    "Gross Amount",
+    "VAT Amount",
+    "Discount",
+    "Net Amount",
+    "Treatment Date",
+]
+
+
+def _build_drug_view(base: pd.DataFrame) -> pd.DataFrame:
+    existing_cols = [c for c in COLUMNS if c in base.columns]
+    df = base[existing_cols].copy()
 
     rename_map = {
         "Name": "doctor_name",
@@ -54,30 +65,15 @@ def load_drug_records():
     }
     df = df.rename(columns=rename_map)
 
-    # ===== معالجة التاريخ =====
+    # ===== التاريخ (محلّل مرة واحدة في ingest) =====
+    # نفس محلّل medical: الأرقام التسلسلية لـ Excel (45755) و yyyymmdd (20250505)
+    # صارت تواريخ فعلية، وكان المحلّل القديم للأدوية يتركها فارغة ("")
     if "treatment_date" in df.columns:
-        td = df["treatment_date"].astype(str).str.strip()
-
-        def fix_date(x):
-            x = str(x).strip()
-            # أرقام مثل 10122024 أو 10122024.0
-            if x.replace(".", "", 1).isdigit():
-                x = x.split(".")[0]
-                x = x.zfill(8)
-                try:
-                    return datetime.strptime(x, "%d%m%Y")
-                except Exception:
-                    return pd.NaT
-            try:
-                return pd.to_datetime(x, errors="coerce", dayfirst=True)
-            except Exception:
-                return pd.NaT
-
-        df["treatment_date"] = td.apply(fix_date)
+        df["treatment_date"] = base["treatment_dt"]
     else:
         df["treatment_date"] = pd.NaT
 
-    df["date"] = df["treatment_date"].dt.strftime("%Y-%m-%d").fillna("")
+    df["date"] = format_ymd(df["treatment_date"])
 
     # ===== أعمدة البحث المطبّعة =====
     search_cols = [
@@ -90,7 +86,7 @@ def load_drug_records():
     ]
     for col in search_cols:
         if col in df.columns:
-            df[f"norm_{col}"] = df[col].astype(str).map(ar_normalize)
+            df[f"norm_{col}"] = ar_normalize_series(df[col].astype(str))
         else:
             df[f"norm_{col}"] = ""
 
@@ -100,116 +96,305 @@ def load_drug_records():
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors="coerce")
 
-    # AI placeholder
-    df["ai_analysis"] = "No analysis yet — will be added by AI Agent."
-
     return df
 
 
-@router.get("/records")
-def get_drug_records(
+# أعمدة قليلة القيم تُخزّن مرمّزة (category) في الكاش المشترك
+CATEGORIES = [
+    "doctor_name",
+    "norm_doctor_name",
+    "patient_name",
+    "norm_patient_name",
+    "service_code",
+    "norm_service_code",
+    "service_description",
+    "norm_service_description",
+    "date",
+]
+
+
+def _index_drug_view(df: pd.DataFrame) -> dict:
+    idx = build_indexes(df, [c for c in df.columns if c.startswith("norm_")])
+    idx["treatment_date"] = DateIndex(df["treatment_date"])
+    return idx
+
+
+def drug_rollup(df: pd.DataFrame) -> dict:
+    """تجميعات /drugs/stats: العمليات والكميات والمبالغ لكل دواء/طبيب/يوم."""
+    measures = {c: df[c] for c in ("quantity", "net_amount") if c in df.columns}
+    alerts = alert_mask(df)
+    blank = pd.Series("", index=df.index)
+    by_drug = count_by(df.get("service_description", blank), **measures)
+    return {
+        "total_operations": int(len(df)),
+        "top_drug": top_of(by_drug),
+        "alerts_count": int(alerts.sum()),
+        "by_drug": by_drug,
+        "by_doctor": count_by(df.get("doctor_name", blank), alerts=alerts, **measures),
+        "by_day": count_by(df["date"], by_key=True, alerts=alerts, **measures),
+    }
+
+
+def merge_drug_rollup(old: dict, new: dict) -> dict:
+    """تجميعات النسخة السابقة + الصفوف الملحقة؛ top_drug يُعاد من by_drug المدموجة."""
+    out = merge_rollups(old, new)
+    out["top_drug"] = top_of(out["by_drug"])
+    return out
+
+
+registry.register(
+    "drugs",
+    _build_drug_view,
+    columns=COLUMNS,
+    indexer=_index_drug_view,
+    rollup=drug_rollup,
+    rollup_merge=merge_drug_rollup,
+    categories=CATEGORIES,
+)
+
+
+# مفاتيح الترتيب المسموحة ← العمود (النصوص تُرتّب بشكلها المطبّع)
+SORT_KEYS = {
+    "date": "treatment_date",
+    "doctor": "norm_doctor_name",
+    "patient": "norm_patient_name",
+    "drug": "norm_service_description",
+    "quantity": "quantity",
+    "gross_amount": "gross_amount",
+    "discount": "discount",
+    "net_amount": "net_amount",
+}
+
+
+@dataclass(frozen=True)
+class DrugQuery:
+    q: str | None = None
+    doctor: str | None = None
+    drug: str | None = None
+    date: str | None = None
+    date_from: str | None = None
+    date_to: str | None = None
+    last_week: bool = False
+
+
+async def drug_query(
     q: str | None = Query(None, description="General search across all fields"),
     doctor: str | None = Query(None, description="Filter by doctor name"),
     drug: str | None = Query(None, description="Filter by drug/service name"),
     date: str | None = Query(None, description="Filter by date (YYYY-MM-DD)"),
+    date_from: str | None = Query(None, description="From date, inclusive (YYYY-MM-DD)"),
+    date_to: str | None = Query(None, description="To date, inclusive (YYYY-MM-DD)"),
     last_week: bool = Query(False, description="If true, show only last 7 days"),
-):
-    df = load_drug_records()
+) -> DrugQuery:
+    """نفس الفلاتر لـ /records و /export و /stats."""
+    return DrugQuery(q, doctor, drug, date, date_from, date_to, last_week)
+
+
+class DrugKey(NamedTuple):
+    """الفلاتر بعد التطبيع (None = بدون فلتر): مفتاح كاش النتائج ومدخل الفلترة."""
+
+    q: str | None
+    doctor: str | None
+    drug: str | None
+    day: date | None
+    day_from: date | None
+    day_to: date | None
+    week_of: date | None  # يوم الطلب عند last_week
+
+
+def drug_key(f: DrugQuery) -> DrugKey:
+    return DrugKey(
+        q=ar_normalize(f.q) if f.q else None,
+        doctor=ar_normalize(f.doctor) if f.doctor else None,
+        drug=ar_normalize(f.drug) if f.drug else None,
+        day=parse_day(f.date),
+        day_from=parse_day(f.date_from),
+        day_to=parse_day(f.date_to),
+        week_of=datetime.today().date() if f.last_week else None,
+    )
+
+
+def select_drugs(view: RecordView, k: DrugKey) -> Rows:
+    idx = view.indexes
+    sel = None  # مواقع الصفوف المطابقة (None = الكل)
+
+    # ===== فلاتر التاريخ (فهرس الأيام المرتب) =====
+    days = idx["treatment_date"]
+
+    # آخر أسبوع
+    if k.week_of:
+        sel = intersect(sel, days.between(k.week_of - timedelta(days=7), k.week_of))
+
+    # تاريخ معيّن
+    if k.day:
+        sel = intersect(sel, days.on(k.day))
+
+    # مدى من/إلى
+    if k.day_from or k.day_to:
+        sel = intersect(sel, days.between(k.day_from, k.day_to))
+
+    # ===== فلتر الطبيب / الدواء (فهرس الأسماء المميزة) =====
+    if k.doctor is not None and "norm_doctor_name" in idx:
+        sel = intersect(sel, idx["norm_doctor_name"].contains(k.doctor))
 
-    # ===== فلتر آخر أسبوع =====
-    if last_week and "treatment_date" in df.columns:
-        today = datetime.today().date()
-        last7 = today - timedelta(days=7)
-        df = df[df["treatment_date"].dt.date.between(last7, today)]
-
-    # ===== فلتر بتاريخ معيّن =====
-    if date and "treatment_date" in df.columns:
-        try:
-            d = pd.to_datetime(date).date()
-            df = df[df["treatment_date"].dt.date == d]
-        except Exception:
-            pass
-
-    # ===== فلتر الطبيب =====
-    if doctor and "norm_doctor_name" in df.columns:
-        key = ar_normalize(doctor)
-        df = df[df["norm_doctor_name"].str.contains(key, na=False)]
-
-    # ===== فلتر الدواء =====
-    if drug and "norm_service_description" in df.columns:
-        key = ar_normalize(drug)
-        df = df[df["norm_service_description"].str.contains(key, na=False)]
-
-    # ===== البحث العام =====
-    if q:
-        key = ar_normalize(q)
-        norm_cols = [c for c in df.columns if c.startswith("norm_")]
+    if k.drug is not None and "norm_service_description" in idx:
+        sel = intersect(sel, idx["norm_service_description"].contains(k.drug))
+
+    # ===== البحث العام (فهرس ثلاثي الأحرف) =====
+    if k.q is not None:
+        norm_cols = [c for c in idx if c.startswith("norm_")]
         if norm_cols:
-            mask = np.column_stack(
-                [df[c].str.contains(key, na=False) for c in norm_cols]
-            ).any(axis=1)
-            df = df[mask]
+            sel = intersect(sel, union([idx[c].contains(k.q) for c in norm_cols]))
 
-    # ===== إحصائيات عامة =====
-    total_operations = int(len(df))
+    return sel
 
-    # ===== منطق التنبيهات الفعلي =====
-    # تعريف قاعدة بسيطة:
-    # - كمية كبيرة (>= 10)
-    # - أو صافي عالي (>= 5000)
-    # - أو خصم عالي (>= 1000)
-    alert_mask = pd.Series(False, index=df.index)
 
+def top_of(by_drug: list) -> str:
+    """
+    أشهر دواء (Top) من نتيجة count_by للأدوية: بمجموع الكمية، أو بعدد المرات إن
+    لم توجد الكمية. التعادل يُحسم بترتيب count_by (الأكثر سجلات ثم الاسم).
+    """
+    if not by_drug:
+        return "—"
+    if "quantity" in by_drug[0]:
+        return str(max(by_drug, key=lambda r: r["quantity"])["key"])
+    return str(by_drug[0]["key"])
+
+
+def top_drug(df: pd.DataFrame) -> str:
+    """أشهر دواء في الصفوف المعطاة، بنفس قاعدة تجميعات /drugs/stats."""
+    if "service_description" not in df.columns:
+        return "—"
+    measures = {"quantity": df["quantity"]} if "quantity" in df.columns else {}
+    return top_of(count_by(df["service_description"], **measures))
+
+
+def query_drugs(view: RecordView, f: DrugQuery) -> dict:
+    """الصفوف المطابقة + الإحصاءات (قبل الترقيم)، من كاش النتائج إن أمكن."""
+
+    def compute() -> dict:
+        sel = select_drugs(view, key)
+        if sel is None:
+            # بدون فلاتر: الإحصاءات جاهزة في تجميعات النسخة، بدون groupby
+            totals = {k: view.rollups[k] for k in ("total_operations", "top_drug", "alerts_count")}
+            return {"rows": np.arange(len(view.frame)), "totals": totals}
+        df = take(view.frame, sel)
+        return {
+            "rows": sel,
+            "totals": {
+                "total_operations": int(len(df)),
+                "top_drug": top_drug(df),
+                "alerts_count": int(alert_mask(df).sum()),  # 👈 الآن محسوبة فعلياً
+            },
+        }
+
+    key = drug_key(f)
+    return query_cache.get_or_compute("drugs", view.version, key, compute)
+
+
+def alert_mask(df: pd.DataFrame) -> pd.Series:
+    """
+    منطق التنبيهات الفعلي، قاعدة بسيطة:
+      - كمية كبيرة (>= 10)
+      - أو صافي عالي (>= 5000)
+      - أو خصم عالي (>= 1000)
+    """
+    mask = pd.Series(False, index=df.index)
     if "quantity" in df.columns:
-        alert_mask |= df["quantity"].fillna(0) >= 10
+        mask |= df["quantity"].fillna(0) >= 10
     if "net_amount" in df.columns:
-        alert_mask |= df["net_amount"].fillna(0) >= 5000
+        mask |= df["net_amount"].fillna(0) >= 5000
     if "discount" in df.columns:
-        alert_mask |= df["discount"].fillna(0) >= 1000
+        mask |= df["discount"].fillna(0) >= 1000
+    return mask
+
+
+OUT_COLS = [
+    "doctor_name",
+    "patient_name",
+    "service_code",
+    "service_description",
+    "quantity",
+    "item_unit_price",
+    "gross_amount",
+    "vat_amount",
+    "discount",
+    "net_amount",
+    "date",
+    "ai_analysis",
+    "has_alert",  # 👈 جديد: فلاغ للتنبيه في كل سجل
+]
+
+# AI placeholder: ثابت يُضاف عند الإخراج بدل تخزينه في كل صف
+AI_ANALYSIS = "No analysis yet — will be added by AI Agent."
+
+
+def api_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # بدون تعديل الكاش المشترك
+    df = df.assign(ai_analysis=AI_ANALYSIS, has_alert=alert_mask(df))
+    out = decode(df[[c for c in OUT_COLS if c in df.columns]])
+    # infer_objects قبل fillna: أعمدة object بقيم رقمية فقط كانت تُخفَّض ضمنيًا مع FutureWarning
+    return out.infer_objects(copy=False).fillna("")
 
-    df["has_alert"] = alert_mask
-    alerts_count = int(alert_mask.sum())
 
-    # ===== أشهر دواء (Top) =====
-    top_drug = "—"
-    if "service_description" in df.columns:
-        if "quantity" in df.columns:
-            grp = df.groupby("service_description")["quantity"].sum(numeric_only=True)
-            if not grp.empty:
-                top_drug = str(grp.sort_values(ascending=False).index[0])
-        else:
-            counts = df["service_description"].value_counts()
-            if not counts.empty:
-                top_drug = str(counts.index[0])
-
-    columns_to_show = [
-        "doctor_name",
-        "patient_name",
-        "service_code",
-        "service_description",
-        "quantity",
-        "item_unit_price",
-        "gross_amount",
-        "vat_amount",
-        "discount",
-        "net_amount",
-        "date",
-        "ai_analysis",
-        "has_alert",  # 👈 جديد: فلاغ للتنبيه في كل سجل
-    ]
-    existing_cols = [c for c in columns_to_show if c in df.columns]
-    out = df[existing_cols]
-
-    return {
-        "total_operations": total_operations,
-        "top_drug": top_drug,
-        "alerts_count": alerts_count,  # 👈 الآن محسوبة فعلياً
-        "records": out.fillna("").to_dict(orient="records"),
-    }
+@router.get("/records")
+@offload
+def get_drug_records(
+    f: DrugQuery = Depends(drug_query),
+    sort: str | None = Query(None, description="Sort key: " + " | ".join(SORT_KEYS)),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="asc | desc"),
+    page: int = Query(1, ge=1, description="Page number (optional)"),
+    page_size: int = Query(PAGE_SIZE, ge=1, le=5000, description="Page size (optional)"),
+):
+    view = registry.view("drugs")
+    result = query_drugs(view, f)
+
+    # ===== ترتيب + ترقيم (الإحصائيات محسوبة قبلها على كل النتائج) =====
+    positions = order_rows(view.frame, result["rows"], sort, order, SORT_KEYS)
+    positions = page_slice(positions, page, page_size)
+    return records_response(dict(result["totals"]), api_frame(view.frame.iloc[positions]))
+
+
+@router.get("/export")
+@offload
+def export_drug_records(
+    f: DrugQuery = Depends(drug_query),
+    sort: str | None = Query(None, description="Sort key: " + " | ".join(SORT_KEYS)),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="asc | desc"),
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="csv | ndjson"),
+):
+    """كل النتائج المفلترة كملف CSV أو NDJSON يُبث على دفعات."""
+    view = registry.view("drugs")
+    positions = order_rows(view.frame, query_drugs(view, f)["rows"], sort, order, SORT_KEYS)
+    return stream_export(
+        view.frame, positions, lambda chunk, _: api_frame(chunk), format, "drug_records"
+    )
+
+
+@router.get("/stats")
+@offload
+def get_drug_stats(
+    f: DrugQuery = Depends(drug_query),
+    limit: int = Query(50, ge=1, le=5000, description="Max items per by_* list (by_day is never cut)"),
+):
+    """تجميعات جاهزة للرسوم: من تجميعات نسخة البيانات، أو على النتائج المفلترة."""
+    view = registry.view("drugs")
+    key = drug_key(f)
+    if all(v is None for v in key):
+        stats = view.rollups
+    else:
+        stats = query_cache.get_or_compute(
+            "drugs_stats",
+            view.version,
+            key,
+            lambda: drug_rollup(take(view.frame, select_drugs(view, key))),
+        )
+    return limit_rollup(stats, limit)
 
 
 # ===== Endpoint مساعد للـ Dropdowns (أطباء + أدوية) =====
 @router.get("/filters")
+@offload
 def get_drug_filters():
     """
     يرجّع قائمة الأطباء + الأدوية المميزة لاستخدامها في القوائم المنسدلة في الفرونت.
@@ -1,11 +1,23 @@
 # Backend/routers/insurance.py
-from fastapi import APIRouter, Query
-from fastapi.responses import JSONResponse
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, Query
+from typing import Dict, Any
+from dataclasses import asdict, dataclass
 from datetime import datetime
+from pathlib import Path
+import numpy as np
 import pandas as pd
 import os
-import re
+
+from Backend.compact import decode
+from Backend.dataset import RecordView, registry
+from Backend.dates import parse_day
+from Backend.executor import offload
+from Backend.normalize import make_key, make_key_series, map_distinct
+from Backend.paging import PAGE_SIZE, order_rows, page_slice
+from Backend.query_cache import query_cache
+from Backend.responses import records_response, stream_export
+from Backend.rollups import count_by, limit_rollup, merge_rollups
+from Backend.search_index import ColumnIndex, DateIndex, Rows, build_indexes, intersect, take, union
 
 router = APIRouter(prefix="/insurance", tags=["Insurance Records"])
 
@@ -56,79 +68,36 @@ RENAME = {
 }
 
 # ---------- Helpers ----------
-AR_DIACRITICS = re.compile(r"[\u064B-\u065F\u0610-\u061A]")
-
-def normalize_ar(s: Any) -> str:
-    s = "" if s is None else str(s)
-    s = s.strip().lower()
-    s = AR_DIACRITICS.sub("", s)
-    s = s.replace("آ", "ا").replace("أ", "ا").replace("إ", "ا")
-    s = s.replace("ى", "ي").replace("ة", "ه")
-    s = re.sub(r"\s+", " ", s)
-    return s
-
-# english + arabic friendly cleaner -> used to build matching keys
-_RE_NON_WORD = re.compile(r"[^a-z0-9\u0600-\u06FF]+", re.IGNORECASE)
-_RE_LONG_NUM = re.compile(r"\d{3,}")  # policy/CR long codes
-_STOPWORDS = {
-    # english/common company boilerplate
-    "co", "company", "insurance", "cooperative", "co-operative", "coop",
-    "inc", "ltd", "limited", "sa", "ksa",
-    # arabic boilerplate (after normalize_ar)
-    "شركه", "تعاونيه", "تامين", "تعاوني", "محدوده",
-}
-
-def make_key(s: Any) -> str:
-    """
-    A permissive key: lowercased, Arabic-normalized, drop punctuation & long numbers
-    and common boilerplate words, collapse spaces.
-    """
-    t = normalize_ar(s)
-    t = _RE_LONG_NUM.sub(" ", t)         # drop long number blocks
-    t = _RE_NON_WORD.sub(" ", t)         # punctuation & separators -> space
-    parts = [p for p in t.split() if p and p not in _STOPWORDS]
-    return " ".join(parts)
-
 def to_title(s: Any) -> str:
     t = str(s or "").strip()
     return " ".join(w[:1].upper() + w[1:] for w in t.split())
 
-def to_date_yyyy_mm_dd(v) -> Optional[str]:
-    if v is None or (isinstance(v, float) and pd.isna(v)):
-        return None
-    d = pd.to_datetime(v, errors="coerce")
-    if pd.isna(d):
-        return None
-    return d.strftime("%Y-%m-%d")
-
 _NUMERIC_COLS = [
     "gross_amount_no_vat", "vat_amount", "discount",
     "deductible", "special_discount", "net_amount"
 ]
 
-_df_cache: Optional[pd.DataFrame] = None
-_last_mtime: Optional[float] = None
-
-def load_df() -> pd.DataFrame:
-    global _df_cache, _last_mtime
-    mtime = os.path.getmtime(EXCEL_PATH) if os.path.exists(EXCEL_PATH) else None
-    if _df_cache is not None and mtime == _last_mtime:
-        return _df_cache
+def _treatment_date(base: pd.DataFrame) -> pd.Series:
+    """Treatment Date، وإلا INCUR_DATE_FROM ثم INCUR_DATE_TO (محلّلة في ingest)."""
+    if "treatment_dt" in base.columns:
+        dt = base["treatment_dt"]
+    elif "incur_from_dt" in base.columns:
+        dt = base["incur_from_dt"]
+        if "incur_to_dt" in base.columns:
+            dt = dt.fillna(base["incur_to_dt"])
+    else:
+        return pd.Series(None, index=base.index, dtype=object)
+    return dt.dt.strftime("%Y-%m-%d").astype(object).where(dt.notna(), None)
 
-    df = pd.read_excel(EXCEL_PATH, engine="openpyxl")
-    keep = [c for c in COLUMNS if c in df.columns]
-    df = df[keep].copy()
+def _build_insurance_view(base: pd.DataFrame) -> pd.DataFrame:
+    keep = [c for c in COLUMNS if c in base.columns]
+    df = base[keep].copy()
     df.rename(columns=RENAME, inplace=True)
 
     if "company" not in df.columns:
         df["company"] = df.get("contract", "")
 
-    if "treatment_date" not in df.columns:
-        df["treatment_date"] = df.get("incur_date_from")
-        nulls = df["treatment_date"].isna()
-        if "incur_date_to" in df.columns:
-            df.loc[nulls, "treatment_date"] = df.loc[nulls, "incur_date_to"]
-    df["treatment_date"] = df["treatment_date"].apply(to_date_yyyy_mm_dd)
+    df["treatment_date"] = _treatment_date(base)
 
     for col in ["inv_no", "company", "contract", "claim_type", "pay_to",
                 "refer_ind", "emer_ind"]:
@@ -140,94 +109,244 @@ def load_df() -> pd.DataFrame:
             df[col] = pd.to_numeric(df[col], errors="coerce")
 
     # ---- prebuilt matching keys (fast + robust) ----
-    df["company_key"]  = df["company"].apply(make_key)
-    df["claim_key"]    = df["claim_type"].apply(make_key)
-    df["pay_key"]      = df["pay_to"].apply(make_key)
-    df["contract_key"] = df["contract"].apply(make_key)
+    df["company_key"]  = make_key_series(df["company"])
+    df["claim_key"]    = make_key_series(df["claim_type"])
+    df["pay_key"]      = make_key_series(df["pay_to"])
+    df["contract_key"] = make_key_series(df["contract"])
+
+    return df
+
+_KEY_COLS = ["company_key", "claim_key", "pay_key", "contract_key"]
+
+# low-cardinality text columns, stored dictionary-encoded in the shared cache
+CATEGORIES = [
+    "company", "contract", "claim_type", "pay_to", "refer_ind", "emer_ind",
+    "treatment_date", *_KEY_COLS,
+]
 
-    _df_cache = df
-    _last_mtime = mtime
-    return _df_cache
+def _index_insurance_view(df: pd.DataFrame) -> dict:
+    idx = build_indexes(df, _KEY_COLS)
+    idx["inv_no"] = ColumnIndex(df["inv_no"].astype(str))
+    idx["treatment_date"] = DateIndex(
+        pd.to_datetime(df["treatment_date"], format="%Y-%m-%d", errors="coerce")
+    )
+    return idx
 
-def filter_records(
-    df: pd.DataFrame,
+def insurance_rollup(df: pd.DataFrame) -> Dict[str, Any]:
+    """Totals for /insurance/stats: claims and amounts per company, claim type, payee and day."""
+    amounts = {c: df[c] for c in ("gross_amount_no_vat", "net_amount") if c in df.columns}
+    return {
+        **summarize(df),
+        "by_company": count_by(map_distinct(df["company"], to_title), **amounts),
+        "by_claim_type": count_by(map_distinct(df["claim_type"], to_title), **amounts),
+        "by_pay_to": count_by(map_distinct(df["pay_to"], to_title), **amounts),
+        "by_day": count_by(df["treatment_date"], by_key=True, **amounts),
+    }
+
+def merge_insurance_rollup(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Previous version's totals plus the appended rows'; companies are recounted from by_company."""
+    out = merge_rollups(old, new)
+    out["total_companies"] = len(out["by_company"])
+    return out
+
+registry.register(
+    "insurance",
+    _build_insurance_view,
+    lambda: Path(EXCEL_PATH),
+    COLUMNS,
+    indexer=_index_insurance_view,
+    rollup=insurance_rollup,
+    rollup_merge=merge_insurance_rollup,
+    categories=CATEGORIES,
+)
+
+def select_records(
+    view: RecordView,
     q: str = "",
     company: str = "",
     claim_type: str = "",
     date: str = "",
-) -> pd.DataFrame:
-    out = df
+    date_from: str = "",
+    date_to: str = "",
+) -> Rows:
+    """
+    مواقع الصفوف المطابقة. كل مطابقات المفاتيح "يحتوي" (startswith حالة خاصة منها)،
+    وتُحسب من فهارس الـ view بدل المرور على كل الصفوف.
+    """
+    idx = view.indexes
+    sel = None
 
     if company:
         key = make_key(company)
         if key:
-            out = out[
-                out["company_key"].str.contains(key, na=False)
-                | out["company_key"].str.startswith(key, na=False)
-                | out["contract_key"].str.contains(key, na=False)
-            ]
+            sel = intersect(sel, union([
+                idx["company_key"].contains(key),
+                idx["contract_key"].contains(key),
+            ]))
 
     if claim_type:
         key = make_key(claim_type)
         if key:
-            out = out[
-                out["claim_key"].str.contains(key, na=False)
-                | out["claim_key"].str.startswith(key, na=False)
-            ]
+            sel = intersect(sel, idx["claim_key"].contains(key))
 
     if date:
-        out = out[out["treatment_date"] == date]
+        # تطابق حرفي مع YYYY-MM-DD كما كان: أي صيغة أخرى لا تطابق شيئًا
+        d = parse_day(date)
+        if d is not None and d.isoformat() == date:
+            sel = intersect(sel, idx["treatment_date"].on(d))
+        else:
+            sel = np.empty(0, dtype=np.int64)
+
+    if date_from or date_to:
+        d_from, d_to = parse_day(date_from), parse_day(date_to)
+        if d_from or d_to:
+            sel = intersect(sel, idx["treatment_date"].between(d_from, d_to))
 
     if q:
         key = make_key(q)
         if key:
-            out = out[
-                out["company_key"].str.contains(key, na=False)
-                | out["claim_key"].str.contains(key, na=False)
-                | out["pay_key"].str.contains(key, na=False)
-                | out["contract_key"].str.contains(key, na=False)
-                | out["inv_no"].astype(str).str.contains(key, na=False)
-            ]
+            cols = _KEY_COLS + ["inv_no"]
+            sel = intersect(sel, union([idx[c].contains(key) for c in cols]))
 
-    return out
+    return sel
 
-def as_api_rows(df: pd.DataFrame) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
-    for _, r in df.iterrows():
-        rows.append({
-            "inv_no": str(r.get("inv_no", "") or ""),
-            "company": to_title(r.get("company", "")),
-            "claim_type": to_title(r.get("claim_type", "")),
-            "gross_amount_no_vat": float(r["gross_amount_no_vat"]) if pd.notna(r.get("gross_amount_no_vat")) else None,
-            "vat_amount": float(r["vat_amount"]) if pd.notna(r.get("vat_amount")) else None,
-            "discount": float(r["discount"]) if pd.notna(r.get("discount")) else None,
-            "deductible": float(r["deductible"]) if pd.notna(r.get("deductible")) else None,
-            "special_discount": float(r["special_discount"]) if pd.notna(r.get("special_discount")) else None,
-            "net_amount": float(r["net_amount"]) if pd.notna(r.get("net_amount")) else None,
-            "pay_to": to_title(r.get("pay_to", "")),
-            "refer_ind": (str(r.get("refer_ind", "")).strip() or "").upper(),
-            "emer_ind": (str(r.get("emer_ind", "")).strip() or "").upper(),
-            "treatment_date": r.get("treatment_date", None),
-        })
-    return rows
+def api_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Columnar form of the API rows: the same conversions as the old per-row loop,
+    done as column operations (title-casing per distinct value, NaN kept as NaN
+    and written as null by the JSON encoder).
+    """
+    col = lambda name: df[name] if name in df.columns else pd.Series(None, index=df.index, dtype=object)
+    out = pd.DataFrame(index=df.index)
+    out["inv_no"] = map_distinct(col("inv_no"), lambda v: str(v or ""))
+    out["company"] = map_distinct(col("company"), to_title)
+    out["claim_type"] = map_distinct(col("claim_type"), to_title)
+    for name in _NUMERIC_COLS:
+        out[name] = pd.to_numeric(col(name), errors="coerce").astype(float)
+    out["pay_to"] = map_distinct(col("pay_to"), to_title)
+    for name in ("refer_ind", "emer_ind"):
+        out[name] = col(name).astype(str).str.strip().str.upper()
+    out["treatment_date"] = col("treatment_date")
+    return decode(out)
 
-@router.get("/records")
-def get_records(
+SORT_KEYS = {
+    "date": "treatment_date",
+    "inv_no": "inv_no",
+    "company": "company_key",
+    "claim_type": "claim_key",
+    "gross_amount": "gross_amount_no_vat",
+    "net_amount": "net_amount",
+    "discount": "discount",
+}
+
+def summarize(df: pd.DataFrame) -> Dict[str, int]:
+    """إحصاءات كل النتائج المفلترة (قبل الترقيم)، بنفس قواعد api_frame."""
+    flag = lambda col: df[col].astype(str).str.strip().str.upper() == "Y"
+    # العناوين تُحسب للقيم المميزة فقط
+    # نفس استبعاد count_by (فارغ أو nan) حتى يساوي العدد طول by_company
+    companies = {t for t in map(to_title, df["company"].unique()) if t and t.lower() != "nan"}
+    return {
+        "total_claims": int(len(df)),
+        "total_companies": len(companies),
+        "alerts_count": int((flag("emer_ind") | flag("refer_ind")).sum()),
+    }
+
+@dataclass(frozen=True)
+class InsuranceQuery:
+    q: str = ""
+    company: str = ""
+    claim_type: str = ""
+    date: str = ""
+    date_from: str = ""
+    date_to: str = ""
+
+async def insurance_query(
     q: str = Query("", description="Free text over company/claim_type/pay_to/inv_no"),
     company: str = Query("", description="Company loose match (Arabic/English)"),
     claim_type: str = Query("", description="Claim type loose match"),
     date: str = Query("", description="Exact Gregorian date YYYY-MM-DD"),
+    date_from: str = Query("", description="From date, inclusive (YYYY-MM-DD)"),
+    date_to: str = Query("", description="To date, inclusive (YYYY-MM-DD)"),
+) -> InsuranceQuery:
+    """Same filters for /records, /export and /stats."""
+    return InsuranceQuery(q, company, claim_type, date, date_from, date_to)
+
+_NO_FILTERS = ("", "", "", None, None, None)
+
+def query_key(f: InsuranceQuery) -> tuple:
+    """الفلاتر بعد التطبيع: نفس المفتاح = نفس النتائج (مفتاح كاش النتائج)."""
+    exact = None
+    if f.date:
+        d = parse_day(f.date)
+        exact = d if d is not None and d.isoformat() == f.date else "invalid"
+    return (
+        make_key(f.q) if f.q else "",
+        make_key(f.company) if f.company else "",
+        make_key(f.claim_type) if f.claim_type else "",
+        exact,
+        parse_day(f.date_from),
+        parse_day(f.date_to),
+    )
+
+def query_records(view: RecordView, f: InsuranceQuery) -> Dict[str, Any]:
+    """Matching row positions + summary of all of them, cached per dataset version."""
+
+    def compute() -> Dict[str, Any]:
+        sel = select_records(view, **asdict(f))
+        return {
+            "rows": np.arange(len(view.frame)) if sel is None else sel,
+            "totals": summarize(take(view.frame, sel)),
+        }
+
+    return query_cache.get_or_compute("insurance", view.version, query_key(f), compute)
+
+@router.get("/records")
+@offload
+def get_records(
+    f: InsuranceQuery = Depends(insurance_query),
+    sort: str = Query("", description="Sort key: " + " | ".join(SORT_KEYS)),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="asc | desc"),
+    page: int = Query(1, ge=1, description="Page number (optional)"),
+    page_size: int = Query(PAGE_SIZE, ge=1, le=5000, description="Page size (optional)"),
 ):
-    df = load_df()
-    filtered = filter_records(df, q=q, company=company, claim_type=claim_type, date=date)
-
-    recs = as_api_rows(filtered)
-    alerts = sum(1 for r in recs if (r.get("emer_ind") == "Y") or (r.get("refer_ind") == "Y"))
-    companies = {r.get("company", "").strip() for r in recs if r.get("company")}
-    payload = {
-        "total_claims": len(recs),
-        "total_companies": len(companies),
-        "alerts_count": alerts,
-        "records": recs,
-    }
-    return JSONResponse(payload)
+    view = registry.view("insurance")
+    result = query_records(view, f)
+
+    positions = order_rows(view.frame, result["rows"], sort, order, SORT_KEYS)
+    positions = page_slice(positions, page, page_size)
+    return records_response(dict(result["totals"]), api_frame(view.frame.iloc[positions]))
+
+@router.get("/export")
+@offload
+def export_records(
+    f: InsuranceQuery = Depends(insurance_query),
+    sort: str = Query("", description="Sort key: " + " | ".join(SORT_KEYS)),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="asc | desc"),
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="csv | ndjson"),
+):
+    """All filtered claims as CSV or NDJSON, streamed in chunks."""
+    view = registry.view("insurance")
+    positions = order_rows(view.frame, query_records(view, f)["rows"], sort, order, SORT_KEYS)
+    return stream_export(
+        view.frame, positions, lambda chunk, _: api_frame(chunk), format, "insurance_records"
+    )
+
+@router.get("/stats")
+@offload
+def get_stats(
+    f: InsuranceQuery = Depends(insurance_query),
+    limit: int = Query(50, ge=1, le=5000, description="Max items per by_* list (by_day is never cut)"),
+):
+    """Pre-aggregated chart data: the per-version rollup, or the rollup of the filtered claims."""
+    view = registry.view("insurance")
+    key = query_key(f)
+    if key == _NO_FILTERS:
+        stats = view.rollups
+    else:
+        stats = query_cache.get_or_compute(
+            "insurance_stats",
+            view.version,
+            key,
+            lambda: insurance_rollup(take(view.frame, select_records(view, **asdict(f)))),
+        )
+    return limit_rollup(stats, limit)
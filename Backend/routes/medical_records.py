@@ -1,148 +1,38 @@
 # Backend/routers/medical.py
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, Query
+from dataclasses import dataclass
+from datetime import date
+from typing import NamedTuple
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from datetime import datetime
-import os
-import re
-
-router = APIRouter(prefix="/medical", tags=["Medical Records"])
-
-# ========================= Normalization helpers =========================
-
-_AR_DIACRITICS = r"[\u064B-\u065F\u0610-\u061A]"  # التشكيل العربي
-_AR_NUMS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
-_ICD_RE = re.compile(r"([A-Za-z]\d{1,2}(?:\.\d+)?)")  # أمثلة: E11 أو E03.9
-
-TITLES = {
-    "dr",
-    "dr.",
-    "doctor",
-    "prof",
-    "prof.",
-    "mr",
-    "mrs",
-    "ms",
-    "د",
-    "د.",
-    "دكتور",
-    "الدكتور",
-    "أ.",
-    "أ.د",
-    "بروف",
-    "البروف",
-    "أستاذ",
-}
-
-
-def _strip_titles_str(txt: str) -> str:
-    s = str(txt or "").strip()
-    s = re.sub(r"[\\\/]+", " ", s)  # \ أو / → مسافة
-    s = re.sub(r"[.,;:_]+", " ", s)  # فواصل تعتبر فواصل كلمات
-    parts = re.split(r"\s+", s)
-    out = [p for p in parts if p and p.lower().strip(".") not in TITLES]
-    return " ".join(out).strip()
-
-
-def _strip_titles_series(s: pd.Series) -> pd.Series:
-    s = s.astype(str).str.strip()
-    s = s.str.replace(r"[\\\/]+", " ", regex=True)
-    s = s.str.replace(r"[.,;:_]+", " ", regex=True)
-    parts = s.str.split(r"\s+", regex=True)
-    return parts.apply(
-        lambda lst: " ".join(
-            [p for p in lst if p and p.lower().strip(".") not in TITLES]
-        ).strip()
-    )
-
-
-def _norm_common(x):
-    """
-    تطبيع عام: يحوّل الأرقام العربية/الفارسية، يزيل التشكيل،
-    يوحد همزات/ألفات، يحول \ / | إلى مسافة، وينظف المسافات.
-    يدعم str و Series.
-    """
-
-    def _norm_one(s: str) -> str:
-        s = s.translate(_AR_NUMS)
-        s = re.sub(_AR_DIACRITICS, "", s)
-        s = (
-            s.replace("آ", "ا")
-            .replace("أ", "ا")
-            .replace("إ", "ا")
-            .replace("ى", "ي")
-            .replace("ة", "ه")
-        )
-        s = re.sub(r"[‐–—]+", "-", s)
-        s = re.sub(r"[\\\/|]+", " ", s)
-        s = re.sub(r"[(),.;:]+", " ", s)
-        s = re.sub(r"\s+", " ", s).strip()
-        return s.lower()
-
-    if isinstance(x, pd.Series):
-        return x.astype(str).str.strip().apply(_norm_one)
-    return _norm_one(str(x or "").strip())
 
+from Backend.compact import decode
+from Backend.dataset import RecordView, registry, resolve_workbook_path
+from Backend.dates import format_ymd, parse_day
+from Backend.executor import offload
+from Backend.normalize import (
+    icd_root_series,
+    norm_common,
+    norm_icd,
+    norm_icd_series,
+    norm_name,
+)
+from Backend.query_cache import query_cache
+from Backend.responses import records_response, stream_export
+from Backend.rollups import count_by, limit_rollup, merge_rollups
+from Backend.search_index import (
+    DateIndex,
+    IcdIndex,
+    Rows,
+    build_indexes,
+    intersect,
+    narrow,
+    take,
+    union,
+)
 
-def _norm_name(x, drop_titles: bool = True):
-    if isinstance(x, pd.Series):
-        s = _strip_titles_series(x) if drop_titles else x.astype(str)
-        return _norm_common(s)
-    else:
-        base = _strip_titles_str(x) if drop_titles else str(x or "")
-        return _norm_common(base)
-
-
-def _norm_icd_str(txt: str) -> str:
-    if not txt:
-        return ""
-    m = _ICD_RE.search(str(txt))
-    return m.group(1).upper() if m else _norm_common(str(txt)).upper()
-
-
-def _norm_icd_series(s: pd.Series) -> pd.Series:
-    return s.astype(str).apply(_norm_icd_str)
-
-
-def _icd_root_str(txt: str) -> str:
-    code = _norm_icd_str(txt)
-    return code.split(".")[0] if code else ""
-
-
-def _icd_root_series(s: pd.Series) -> pd.Series:
-    return _norm_icd_series(s).str.split(".").str[0]
-
-
-def _to_datetime_any(x: str):
-    """
-    يدعم:
-      - سيريال إكسل (مثل 45567) = أيام منذ 1899-12-30
-      - نصوص أرقام مثل ddmmyyyy أو yyyymmdd
-      - صيغ شائعة: 4/9/2025 أو 04-09-2025
-    """
-    s = str(x).strip()
-    if not s or s.lower() in ("nan", "none"):
-        return pd.NaT
-
-    # Excel serial: 3-5 digits
-    if re.fullmatch(r"\d{3,5}", s):
-        try:
-            n = int(s)
-            return pd.Timestamp("1899-12-30") + pd.to_timedelta(n, unit="D")
-        except Exception:
-            pass
-
-    if re.fullmatch(r"\d+(?:\.\d+)?", s):
-        s2 = s.split(".")[0].zfill(8)
-        for fmt in ("%d%m%Y", "%Y%m%d"):
-            try:
-                return datetime.strptime(s2, fmt)
-            except Exception:
-                pass
-
-    return pd.to_datetime(s, errors="coerce", dayfirst=True)
-
+router = APIRouter(prefix="/medical", tags=["Medical Records"])
 
 # =============================== Load ===============================
 
@@ -152,30 +42,31 @@ def _resolve_data_path() -> Path:
     يقرأ المسار من متغير البيئة MEDICAL_XLSX إن وُجد،
     وإلا يستخدم Backend/data/medical_records.xlsx بالنسبة لملف الراوتر.
     """
-    env = os.getenv("MEDICAL_XLSX")
-    if env:
-        return Path(env).expanduser().resolve()
-    return Path(__file__).resolve().parents[1] / "data" / "medical_records.xlsx"
+    return resolve_workbook_path("MEDICAL_XLSX")
 
 
 def load_medical_records() -> pd.DataFrame:
-    data_path = _resolve_data_path()
-    df = pd.read_excel(data_path, engine="openpyxl")
-
-    # الأعمدة المطلوبة فقط
-    columns = [
-        "Name",
-        "Patient Name",
-        "Treatment Date",
-        "ICD10CODE",
-        "Chief Complaint",
-        "SignificantSignes",
-        "CLAIM_TYPE",
-        "REFER_IND",
-        "EMER_IND",
-        "Contract",
-    ]
-    df = df[[c for c in columns if c in df.columns]].copy()
+    """النسخة المطبّعة من الكاش المشترك (لا تعدّلها في مكانها)."""
+    return registry.get("medical")
+
+
+# الأعمدة المطلوبة فقط
+COLUMNS = [
+    "Name",
+    "Patient Name",
+    "Treatment Date",
+    "ICD10CODE",
+    "Chief Complaint",
+    "SignificantSignes",
+    "CLAIM_TYPE",
+    "REFER_IND",
+    "EMER_IND",
+    "Contract",
+]
+
+
+def _build_medical_view(base: pd.DataFrame) -> pd.DataFrame:
+    df = base[[c for c in COLUMNS if c in base.columns]].copy()
 
     # إعادة التسمية
     df.columns = [
@@ -191,20 +82,19 @@ def load_medical_records() -> pd.DataFrame:
         "contract",
     ]
 
-    # التواريخ (+ نص YYYY-MM-DD)
-    td = df["treatment_date"].astype(str).str.strip()
-    df["treatment_date"] = td.apply(_to_datetime_any)
-    df["treatment_date_str"] = df["treatment_date"].dt.strftime("%Y-%m-%d").fillna("")
+    # التواريخ (محلّلة مرة واحدة في ingest) + نص YYYY-MM-DD
+    df["treatment_date"] = base["treatment_dt"]
+    df["treatment_date_str"] = format_ymd(df["treatment_date"])
 
     # تطبيع أسماء الطبيب/المريض
-    df["norm_doctor_name_raw"] = _norm_common(df["doctor_name"])  # مع الألقاب
-    df["norm_doctor_name"] = _norm_name(df["doctor_name"], True)  # بدون ألقاب
-    df["norm_patient_name"] = _norm_name(df["patient_name"], True)
+    df["norm_doctor_name_raw"] = norm_common(df["doctor_name"])  # مع الألقاب
+    df["norm_doctor_name"] = norm_name(df["doctor_name"], True)  # بدون ألقاب
+    df["norm_patient_name"] = norm_name(df["patient_name"], True)
 
     # أشكال ICD
-    df["icd_code"] = _norm_icd_series(df["ICD10CODE"])  # مثال: E11 أو E03.9
-    df["icd_root"] = _icd_root_series(df["ICD10CODE"])  # مثال: E11
-    df["norm_ICD10CODE"] = _norm_common(df["ICD10CODE"])  # fallback نصي
+    df["icd_code"] = norm_icd_series(df["ICD10CODE"])  # مثال: E11 أو E03.9
+    df["icd_root"] = icd_root_series(df["ICD10CODE"])  # مثال: E11
+    df["norm_ICD10CODE"] = norm_common(df["ICD10CODE"])  # fallback نصي
 
     # تطبيع باقي الحقول النصية
     for col in [
@@ -215,154 +105,332 @@ def load_medical_records() -> pd.DataFrame:
         "emer_ind",
         "contract",
     ]:
-        df[f"norm_{col}"] = _norm_common(df[col])
-
-    # حقل تحليلات AI (placeholder)
-    df["ai_analysis"] = "No analysis yet — will be added by AI Agent."
+        df[f"norm_{col}"] = norm_common(df[col])
 
     return df
 
 
-# =============================== Route ===============================
+# أعمدة قليلة القيم تُخزّن مرمّزة (category) في الكاش المشترك
+CATEGORIES = [
+    "doctor_name",
+    "norm_doctor_name",
+    "norm_doctor_name_raw",
+    "patient_name",
+    "norm_patient_name",
+    "ICD10CODE",
+    "norm_ICD10CODE",
+    "icd_code",
+    "icd_root",
+    "claim_type",
+    "norm_claim_type",
+    "refer_ind",
+    "norm_refer_ind",
+    "emer_ind",
+    "norm_emer_ind",
+    "contract",
+    "norm_contract",
+    "treatment_date_str",
+]
+
+
+def _index_medical_view(df: pd.DataFrame) -> dict:
+    """فهارس البحث النصي: كل أعمدة norm_* + أشكال ICD."""
+    cols = [c for c in df.columns if c.startswith("norm_")]
+    idx = build_indexes(df, cols + ["icd_code", "icd_root"])
+    idx["icd"] = IcdIndex(idx["icd_code"], idx["icd_root"])
+    idx["treatment_date"] = DateIndex(df["treatment_date"])
+    return idx
+
+
+def alert_mask(df: pd.DataFrame) -> pd.Series:
+    """عاجل أو تحويل."""
+    return (df["emer_ind"].astype(str).str.upper() == "Y") | (
+        df["refer_ind"].astype(str).str.upper() == "Y"
+    )
 
 
-@router.get("/records")
-def get_medical_records(
+def medical_rollup(df: pd.DataFrame) -> dict:
+    """تجميعات /medical/stats: عدد السجلات (والتنبيهات) لكل طبيب/مريض/جذر ICD/يوم."""
+    alerts = alert_mask(df)
+    return {
+        "total_records": int(len(df)),
+        "alerts_count": int(alerts.sum()),
+        "by_doctor": count_by(df["doctor_name"], alerts=alerts),
+        "by_patient": count_by(df["patient_name"], alerts=alerts),
+        "by_icd_root": count_by(df["icd_root"]),
+        "by_day": count_by(df["treatment_date_str"], by_key=True, alerts=alerts),
+    }
+
+
+registry.register(
+    "medical",
+    _build_medical_view,
+    _resolve_data_path,
+    COLUMNS,
+    indexer=_index_medical_view,
+    rollup=medical_rollup,
+    rollup_merge=merge_rollups,
+    categories=CATEGORIES,
+)
+
+
+# =============================== Filters ===============================
+
+
+@dataclass(frozen=True)
+class MedicalQuery:
+    q: str | None = None
+    doctor: str | None = None
+    patient: str | None = None
+    date: str | None = None
+    date_from: str | None = None
+    date_to: str | None = None
+    icd: str | None = None
+    category: str | None = None
+
+
+async def medical_query(
     q: str | None = Query(None, description="General search across all fields"),
     doctor: str | None = Query(None, description="Filter by doctor name"),
     patient: str | None = Query(None, description="Filter by patient name"),
     date: str | None = Query(None, description="Filter by date (YYYY-MM-DD)"),
+    date_from: str | None = Query(None, description="From date, inclusive (YYYY-MM-DD)"),
+    date_to: str | None = Query(None, description="To date, inclusive (YYYY-MM-DD)"),
     icd: str | None = Query(None, description="Filter by ICD10 code"),
     category: str | None = Query(
         None,
         description="optional: emergency | referral | with_contract | without_contract",
     ),
-    page: int = Query(1, ge=1, description="Page number (optional)"),
-    page_size: int = Query(500, ge=1, le=5000, description="Page size (optional)"),
-):
+) -> MedicalQuery:
+    """نفس الفلاتر لـ /records و /export و /stats."""
+    return MedicalQuery(q, doctor, patient, date, date_from, date_to, icd, category)
+
+
+# --- تصنيف الكروت (category) ---
+CATEGORY_MASKS = {
+    # الحالات العاجلة
+    "emergency": lambda df: df["emer_ind"].astype(str).str.upper() == "Y",
+    # حالات التحويل
+    "referral": lambda df: df["refer_ind"].astype(str).str.upper() == "Y",
+    # بعقد تأميني
+    "with_contract": lambda df: df["contract"].astype(str).str.strip() != "",
+    # بدون عقد تأميني
+    "without_contract": lambda df: df["contract"].astype(str).str.strip() == "",
+}
+
+
+class MedicalKey(NamedTuple):
+    """الفلاتر بعد التطبيع (None = بدون فلتر): مفتاح كاش النتائج ومدخل الفلترة."""
+
+    q: str | None
+    q_icd: str | None
+    doctor: str | None
+    patient: str | None
+    day: date | None
+    day_from: date | None
+    day_to: date | None
+    icd_code: str | None
+    icd_text: str | None
+    category: str | None
+
+
+def medical_key(f: MedicalQuery) -> MedicalKey:
+    category = f.category.lower() if f.category else None
+    return MedicalKey(
+        q=norm_common(f.q) if f.q else None,
+        q_icd=norm_icd(f.q) if f.q else None,
+        doctor=norm_name(f.doctor, drop_titles=True) if f.doctor else None,
+        patient=norm_name(f.patient, drop_titles=True) if f.patient else None,
+        day=parse_day(f.date),
+        day_from=parse_day(f.date_from),
+        day_to=parse_day(f.date_to),
+        icd_code=norm_icd(f.icd) if f.icd else None,
+        icd_text=norm_common(f.icd) if f.icd else None,
+        # لو القيمة غير صحيحة نتجاهلها ولا نفلتر
+        category=category if category in CATEGORY_MASKS else None,
+    )
+
+
+def select_medical(view: RecordView, k: MedicalKey) -> Rows:
     """
     فلترة مرنة:
-      - التاريخ يوم واحد.
+      - التاريخ يوم واحد، أو مدى date_from/date_to (شامل الطرفين).
       - الطبيب/المريض: تطابق تام → يبدأ بـ → يحتوي (على أشكال مطبّعة مع/بدون ألقاب).
       - ICD: كود كامل أو الجذر، مع startswith/contains.
       - category: تصنيف للسجلات (حالات عاجلة / تحويل / مع عقد / بدون عقد).
       - q: بحث عام عبر جميع الحقول المطبّعة + ICD.
-    يعاد total_records/total_doctors/alerts_count وفق النتائج بعد الفلاتر (قبل الترقيم).
     """
-    df = load_medical_records()
-
-    # --- التاريخ ---
-    if date:
-        try:
-            d = pd.to_datetime(date).date()
-            df = df[df["treatment_date"].dt.date == d]
-        except Exception:
-            pass
-
-    # --- الطبيب ---
-    if doctor:
-        k = _norm_name(doctor, drop_titles=True)
-        exact = (df["norm_doctor_name"] == k) | (df["norm_doctor_name_raw"] == k)
-        starts = df["norm_doctor_name"].str.startswith(k, na=False)
-        contains = df["norm_doctor_name"].str.contains(k, na=False) | df[
-            "norm_doctor_name_raw"
-        ].str.contains(k, na=False)
-        df = df[exact | starts | contains]
-
-    # --- المريض ---
-    if patient:
-        k = _norm_name(patient, drop_titles=True)
-        exact = df["norm_patient_name"] == k
-        starts = df["norm_patient_name"].str.startswith(k, na=False)
-        contains = df["norm_patient_name"].str.contains(k, na=False)
-        df = df[exact | starts | contains]
-
-    # --- ICD ---
-    if icd:
-        key_code = _norm_icd_str(icd)  # E11 أو E11.9
-        key_root = key_code.split(".")[0] if key_code else ""
-        k_any = _norm_common(icd)
-        mask_icd = (
-            (df["icd_code"] == key_code)
-            | df["icd_code"].str.startswith(key_code, na=False)
-            | (df["icd_root"] == key_root)
-            | df["icd_root"].str.startswith(key_root, na=False)
-            | df["norm_ICD10CODE"].str.contains(k_any, na=False)
-        )
-        df = df[mask_icd]
-
-    # --- بحث عام q ---
-    if q:
-        k = _norm_common(q)
-        k_icd = _norm_icd_str(q)
-        cols = [c for c in df.columns if c.startswith("norm_")]
-        stacks = [df[c].str.contains(k, na=False) for c in cols]
-        if k_icd:
-            stacks += [
-                df["icd_code"].str.contains(k_icd, na=False),
-                df["icd_root"].str.contains(k_icd.split(".")[0], na=False),
+    frame, idx = view.frame, view.indexes
+    sel = None  # مواقع الصفوف المطابقة حتى الآن (None = الكل)
+
+    # --- التاريخ (فهرس الأيام: بحث ثنائي على مدى) ---
+    if k.day:
+        sel = intersect(sel, idx["treatment_date"].on(k.day))
+    if k.day_from or k.day_to:
+        sel = intersect(sel, idx["treatment_date"].between(k.day_from, k.day_to))
+
+    # --- الطبيب / المريض (فهرس الأسماء) ---
+    # التطابق التام والبادئة حالتان خاصتان من "يحتوي"، فيكفي بحث واحد في القيم المميزة
+    if k.doctor is not None:
+        sel = intersect(sel, union([
+            idx["norm_doctor_name"].contains(k.doctor),
+            idx["norm_doctor_name_raw"].contains(k.doctor),  # مع الألقاب
+        ]))
+
+    if k.patient is not None:
+        sel = intersect(sel, idx["norm_patient_name"].contains(k.patient))
+
+    # --- ICD (فهرس هرمي: فصل → جذر → كود) ---
+    if k.icd_code is not None:
+        sel = intersect(sel, union([
+            idx["icd"].lookup(k.icd_code),  # يشمل التطابق التام للكود والجذر
+            idx["norm_ICD10CODE"].contains(k.icd_text),
+        ]))
+
+    # --- بحث عام q (فهرس ثلاثي الأحرف على القيم المميزة) ---
+    if k.q is not None:
+        hits = [idx[c].contains(k.q) for c in idx if c.startswith("norm_")]
+        if k.q_icd:
+            hits += [
+                idx["icd_code"].contains(k.q_icd),
+                idx["icd_root"].contains(k.q_icd.split(".")[0]),
             ]
-        mask = np.column_stack(stacks).any(axis=1) if stacks else np.array(
-            [], dtype=bool
-        )
-        df = df[mask]
+        sel = intersect(sel, union(hits))
 
     # --- تصنيف الكروت (category) ---
-    if category:
-        cat = category.lower()
-        emer = df["emer_ind"].astype(str).str.upper()
-        refer = df["refer_ind"].astype(str).str.upper()
-        has_contract = df["contract"].astype(str).str.strip() != ""
-
-        if cat == "emergency":  # الحالات العاجلة
-            df = df[emer == "Y"]
-        elif cat == "referral":  # حالات التحويل
-            df = df[refer == "Y"]
-        elif cat == "with_contract":  # بعقد تأميني
-            df = df[has_contract]
-        elif cat == "without_contract":  # بدون عقد تأميني
-            df = df[~has_contract]
-        # لو القيمة غير صحيحة نتجاهلها ولا نفلتر
+    if k.category is not None:
+        sel = narrow(frame, sel, CATEGORY_MASKS[k.category])
+
+    return sel
+
+
+def query_medical(view: RecordView, f: MedicalQuery) -> dict:
+    """
+    المواقع المرتبة + الإحصاءات (قبل الترقيم) لفلاتر الطلب، من كاش النتائج
+    إن كانت نفس الفلاتر المطبّعة قد طُلبت على نفس نسخة البيانات.
+    """
+
+    def compute() -> dict:
+        sel = select_medical(view, key)
+        df = take(view.frame, sel)
+        total = int(len(df))
+        return {
+            "positions": ordered_positions(view.frame, sel),
+            "totals": {
+                "total_records": total,
+                "total_doctors": int(df["doctor_name"].nunique()) if total > 0 else 0,
+                "alerts_count": int(alert_mask(df).sum()),
+            },
+        }
+
+    key = medical_key(f)
+    return query_cache.get_or_compute("medical", view.version, key, compute)
+
+
+def ordered_positions(frame: pd.DataFrame, sel: Rows) -> np.ndarray:
+    """ترتيب ثابت: الأحدث أولًا (يُرتّب عمود التاريخ فقط، لا الإطار كله)."""
+    dates = take(frame["treatment_date"], sel).reset_index(drop=True)
+    order = dates.sort_values(ascending=False).index.to_numpy()
+    return order if sel is None else sel[order]
+
+
+OUT_COLS = [
+    "id",
+    "doctor_name",
+    "patient_name",
+    "treatment_date_str",
+    "ICD10CODE",
+    "chief_complaint",
+    "significant_signs",
+    "claim_type",
+    "refer_ind",
+    "emer_ind",
+    "contract",
+    "ai_analysis",
+]
+
+# حقل تحليلات AI (placeholder): ثابت يُضاف عند الإخراج بدل تخزينه في كل صف
+AI_ANALYSIS = "No analysis yet — will be added by AI Agent."
+
+
+def api_frame(df: pd.DataFrame, first_id: int = 1) -> pd.DataFrame:
+    """أعمدة الإخراج لصفوف مرتبة؛ المعرّف = ترتيب الصف في النتائج."""
+    out = df.assign(id=np.arange(first_id, first_id + len(df), dtype=int), ai_analysis=AI_ANALYSIS)
+    out = decode(out[OUT_COLS]).rename(columns={"treatment_date_str": "treatment_date"})
+    # infer_objects قبل fillna: أعمدة object بقيم رقمية فقط كانت تُخفَّض ضمنيًا مع FutureWarning
+    return out.infer_objects(copy=False).fillna("")
 
-    # --- إحصاءات قبل الترقيم ---
-    total_after_filters = int(len(df))
-    total_doctors = int(df["doctor_name"].nunique()) if total_after_filters > 0 else 0
-    alerts_count = int(
-        (
-            (df["emer_ind"].astype(str).str.upper() == "Y")
-            | (df["refer_ind"].astype(str).str.upper() == "Y")
-        ).sum()
-    )
 
-    # --- ترتيب ثابت + معرّف ---
-    df = df.sort_values(["treatment_date"], ascending=[False]).reset_index(drop=True)
-    df["id"] = np.arange(1, len(df) + 1, dtype=int)
+# =============================== Route ===============================
+
+
+@router.get("/records")
+@offload
+def get_medical_records(
+    f: MedicalQuery = Depends(medical_query),
+    page: int = Query(1, ge=1, description="Page number (optional)"),
+    page_size: int = Query(500, ge=1, le=5000, description="Page size (optional)"),
+):
+    """يعاد total_records/total_doctors/alerts_count وفق النتائج بعد الفلاتر (قبل الترقيم)."""
+    view = registry.view("medical")
+    result = query_medical(view, f)
 
-    # --- ترقيم صفحات ---
+    # --- ترتيب ثابت (الأحدث أولًا) + ترقيم صفحات ---
     start = (page - 1) * page_size
-    end = start + page_size
-    df_page = df.iloc[start:end].copy()
+    positions = result["positions"][start : start + page_size]
+    out = api_frame(view.frame.iloc[positions], first_id=start + 1)
+    return records_response(dict(result["totals"]), out)
 
-    # --- الإخراج ---
-    out_cols = [
-        "id",
-        "doctor_name",
-        "patient_name",
-        "treatment_date_str",
-        "ICD10CODE",
-        "chief_complaint",
-        "significant_signs",
-        "claim_type",
-        "refer_ind",
-        "emer_ind",
-        "contract",
-        "ai_analysis",
-    ]
-    out = df_page[out_cols].rename(columns={"treatment_date_str": "treatment_date"})
 
-    return {
-        "total_records": total_after_filters,
-        "total_doctors": total_doctors,
-        "alerts_count": alerts_count,
-        "records": out.fillna("").to_dict(orient="records"),
-    }
+@router.get("/export")
+@offload
+def export_medical_records(
+    f: MedicalQuery = Depends(medical_query),
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="csv | ndjson"),
+):
+    """كل النتائج المفلترة (بنفس ترتيب /records) كملف CSV أو NDJSON يُبث على دفعات."""
+    view = registry.view("medical")
+    return stream_export(
+        view.frame,
+        query_medical(view, f)["positions"],
+        lambda chunk, offset: api_frame(chunk, first_id=offset + 1),
+        format,
+        "medical_records",
+    )
+
+
+@router.get("/stats")
+@offload
+def get_medical_stats(
+    f: MedicalQuery = Depends(medical_query),
+    limit: int = Query(50, ge=1, le=5000, description="Max items per by_* list (by_day is never cut)"),
+):
+    """
+    تجميعات جاهزة للرسوم بدل تنزيل السجلات: بدون فلاتر تُقرأ من التجميعات
+    المبنية مع نسخة البيانات، ومع الفلاتر تُحسب على النتائج وتُخزّن في كاش النتائج.
+    """
+    view = registry.view("medical")
+    key = medical_key(f)
+    if all(v is None for v in key):
+        stats = view.rollups
+    else:
+        stats = query_cache.get_or_compute(
+            "medical_stats",
+            view.version,
+            key,
+            lambda: medical_rollup(take(view.frame, select_medical(view, key))),
+        )
+    return limit_rollup(stats, limit)
+
+
+# ===== قائمة أكواد ICD (لقائمة الاختيار في الداشبورد) =====
+@router.get("/icd-codes")
+@offload
+def get_icd_codes(
+    root: str | None = Query(None, description="ICD root or prefix, e.g. E11 or E"),
+):
+    """الأكواد تحت الجذر المعطى مع عدد السجلات لكل كود، من الفهرس الهرمي مباشرة."""
+    index = registry.view("medical").indexes["icd"]
+    key = norm_icd(root).split(".")[0] if root else ""
+    codes = index.children(key)
+    return {"root": key, "total_codes": len(codes), "codes": codes}
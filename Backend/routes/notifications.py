@@ -1,15 +1,25 @@
 # Backend/notifications.py
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Literal, Optional
+from typing import List, Literal, Optional, Tuple, get_args
 from uuid import uuid4
 from datetime import datetime, timedelta
 import asyncio
 import json
 
+from Backend.broadcast import HEARTBEAT, Subscriber, notification_bus
+from Backend.notification_store import (
+    NotificationStore,
+    decode_cursor,
+    encode_cursor,
+    resolve_db_path,
+)
+from Backend.responses import FastJSONResponse
+
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
 # ===========================
@@ -35,24 +45,19 @@ class MarkReadPayload(BaseModel):
 
 
 # ===========================
-#   قاعدة بيانات بسيطة في الذاكرة
-#   (تكفي للهكاثون / الديمو)
+#   مخزن الإشعارات: فهارس في الذاكرة + SQLite محلي
+#   (يبقى بعد إعادة التشغيل)
 # ===========================
 
-NOTIFICATIONS: List[Notification] = []
+store = NotificationStore(resolve_db_path(), Notification)
 
 
 def _now_str() -> str:
     return datetime.now().strftime("%Y-%m-%d %H:%M")
 
 
-def seed_demo_notifications() -> None:
-    """إشعارات تجريبية لعرض الفكرة في الواجهة."""
-    global NOTIFICATIONS
-    if NOTIFICATIONS:
-        # تم التهيئة من قبل
-        return
-
+def _demo_notifications() -> List[Tuple[Notification, datetime]]:
+    """إشعارات تجريبية لعرض الفكرة في الواجهة (مع وقت إنشاء كل منها)."""
     base_time = datetime.now()
 
     demo = [
@@ -95,7 +100,12 @@ def seed_demo_notifications() -> None:
         ),
     ]
 
-    NOTIFICATIONS = demo
+    return [(n, datetime.strptime(n.time, "%Y-%m-%d %H:%M")) for n in demo]
+
+
+def seed_demo_notifications() -> None:
+    # مرة واحدة في عمر قاعدة البيانات (لا تعود بعد "مسح الكل")
+    store.seed_once(_demo_notifications)
 
 
 # تهيئة البيانات عند استيراد الموديول
@@ -105,50 +115,71 @@ seed_demo_notifications()
 # ===========================
 #       REST Endpoints
 # ===========================
+# دوال عادية (def) لا async: المخزن يكتب في SQLite (commit، وتحديث/مسح كل
+# الجدول في mark-all-read و delete)، فتعمل في threadpool الخاص بـ Starlette
+# بدل أن توقف الـ event loop وكل اتصالات الـ SSE معه.
 
 @router.get("", response_model=List[Notification])
-async def list_notifications(
+def list_notifications(
+    response: Response,
     kind: Optional[Kind] = None,
     severity: Optional[Severity] = None,
     q: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (optional, default: all)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
 ):
     """
     جلب قائمة الإشعارات مع فلاتر اختيارية:
     - kind: طبي / تأمين / دواء
     - severity: طارئ / تنبيه / معلومة
-    - q: بحث نصي في العنوان أو المحتوى
+    - q: بحث في العنوان أو المحتوى (كل كلمة بداية كلمة فيهما، بعد تطبيع العربي)
+    - limit / cursor: ترقيم بالمؤشر؛ إن بقيت نتائج يُرسل cursor الصفحة التالية
+      في الهيدر X-Next-Cursor
     """
-    data = NOTIFICATIONS
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor غير صالح")
 
-    if kind:
-        data = [n for n in data if n.kind == kind]
+    # مرتبة من الأحدث إلى الأقدم بوقت الإنشاء (فهارس النوع/الأهمية مرتبة مسبقًا)
+    page, next_key = store.query(kind or None, severity or None, q, after, limit)
+    if next_key is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(next_key)
+    return page
 
-    if severity:
-        data = [n for n in data if n.severity == severity]
 
-    if q:
-        q_lower = q.lower()
-        data = [
-            n
-            for n in data
-            if q_lower in n.title.lower() or q_lower in n.body.lower()
-        ]
+def _etag_matches(header: str, etag: str) -> bool:
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
 
-    # نعيد مرتبة من الأحدث إلى الأقدم
-    data = sorted(data, key=lambda n: n.time, reverse=True)
-    return data
+
+@router.get("/summary")
+def notifications_summary(request: Request):
+    """
+    عدد الإشعارات حسب النوع والأهمية وحالة القراءة (لشارات الواجهة)، من
+    عدّادات المخزن بدون المرور على القائمة. يدعم ETag / If-None-Match:
+    إن لم يتغير شيء يعاد 304 بدون محتوى.
+    """
+    etag, counts = store.summary()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    # كل الأنواع والأهميات موجودة دائمًا (بصفر إن لم يوجد منها شيء)
+    zero = {"total": 0, "unread": 0}
+    counts["by_kind"] = {k: counts["by_kind"].get(k, zero) for k in get_args(Kind)}
+    counts["by_severity"] = {s: counts["by_severity"].get(s, zero) for s in get_args(Severity)}
+    return FastJSONResponse(counts, headers=headers)
 
 
 @router.post("/mark-all-read")
-async def mark_all_read():
+def mark_all_read():
     """تعليم جميع الإشعارات كمقروءة."""
-    for n in NOTIFICATIONS:
-        n.read = True
-    return {"status": "ok", "updated": len(NOTIFICATIONS)}
+    return {"status": "ok", "updated": store.mark_all_read()}
 
 
 @router.post("/{noti_id}/mark-read")
-async def mark_read(
+def mark_read(
     noti_id: str,
     payload: MarkReadPayload,
 ):
@@ -156,31 +187,23 @@ async def mark_read(
     تغيير حالة إشعار واحد (read / unread).
     يستخدمه الفرونت عند الضغط على زر الصح.
     """
-    for n in NOTIFICATIONS:
-        if n.id == noti_id:
-            n.read = payload.read
-            return {"status": "ok", "id": noti_id, "read": n.read}
+    n = store.set_read(noti_id, payload.read)
+    if n is not None:
+        return {"status": "ok", "id": noti_id, "read": n.read}
 
     raise HTTPException(status_code=404, detail="الإشعار غير موجود")
 
 
 @router.delete("")
-async def delete_all():
+def delete_all():
     """مسح جميع الإشعارات (للديمو أو إعادة الضبط)."""
-    count = len(NOTIFICATIONS)
-    NOTIFICATIONS.clear()
-    return {"status": "ok", "deleted": count}
+    return {"status": "ok", "deleted": store.clear()}
 
 
 @router.delete("/{noti_id}")
-async def delete_one(noti_id: str):
+def delete_one(noti_id: str):
     """مسح إشعار واحد."""
-    global NOTIFICATIONS
-    before = len(NOTIFICATIONS)
-    NOTIFICATIONS = [n for n in NOTIFICATIONS if n.id != noti_id]
-    after = len(NOTIFICATIONS)
-
-    if before == after:
+    if not store.delete(noti_id):
         raise HTTPException(status_code=404, detail="الإشعار غير موجود")
 
     return {"status": "ok", "deleted": noti_id}
@@ -190,40 +213,68 @@ async def delete_one(noti_id: str):
 #      SSE Stream Endpoint
 # ===========================
 
+def _sse(n: Notification, event_id: int) -> str:
+    payload = json.dumps(n.dict(), ensure_ascii=False)
+    return f"id: {event_id}\ndata: {payload}\n\n"
+
+
+def _last_event_id(request: Request) -> Optional[int]:
+    """Last-Event-ID الذي يرسله EventSource عند إعادة الاتصال (-1 إذا كان غير صالح)."""
+    raw = request.headers.get("last-event-id")
+    if raw is None:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        return -1  # لا يطابق أي id عندنا ← resync
+
+
+async def _close_on_disconnect(request: Request, sub: Subscriber) -> None:
+    """ينهي الاشتراك عند قطع الاتصال من الفرونت (بدون polling)."""
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+    sub.close()
+
+
 async def _notifications_event_generator(request: Request):
     """
     مولّد لبث الإشعارات الجديدة باستخدام Server-Sent Events (SSE).
 
     الفكرة:
-    - نتتبع آخر عدد من الإشعارات.
-    - كلما زاد العدد نرسل آخر إشعار كـ JSON.
-    - في المشروع الفعلي يمكنك استبدال هذا بجلب من
-      الذكاء الاصطناعي أو من الـ Agent.
+    - كل اتصال مشترك في notification_bus بطابور خاص محدود الحجم.
+    - push_notification تنشر الإشعار فيصل فورًا لكل المشتركين، والاتصال
+      الخامل لا يستهلك شيئًا (لا استيقاظ دوري).
+    - المشترك البطيء الذي امتلأ طابوره يُفصل، والـ EventSource يعيد الاتصال.
+    - كل حدث له id متزايد؛ عند إعادة الاتصال يرسل المتصفح Last-Event-ID فنعيد
+      له ما فاته من الـ ring buffer فقط، بدل أن يعيد الفرونت تحميل القائمة.
+      إذا كان ما فاته أقدم من الـ buffer نرسل حدث resync (تحميل القائمة مرة واحدة).
+    - تعليق keep-alive كل HEARTBEAT ثانية من السكون حتى لا تقطع البروكسيات الاتصال.
     """
-    last_len = len(NOTIFICATIONS)
-
-    # عند أول اتصال يمكن إرسال آخر إشعار موجود (اختياري)
-    if NOTIFICATIONS:
-        last = NOTIFICATIONS[0]
-        payload = json.dumps(last.dict(), ensure_ascii=False)
-        yield f"data: {payload}\n\n"
-
-    while True:
-        # إغلاق عند قطع الاتصال من الفرونت
-        if await request.is_disconnected():
-            break
-
-        current_len = len(NOTIFICATIONS)
-        if current_len > last_len:
-            # تم إضافة إشعارات جديدة
-            new_items = NOTIFICATIONS[last_len:current_len]
-            for n in new_items:
-                payload = json.dumps(n.dict(), ensure_ascii=False)
-                yield f"data: {payload}\n\n"
-            last_len = current_len
-
-        # مهلة صغيرة لتخفيف الضغط
-        await asyncio.sleep(2)
+    last_event_id = _last_event_id(request)
+    with notification_bus.subscribe(after=last_event_id) as sub:
+        watch = asyncio.ensure_future(_close_on_disconnect(request, sub))
+        try:
+            if last_event_id is None:
+                # أول اتصال: آخر إشعار موجود (الاشتراك قبلها حتى لا يضيع ما يُنشر بينهما)
+                latest = store.latest()
+                if latest is not None:
+                    yield _sse(latest, sub.last_id)
+            elif sub.backlog is None:
+                yield f"id: {sub.last_id}\nevent: resync\ndata: {{}}\n\n"
+            else:
+                for event_id, n in sub.backlog:
+                    yield _sse(n, event_id)
+            while True:
+                try:
+                    event = await sub.get(HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:  # قُطع الاتصال أو فُصل المشترك أو توقف السيرفر
+                    break
+                yield _sse(event[1], event[0])
+        finally:
+            watch.cancel()
 
 
 @router.get("/stream")
@@ -256,6 +307,8 @@ def push_notification(
     يمكن استدعاؤها من أي جزء في الباك-اند (مثل Agent أو مهمة تحليل)
     لإضافة إشعار جديد إلى القائمة، وسيظهر تلقائيًا في الفرونت
     + عبر الـ SSE.
+
+    تكتب في SQLite (blocking): من كود async استخدموا push_notification_async.
     """
     n = Notification(
         id=str(uuid4()),
@@ -266,5 +319,11 @@ def push_notification(
         time=_now_str(),
         read=not mark_unread,
     )
-    NOTIFICATIONS.insert(0, n)
+    store.add(n)
+    notification_bus.publish(n)
     return n
+
+
+async def push_notification_async(**kwargs) -> Notification:
+    """نفس push_notification لكود async: الكتابة في SQLite تتم في الـ threadpool."""
+    return await run_in_threadpool(push_notification, **kwargs)
@@ -0,0 +1,369 @@
+# Backend/search_index.py
+"""
+In-memory indexes over the normalized columns of a dataset view.
+
+Every indexed column is dictionary-encoded: its distinct values are kept in a
+sorted array and each row stores the code of its value, with rows grouped by
+code so the rows of any set of values can be fetched directly. Exact and
+prefix lookups are binary searches over the sorted values (all names sharing a
+prefix are one contiguous range of codes). Substring
+("contains") lookups go through a trigram index built over the distinct
+values: the trigrams of the key select candidate values by posting-list
+intersection, and candidates are verified with a plain substring test, so the
+result is exactly the rows whose value contains the key. Keys too short for
+trigrams, and keys with very many candidates, are matched against all
+distinct values at once by Backend/parallel_scan.py (vectorized, sharded over
+a process pool for large dictionaries).
+
+Dates are indexed as a permutation of the rows sorted by day, so any day or
+from/to range is one contiguous slice found by binary search.
+
+Row sets are sorted int64 arrays of row positions in the view's frame; the
+helpers at the bottom combine them (None means "all rows").
+
+When rows are appended to a view, merge_indexes() folds indexes built over the
+new rows alone into the existing ones: value dictionaries are unioned and old
+codes remapped, and rows are inserted into the sorted orders instead of
+re-sorting, so no text of the old rows is processed again.
+"""
+from __future__ import annotations
+
+import re
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from Backend.parallel_scan import ValueText
+
+_GRAM = 3
+_SHIFT = 21  # كل code point أقل من 2**21
+
+
+def _codepoints(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+
+
+def _gram_keys(cps: np.ndarray) -> np.ndarray:
+    if len(cps) < _GRAM:
+        return np.empty(0, dtype=np.int64)
+    return (cps[:-2] << (2 * _SHIFT)) | (cps[1:-1] << _SHIFT) | cps[2:]
+
+
+class NgramIndex:
+    """Trigram → sorted ids of the distinct values containing it."""
+
+    # فوق هذا العدد من المرشحين نبحث في نص القيم كله بدل التحقق من كل مرشح
+    _VERIFY_MAX = 2048
+
+    def __init__(self, values: np.ndarray) -> None:
+        self.values = values
+        # كل القيم في مصفوفة واحدة يفصلها \x00، ثم نستبعد الثلاثيات التي تعبر الفاصل
+        self.text = ValueText.of(values)
+        if len(values) == 0:
+            self._set_pairs(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+            return
+
+        cps = self.text.buf.astype(np.int64)
+        grams = _gram_keys(cps)
+        lens = np.diff(np.append(self.text.starts, len(cps) + 1)) - 1
+        owner = np.repeat(np.arange(len(values), dtype=np.int64), lens + 1)[: len(cps)]
+        nonzero = cps != 0
+        keep = nonzero[:-2] & nonzero[1:-1] & nonzero[2:]
+        self._set_pairs(grams[keep], owner[: len(keep)][keep])
+
+    def _set_pairs(self, grams: np.ndarray, owner: np.ndarray) -> None:
+        """أزواج (ثلاثي، id قيمة) → قوائم مرتبة بلا تكرار لكل ثلاثي."""
+        order = np.lexsort((owner, grams))
+        grams, owner = grams[order], owner[order]
+        first = np.ones(len(grams), dtype=bool)
+        first[1:] = (grams[1:] != grams[:-1]) | (owner[1:] != owner[:-1])
+        grams, owner = grams[first], owner[first]
+
+        self._keys, starts = np.unique(grams, return_index=True)
+        self._starts = np.append(starts, len(grams)).astype(np.int64)
+        self._postings = owner
+
+    def merged(
+        self, values: np.ndarray, ids: np.ndarray, other: "NgramIndex", other_ids: np.ndarray
+    ) -> "NgramIndex":
+        """فهرس القيم values من فهرسين: ids / other_ids تترجم ids كل منهما إليها."""
+        out = NgramIndex.__new__(NgramIndex)
+        out.values = values
+        out.text = self.text.concat(other.text, ids, other_ids)
+        out._set_pairs(
+            np.concatenate([
+                np.repeat(self._keys, np.diff(self._starts)),
+                np.repeat(other._keys, np.diff(other._starts)),
+            ]),
+            np.concatenate([ids[self._postings], other_ids[other._postings]]),
+        )
+        return out
+
+    def _posting(self, gram: int) -> np.ndarray:
+        i = np.searchsorted(self._keys, gram)
+        if i == len(self._keys) or self._keys[i] != gram:
+            return self._postings[:0]
+        return self._postings[self._starts[i] : self._starts[i + 1]]
+
+    def search(self, key: str) -> np.ndarray:
+        """ids القيم التي تحتوي key (مطابقة حرفية، وليست regex)."""
+        if key == "":
+            return np.arange(len(self.values), dtype=np.int64)
+        cps = _codepoints(key)
+        if (cps == 0).any():
+            return scan_values(self.values, key)
+        if len(cps) < _GRAM:
+            # مفتاح أقصر من ثلاثة أحرف: بحث في نص القيم المميزة كلها
+            return self.text.find(key)
+        grams = np.unique(_gram_keys(cps))
+
+        postings = sorted((self._posting(int(g)) for g in grams), key=len)
+        ids = postings[0]
+        for p in postings[1:]:
+            if len(ids) == 0:
+                break
+            ids = np.intersect1d(ids, p, assume_unique=True)
+        if len(ids) == 0 or len(key) == _GRAM:
+            return ids
+        if len(ids) > self._VERIFY_MAX:
+            return self.text.find(key)
+        # وجود كل الثلاثيات لا يعني تجاورها: نتحقق من المرشحين فقط
+        vals = self.values
+        return ids[np.fromiter((key in vals[i] for i in ids), dtype=bool, count=len(ids))]
+
+
+def scan_values(values: np.ndarray, key: str) -> np.ndarray:
+    hit = np.fromiter((key in v for v in values), dtype=bool, count=len(values))
+    return np.flatnonzero(hit)
+
+
+class ColumnIndex:
+    """Dictionary-encoded column with row postings and a trigram index."""
+
+    # فوق هذا العدد من القيم نبني قناعًا على الأكواد بدل جمع الشرائح
+    _MASK_THRESHOLD = 64
+
+    def __init__(self, s: pd.Series) -> None:
+        codes, uniques = pd.factorize(s, sort=True, use_na_sentinel=True)
+        values = np.asarray(uniques, dtype=object)
+        codes = codes.astype(np.int64)
+        order = np.argsort(codes, kind="stable")
+        self._setup(values, codes, order, codes[order], NgramIndex(values))
+
+    def _setup(
+        self,
+        values: np.ndarray,
+        codes: np.ndarray,
+        order: np.ndarray,
+        sorted_codes: np.ndarray,
+        ngrams: NgramIndex,
+    ) -> None:
+        self.values = values
+        self.codes = codes
+        self.n_rows = len(codes)
+        self._order = order
+        self._bounds = np.searchsorted(sorted_codes, np.arange(len(values) + 1))
+        self.ngrams = ngrams
+
+    def merge(self, other: "ColumnIndex", _merge: Any = None) -> "ColumnIndex":
+        """الفهرس بعد إلحاق صفوف other في آخر الإطار."""
+        values = np.union1d(self.values, other.values).astype(object)
+        # الترجمة رتيبة: ترتيب الصفوف القديمة يبقى مرتبًا بالأكواد الجديدة
+        ids = np.searchsorted(values, self.values)
+        other_ids = np.searchsorted(values, other.values)
+        codes = _remap(self.codes, ids)
+        new_codes = _remap(other.codes, other_ids)
+
+        old_sorted = codes[self._order]
+        new_order = np.argsort(new_codes, kind="stable")
+        at = np.searchsorted(old_sorted, new_codes[new_order], side="right")
+        out = ColumnIndex.__new__(ColumnIndex)
+        out._setup(
+            values,
+            np.concatenate([codes, new_codes]),
+            np.insert(self._order, at, new_order + self.n_rows),
+            np.insert(old_sorted, at, new_codes[new_order]),
+            self.ngrams.merged(values, ids, other.ngrams, other_ids),
+        )
+        return out
+
+    def rows(self, value_ids: np.ndarray) -> np.ndarray:
+        """مواقع الصفوف (مرتبة) لكل القيم المعطاة."""
+        if len(value_ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        if len(value_ids) > self._MASK_THRESHOLD:
+            hit = np.zeros(len(self.values) + 1, dtype=bool)
+            hit[value_ids] = True
+            # الكود -1 (قيمة فارغة) يقع على الخانة الأخيرة وهي False دائمًا
+            return np.flatnonzero(hit[self.codes])
+        parts = [self._order[self._bounds[i] : self._bounds[i + 1]] for i in value_ids]
+        return np.sort(np.concatenate(parts))
+
+    def value_range(self, lo: str, hi: Optional[str] = None) -> np.ndarray:
+        """ids القيم v حيث lo <= v < hi (بحث ثنائي في القيم المرتبة)."""
+        start = int(np.searchsorted(self.values, lo, side="left"))
+        end = len(self.values) if hi is None else int(np.searchsorted(self.values, hi, side="left"))
+        return np.arange(start, max(start, end), dtype=np.int64)
+
+    def exact_ids(self, key: str) -> np.ndarray:
+        i = int(np.searchsorted(self.values, key, side="left"))
+        if i < len(self.values) and self.values[i] == key:
+            return np.array([i], dtype=np.int64)
+        return np.empty(0, dtype=np.int64)
+
+    def prefix_ids(self, key: str) -> np.ndarray:
+        return self.value_range(key, _prefix_upper(key))
+
+    def exact(self, key: str) -> np.ndarray:
+        return self.rows(self.exact_ids(key))
+
+    def prefix(self, key: str) -> np.ndarray:
+        return self.rows(self.prefix_ids(key))
+
+    def contains(self, key: str) -> np.ndarray:
+        return self.rows(self.ngrams.search(key))
+
+
+def _remap(codes: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """أكواد بترقيم جديد للقيم؛ -1 (قيمة فارغة) يبقى -1."""
+    return np.append(ids, -1).astype(np.int64)[codes]
+
+
+def _prefix_upper(key: str) -> Optional[str]:
+    """أصغر نص أكبر من كل النصوص التي تبدأ بـ key (None = بلا حد أعلى)."""
+    key = key.rstrip(chr(0x10FFFF))
+    if not key:
+        return None
+    return key[:-1] + chr(ord(key[-1]) + 1)
+
+
+_ICD_CODE_RE = re.compile(r"[A-Z]\d{1,2}(?:\.\d+)?")
+
+
+class IcdIndex:
+    """
+    ICD-10 hierarchy over the normalized icd_code / icd_root columns:
+    chapter (letter) → root (E11) → full code (E11.9), with row counts.
+    Lookups are prefix ranges on the two sorted code dictionaries.
+    """
+
+    def __init__(self, codes: ColumnIndex, roots: ColumnIndex) -> None:
+        self.codes = codes
+        self.roots = roots
+        counts = np.diff(codes._bounds)
+        self.tree: Dict[str, Dict[str, List[tuple]]] = {}
+        for i, code in enumerate(codes.values):
+            if not _ICD_CODE_RE.fullmatch(code):
+                continue  # نصوص لا تحوي كودًا صالحًا تبقى للبحث النصي فقط
+            root = code.split(".")[0]
+            chapter = self.tree.setdefault(root[0], {})
+            chapter.setdefault(root, []).append((code, int(counts[i])))
+
+    def merge(self, other: "IcdIndex", merge: Callable[[Any, Any], Any]) -> "IcdIndex":
+        return IcdIndex(merge(self.codes, other.codes), merge(self.roots, other.roots))
+
+    def lookup(self, key_code: str) -> np.ndarray:
+        """صفوف الأكواد التي تبدأ بـ key_code أو جذرها يبدأ بجذره."""
+        key_root = key_code.split(".")[0] if key_code else ""
+        return union([self.codes.prefix(key_code), self.roots.prefix(key_root)])
+
+    def children(self, root_prefix: str = "") -> List[dict]:
+        """الأكواد تحت كل جذر يبدأ بـ root_prefix، مرتبة."""
+        chapters = [root_prefix[0]] if root_prefix else sorted(self.tree)
+        out = []
+        for ch in chapters:
+            for root in sorted(self.tree.get(ch, {})):
+                if root.startswith(root_prefix):
+                    out.extend(
+                        {"code": code, "root": root, "chapter": ch, "records": n}
+                        for code, n in self.tree[ch][root]
+                    )
+        return out
+
+
+class DateIndex:
+    """Rows ordered by calendar day (NaT excluded) with range lookups."""
+
+    def __init__(self, s: pd.Series) -> None:
+        # datetime64[D] يقتطع الوقت مثل .dt.date
+        days = s.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+        valid = np.flatnonzero(~np.isnat(days))
+        days = days[valid].astype(np.int64)
+        order = np.argsort(days, kind="stable")
+        self._days = days[order]
+        self._rows = valid[order]
+        self.n_rows = len(s)
+
+    def merge(self, other: "DateIndex", _merge: Any = None) -> "DateIndex":
+        """الفهرس بعد إلحاق صفوف other في آخر الإطار (إدراج بدل إعادة الترتيب)."""
+        at = np.searchsorted(self._days, other._days, side="right")
+        out = DateIndex.__new__(DateIndex)
+        out._days = np.insert(self._days, at, other._days)
+        out._rows = np.insert(self._rows, at, other._rows + self.n_rows)
+        out.n_rows = self.n_rows + other.n_rows
+        return out
+
+    @staticmethod
+    def _day(d: date) -> int:
+        return int(np.datetime64(d, "D").astype(np.int64))
+
+    def between(self, start: Optional[date] = None, end: Optional[date] = None) -> np.ndarray:
+        """صفوف الأيام start..end شاملة الطرفين (None = مفتوح)."""
+        lo = 0 if start is None else int(np.searchsorted(self._days, self._day(start), "left"))
+        hi = len(self._days) if end is None else int(np.searchsorted(self._days, self._day(end), "right"))
+        return np.sort(self._rows[lo:max(lo, hi)])
+
+    def on(self, d: date) -> np.ndarray:
+        return self.between(d, d)
+
+
+def build_indexes(frame: pd.DataFrame, columns: Iterable[str]) -> dict:
+    return {c: ColumnIndex(frame[c]) for c in columns if c in frame.columns}
+
+
+def merge_indexes(old: dict, delta: dict) -> dict:
+    """
+    فهارس الإطار بعد إلحاق صفوف في آخره: old مبني على الإطار القديم، وdelta
+    مبني بنفس الـ indexer على الصفوف الملحقة فقط. الفهرس المشترك (مثل أعمدة
+    IcdIndex) يُدمج مرة واحدة.
+    """
+    memo: Dict[int, Any] = {}
+
+    def merge(a: Any, b: Any) -> Any:
+        if id(a) not in memo:
+            memo[id(a)] = a.merge(b, merge)
+        return memo[id(a)]
+
+    return {name: merge(index, delta[name]) for name, index in old.items()}
+
+
+# ========================= Row-set helpers =========================
+
+Rows = Optional[np.ndarray]  # None = كل الصفوف
+
+
+def union(parts: List[np.ndarray]) -> np.ndarray:
+    if not parts:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(parts))
+
+
+def intersect(sel: Rows, rows: np.ndarray) -> np.ndarray:
+    if sel is None:
+        return rows
+    return np.intersect1d(sel, rows, assume_unique=True)
+
+
+def narrow(
+    frame: pd.DataFrame, sel: Rows, mask_fn: Callable[[pd.DataFrame], pd.Series]
+) -> np.ndarray:
+    """يطبّق فلترًا عاديًا (قناع pandas) على الصفوف المختارة حاليًا فقط."""
+    sub = frame if sel is None else frame.iloc[sel]
+    mask = np.asarray(mask_fn(sub), dtype=bool)
+    return np.flatnonzero(mask) if sel is None else sel[mask]
+
+
+def take(frame: pd.DataFrame, sel: Rows) -> pd.DataFrame:
+    return frame if sel is None else frame.iloc[sel]
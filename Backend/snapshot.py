@@ -0,0 +1,233 @@
+# Backend/snapshot.py
+"""
+Columnar snapshots of the normalized dataset views.
+
+Each view built from the workbook (with its norm_*, icd_*, *_key and parsed
+date columns) is written next to the source as an Arrow IPC snapshot. On the
+next cold start or reload the registry reads that file instead of parsing the
+xlsx again. A snapshot is only used when it was compiled from the same source
+file (mtime + size) by the same code (digest of the Backend sources).
+
+Loading is not zero-copy for the whole frame. The file is opened through a
+memory map and converted with split_blocks/self_destruct, so numeric and
+datetime columns without nulls stay read-only views over the mapped pages.
+Categorical columns come back as categoricals (one copy of each distinct
+value). The remaining text columns are materialized as Python strings.
+
+Next to the views, a small "source" snapshot keeps what incremental appends
+(HASEEF_INCREMENTAL=1) need from the workbook: its row count, column dtypes
+and last row (the anchor read_appended matches on). A registry started from
+snapshots can therefore extend the dataset without reading the xlsx first.
+
+Compile ahead of time with:
+
+    python -m Backend.snapshot [path/to/medical_records.xlsx]
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from Backend.ingest import SourceInfo
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    pa_ipc = None
+
+log = logging.getLogger(__name__)
+
+_BACKEND_DIR = Path(__file__).resolve().parent
+_META_STAMP = b"haseef.source_stamp"
+_META_CODE = b"haseef.code_digest"
+_META_NAN_COLS = b"haseef.nan_columns"
+_META_SOURCE_ROWS = b"haseef.source_rows"
+_META_SOURCE_DTYPES = b"haseef.source_dtypes"
+_SOURCE_VIEW = "source"
+_code_digest: Optional[bytes] = None
+
+
+def enabled() -> bool:
+    return pa is not None and os.getenv("HASEEF_SNAPSHOTS", "1") != "0"
+
+
+def snapshot_dir(source: Path) -> Path:
+    env = os.getenv("HASEEF_SNAPSHOT_DIR")
+    if env:
+        return Path(env).expanduser().resolve()
+    return source.parent / ".snapshots"
+
+
+def snapshot_path(source: Path, view: str) -> Path:
+    return snapshot_dir(source) / f"{source.stem}.{view}.arrow"
+
+
+def code_digest() -> bytes:
+    """بصمة كود الباك-اند: أي تعديل على طريقة البناء يُبطل اللقطات القديمة."""
+    global _code_digest
+    if _code_digest is None:
+        h = hashlib.sha1()
+        for p in sorted(_BACKEND_DIR.rglob("*.py")):
+            h.update(p.relative_to(_BACKEND_DIR).as_posix().encode())
+            h.update(p.read_bytes())
+        _code_digest = h.hexdigest().encode()
+    return _code_digest
+
+
+def _stamp_bytes(stamp: Optional[Tuple[int, int]]) -> bytes:
+    return repr(tuple(stamp) if stamp else None).encode()
+
+
+def _nan_columns(df: pd.DataFrame) -> list:
+    """أعمدة object التي قيمها الفارغة NaN (وليست None)."""
+    cols = []
+    for col in df.columns[df.dtypes == object]:
+        values = df[col].to_numpy()
+        missing = values[pd.isna(values)]
+        if len(missing) and isinstance(missing[0], float):
+            cols.append(col)
+    return cols
+
+
+def _restore_nan(df: pd.DataFrame, cols: list) -> pd.DataFrame:
+    # Arrow يعيد القيم الفارغة في أعمدة object كـ None بينما read_excel يعطي NaN،
+    # والفرق يظهر في astype(str) ("None" بدل "nan")
+    for col in cols:
+        values = df[col].to_numpy()
+        missing = pd.isna(values)
+        if missing.any():
+            values = values.copy()
+            values[missing] = np.nan
+            df[col] = values
+    return df
+
+
+def _read(
+    source: Path, stamp: Optional[Tuple[int, int]], view: str
+) -> Optional[Tuple[pd.DataFrame, dict]]:
+    """الإطار وبيانات اللقطة الوصفية إن كانت مطابقة للمصدر، وإلا None."""
+    if not enabled() or stamp is None:
+        return None
+    path = snapshot_path(source, view)
+    if not path.exists():
+        return None
+    try:
+        reader = pa_ipc.open_file(pa.memory_map(str(path), "r"))
+        meta = reader.schema.metadata or {}
+        if meta.get(_META_STAMP) != _stamp_bytes(stamp):
+            return None
+        if meta.get(_META_CODE) != code_digest():
+            return None
+        nan_cols = json.loads(meta.get(_META_NAN_COLS, b"[]"))
+        # split_blocks: كل عمود كتلة مستقلة، فالأعمدة الرقمية تبقى عرضاً على الملف دون نسخ
+        table = reader.read_all()
+        frame = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+        return _restore_nan(frame, nan_cols), meta
+    except Exception:
+        log.warning("ignoring unreadable snapshot %s", path, exc_info=True)
+        return None
+
+
+def load(
+    source: Path, stamp: Optional[Tuple[int, int]], view: str
+) -> Optional[pd.DataFrame]:
+    """يرجع الـ view من اللقطة إن كانت مطابقة للمصدر، وإلا None."""
+    found = _read(source, stamp, view)
+    return found[0] if found is not None else None
+
+
+def load_source(
+    source: Path, stamp: Optional[Tuple[int, int]]
+) -> Optional[SourceInfo]:
+    """معلومات المصدر (عدد الصفوف والأنواع وآخر صف) المحفوظة مع اللقطات، وإلا None."""
+    found = _read(source, stamp, _SOURCE_VIEW)
+    if found is None:
+        return None
+    tail, meta = found
+    try:
+        rows = int(meta[_META_SOURCE_ROWS])
+        dtypes = {
+            col: pd.api.types.pandas_dtype(name)
+            for col, name in json.loads(meta[_META_SOURCE_DTYPES]).items()
+        }
+        # Arrow يستنتج نوع كل عمود من قيمته الوحيدة (1046 في عمود object يصير int64)
+        tail = tail.astype(dtypes)
+    except Exception:
+        log.warning("ignoring unreadable source snapshot for %s", source, exc_info=True)
+        return None
+    if list(tail.columns) != list(dtypes) or len(tail) != 1:
+        return None
+    return SourceInfo(rows, dtypes, tail)
+
+
+def save(
+    source: Path,
+    stamp: Optional[Tuple[int, int]],
+    view: str,
+    df: pd.DataFrame,
+    extra: Optional[dict] = None,
+) -> bool:
+    """يكتب اللقطة (كتابة ذرّية عبر ملف مؤقت). الفشل لا يوقف الطلب."""
+    if not enabled() or stamp is None:
+        return False
+    path = snapshot_path(source, view)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        meta = dict(table.schema.metadata or {})
+        meta.update(extra or {})
+        meta[_META_STAMP] = _stamp_bytes(stamp)
+        meta[_META_CODE] = code_digest()
+        meta[_META_NAN_COLS] = json.dumps(_nan_columns(df)).encode()
+        table = table.replace_schema_metadata(meta)
+        with pa.OSFile(str(tmp), "wb") as sink:
+            with pa_ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+        return True
+    except Exception:
+        log.warning("could not write snapshot %s", path, exc_info=True)
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def save_source(
+    source: Path, stamp: Optional[Tuple[int, int]], info: SourceInfo
+) -> bool:
+    """يحفظ معلومات المصدر اللازمة للإلحاق التزايدي بجانب لقطات الـ views."""
+    extra = {
+        _META_SOURCE_ROWS: str(info.rows).encode(),
+        _META_SOURCE_DTYPES: json.dumps({c: str(t) for c, t in info.dtypes.items()}).encode(),
+    }
+    return save(source, stamp, _SOURCE_VIEW, info.tail, extra)
+
+
+def compile_all(source: Optional[Path] = None) -> dict:
+    """خطوة الإدخال: تبني كل الـ views المسجّلة وتكتب لقطاتها."""
+    # استيراد الراوترات يسجّل الـ builders في الـ registry
+    from Backend.routes import drug_records, insurance_records, medical_records  # noqa: F401
+    from Backend.dataset import registry
+
+    return registry.compile_snapshots(source)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arg = Path(sys.argv[1]).expanduser().resolve() if len(sys.argv) > 1 else None
+    for name, target in compile_all(arg).items():
+        print(f"{name}: {target}")
@@ -0,0 +1,95 @@
+# Backend/watcher.py
+"""
+Background watcher for the dataset workbooks.
+
+Started from the app lifespan (Backend/main.py). Every interval it checks the
+registered source files on a worker thread; when one changed, it waits until
+the file has stayed the same for one more poll (so a workbook that is still
+being saved is not parsed halfway) and then rebuilds it with
+registry.refresh(). Requests meanwhile keep being served from the previous
+version, so no request pays for a reload and each change is rebuilt once.
+
+    HASEEF_WATCH_INTERVAL   seconds between polls (default 2, 0 disables)
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from Backend.dataset import DatasetRegistry, registry
+
+log = logging.getLogger(__name__)
+
+
+class DatasetWatcher:
+    def __init__(self, registry: DatasetRegistry, interval: float) -> None:
+        self.registry = registry
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._seen: Dict[Path, Tuple[int, int]] = {}
+        self._stats: Dict[str, Any] = {
+            "running": False,
+            "polls": 0,
+            "rebuilds": 0,
+            "errors": 0,
+            "last_rebuild_at": None,
+            "last_error": None,
+        }
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._task is not None:
+            return
+        self.registry.background_reload = True
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self._stats["running"] = True
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        self.registry.background_reload = False
+        self._stats["running"] = False
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self._stats, "interval_seconds": self.interval}
+
+    async def _run(self) -> None:
+        while True:
+            # أول دورة فورًا: تحميل البيانات مسبقًا قبل أول طلب
+            await asyncio.to_thread(self.poll)
+            await asyncio.sleep(self.interval)
+
+    def poll(self) -> None:
+        """دورة واحدة (على خيط عامل): يعيد بناء الملفات التي استقر تغييرها."""
+        self._stats["polls"] += 1
+        for path in self.registry.paths():
+            stamp = self.registry.pending_stamp(path)
+            if stamp is None:
+                self._seen.pop(path, None)
+                continue
+            # ملف لم يُحمّل بعد يُبنى فورًا؛ الملف المتغيّر ننتظر استقراره دورة واحدة
+            if self.registry.is_loaded(path) and self._seen.get(path) != stamp:
+                self._seen[path] = stamp
+                continue
+            self._seen.pop(path, None)
+            try:
+                if self.registry.refresh(path):
+                    self._stats["rebuilds"] += 1
+                    self._stats["last_rebuild_at"] = time.time()
+            except Exception as exc:
+                # النسخة السابقة تبقى منشورة، ونعيد المحاولة في الدورات التالية
+                self._stats["errors"] += 1
+                self._stats["last_error"] = f"{path.name}: {exc}"
+                log.warning("dataset rebuild failed for %s", path, exc_info=True)
+
+
+watcher = DatasetWatcher(registry, float(os.getenv("HASEEF_WATCH_INTERVAL", "2")))
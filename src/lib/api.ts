@@ -19,7 +19,7 @@ function join(path: string): string {
 
 /* ============================== HTTP helpers (Cookie-based) ============================== */
 // 💡 مهم: نرسل credentials:"include" لكي تمر الكوكيز
-async function httpGet<T>(path: string, params?: Params): Promise<T> {
+function buildUrl(path: string, params?: Params): string {
   const url = new URL(join(path));
   if (params) {
     for (const [k, v] of Object.entries(params)) {
@@ -29,8 +29,11 @@ async function httpGet<T>(path: string, params?: Params): Promise<T> {
       url.searchParams.set(k, s);
     }
   }
+  return url.toString();
+}
 
-  const res = await fetch(url.toString(), {
+async function httpGet<T>(path: string, params?: Params): Promise<T> {
+  const res = await fetch(buildUrl(path, params), {
     method: "GET",
     credentials: "include",
     headers: { Accept: "application/json" },
@@ -92,6 +95,9 @@ export const ENDPOINTS = {
   medicalRecords: "/medical/records",
   insuranceRecords: "/insurance/records",
   drugRecords: "/drugs/records",
+  drugStats: "/drugs/stats",
+  drugFilters: "/drugs/filters",
+  drugExport: "/drugs/export",
 };
 
 export function apiGetMedical(params?: Params) {
@@ -105,5 +111,26 @@ export function apiGetInsurance(params?: Params) {
 export function apiGetDrugs(params?: Params) {
   return httpGet<unknown>(ENDPOINTS.drugRecords, params);
 }
+
+export function apiGetDrugStats(params?: Params) {
+  return httpGet<unknown>(ENDPOINTS.drugStats, params);
+}
+
+export function apiGetDrugFilters() {
+  return httpGet<unknown>(ENDPOINTS.drugFilters);
+}
+
+// كل النتائج المفلترة من /export بصيغة NDJSON (سجل JSON في كل سطر)
+export async function apiGetNdjson<T>(path: string, params?: Params): Promise<T[]> {
+  const res = await fetch(buildUrl(path, { ...params, format: "ndjson" }), {
+    credentials: "include",
+  });
+  if (!res.ok) throw new Error(await res.text());
+  const text = await res.text();
+  return text
+    .split("\n")
+    .filter((line) => line.trim())
+    .map((line) => JSON.parse(line) as T);
+}
 export const apiGet = httpGet;
 export const apiPost = httpPost;
\ No newline at end of file
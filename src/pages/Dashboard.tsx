@@ -280,39 +280,41 @@ const csvEscape = (value: string) => {
 type NotiKind = "طبي" | "تأمين" | "دواء";
 type NotiSeverity = "طارئ" | "تنبيه" | "معلومة";
 
-type Noti = {
-  id: string;
-  kind: NotiKind;
-  severity: NotiSeverity;
-  // بقية الحقول غير مهمة للحساب
+type NotiCount = { total: number; unread: number };
+
+// /notifications/summary: أعداد جاهزة من الباك-اند بدل تنزيل القائمة كاملة
+type NotiSummary = {
+  total: number;
+  unread: number;
+  by_kind: Record<NotiKind, NotiCount>;
+  by_severity: Record<NotiSeverity, NotiCount>;
 };
 
 const RAW_BASE_NOTI = (import.meta as any).env?.VITE_API_BASE || "";
 const API_BASE_NOTI = String(RAW_BASE_NOTI || "");
 const USE_PROXY_NOTI = !API_BASE_NOTI;
 
-const NOTI_LIST_ENDPOINT = USE_PROXY_NOTI
-  ? "/api/notifications"
-  : "/notifications";
+const NOTI_SUMMARY_ENDPOINT = USE_PROXY_NOTI
+  ? "/api/notifications/summary"
+  : "/notifications/summary";
 
 const joinUrlNoti = (b: string, p: string) =>
   b ? `${b.replace(/\/$/, "")}${p.startsWith("/") ? p : `/${p}`}` : p;
 
 // يرجع عدد إشعارات الأدوية
 async function fetchDrugAlertsCount(): Promise<number> {
-  const full = joinUrlNoti(API_BASE_NOTI, NOTI_LIST_ENDPOINT);
+  const full = joinUrlNoti(API_BASE_NOTI, NOTI_SUMMARY_ENDPOINT);
   const url = new URL(full, window.location.origin);
 
+  // الرد يحمل ETag: المتصفح يعيد التحقق (If-None-Match) ويأخذ 304 إن لم يتغير شيء
   const r = await fetch(url.toString(), { credentials: "include" });
   if (!r.ok) throw new Error(await r.text());
 
-  const list = (await r.json()) as Noti[];
+  const summary = (await r.json()) as NotiSummary;
 
-  // 🟢 احسبي فقط الإشعارات التي نوعها "دواء"
-  // لو حبيتي الطارئة فقط استخدمي && n.severity === "طارئ"
-  const drugAlerts = list.filter((n) => n.kind === "دواء");
-
-  return drugAlerts.length;
+  // 🟢 فقط الإشعارات التي نوعها "دواء"
+  // لو حبيتي غير المقروءة فقط استخدمي .unread بدل .total
+  return summary.by_kind["دواء"]?.total ?? 0;
 }
 
 /* ===================== Types ===================== */
@@ -337,6 +339,17 @@ type RecordsResponse = {
 };
 type PriorityMode = "none" | "urgent" | "latest";
 
+// /medical/stats: تجميعات جاهزة للرسم والبطاقات بدل تنزيل السجلات
+type StatsItem = { key: string; records: number; alerts?: number };
+type StatsResponse = {
+  total_records: number;
+  alerts_count: number;
+  by_doctor: StatsItem[];
+  by_doctor_total?: number;
+  by_patient: StatsItem[];
+  by_patient_total?: number;
+};
+
 const EXPORT_COLUMNS: { key: keyof MedRow; label: string }[] = [
   { key: "doctor_name", label: "اسم الطبيب" },
   { key: "patient_name", label: "اسم المريض" },
@@ -356,6 +369,8 @@ const API_BASE = String(RAW_BASE || "");
 const USE_PROXY = !API_BASE;
 const ENDPOINTS = {
   records: USE_PROXY ? "/api/medical/records" : "/medical/records",
+  stats: USE_PROXY ? "/api/medical/stats" : "/medical/stats",
+  export: USE_PROXY ? "/api/medical/export" : "/medical/export",
 };
 const joinUrl = (b: string, p: string) =>
   b ? `${b.replace(/\/$/, "")}${p.startsWith("/") ? p : `/${p}`}` : p;
@@ -373,6 +388,46 @@ async function httpGet<T>(path: string, params?: Record<string, string>) {
   return r.json() as Promise<T>;
 }
 
+// كل السجلات المفلترة من /export كـ NDJSON (سجل JSON في كل سطر)
+async function httpGetNdjson<T>(path: string, params: Record<string, string>) {
+  const full = joinUrl(API_BASE, path);
+  const url = new URL(full, window.location.origin);
+  Object.entries({ ...params, format: "ndjson" }).forEach(([k, v]) => {
+    if (v) url.searchParams.set(k, v);
+  });
+  const r = await fetch(url.toString(), { credentials: "include" });
+  if (!r.ok) throw new Error(await r.text());
+  return (await r.text())
+    .split("\n")
+    .filter((line) => line.trim())
+    .map((line) => JSON.parse(line) as T);
+}
+
+// عدّ سجلات كل اسم بعد توحيده (fold)، من قوائم by_* في /medical/stats
+const foldCounts = (
+  items: StatsItem[] | undefined,
+  fold: (s: string) => string
+) => {
+  const by: Record<string, number> = {};
+  (items || []).forEach((s) => {
+    const key = fold(String(s.key ?? "")).trim();
+    if (!key || key.toLowerCase() === "nan") return;
+    by[key] = (by[key] ?? 0) + s.records;
+  });
+  return by;
+};
+
+// عدد الأسماء المميزة، أو العدد الكلي من الباك-اند إن كانت القائمة مقصوصة
+const distinctCount = (
+  items: StatsItem[] | undefined,
+  total: number | undefined,
+  fold: (s: string) => string
+) => {
+  const list = items || [];
+  if (total !== undefined && total > list.length) return total;
+  return Object.keys(foldCounts(list, fold)).length;
+};
+
 /* ===================== Page ===================== */
 type CtxMode = "" | "doctor" | "icd" | "patient";
 type ChartMode = "byDoctorGlobal" | "byPatientForDoctor" | "byDoctorForPatient";
@@ -410,7 +465,7 @@ export default function MedicalRecords() {
 
   // data
   const [rows, setRows] = useState<MedRow[]>([]);
-  const [chartRows, setChartRows] = useState<MedRow[]>([]);
+  const [chartStats, setChartStats] = useState<StatsResponse | null>(null);
 
   // master + suggestions
   const [masterAll, setMasterAll] = useState<MedRow[]>([]);
@@ -636,24 +691,22 @@ export default function MedicalRecords() {
       if (o?.date ?? singleDate) params.date = (o?.date ?? singleDate)!;
       if (o?.icd ?? selIcd) params.icd = (o?.icd ?? selIcd)!;
       if (o?.doctor ?? fDoctor) params.doctor = (o?.doctor ?? fDoctor)!;
+      // كل الأطباء/المرضى للرسم وعدّ البطاقات (القوائم الأطول تُقص مع إبقاء *_total)
+      params.limit = "5000";
 
-      let data = await httpFetch(params);
+      let data = await httpGet<StatsResponse>(ENDPOINTS.stats, params);
 
-      // ✅ Fallback مشابه للشارت
-      if ((data?.records?.length ?? 0) === 0 && (params.doctor || "").trim()) {
+      // ✅ Fallback مشابه للسجلات
+      if ((data?.total_records ?? 0) === 0 && (params.doctor || "").trim()) {
         const shortDoctor = toTitle(stripHonorifics(params.doctor));
         if (shortDoctor && shortDoctor !== params.doctor) {
           const altParams = { ...params, doctor: shortDoctor };
-          const alt = await httpFetch(altParams);
-          if ((alt?.records?.length ?? 0) > 0) data = alt;
+          const alt = await httpGet<StatsResponse>(ENDPOINTS.stats, altParams);
+          if ((alt?.total_records ?? 0) > 0) data = alt;
         }
       }
 
-      const list = (data?.records || []).map((r, i) => ({
-        id: r.id ?? i + 1,
-        ...r,
-      }));
-      setChartRows(list);
+      setChartStats(data);
     } catch {
       /* noop */
     }
@@ -891,8 +944,8 @@ export default function MedicalRecords() {
       if (singleDate) params.date = singleDate;
       if (selIcd) params.icd = selIcd;
 
-      const data = await httpFetch(params);
-      const list = data.records || [];
+      // كل النتائج المفلترة من /medical/export (وليس أول صفحة من /records فقط)
+      const list = await httpGetNdjson<MedRow>(ENDPOINTS.export, params);
 
       if (!list.length) {
         alert("لا توجد سجلات لتصديرها بناءً على التصفية أو البحث الحالي.");
@@ -1270,41 +1323,19 @@ export default function MedicalRecords() {
     if (!hasSearched) setSelectedName("");
   }, [chartMode, hasSearched]);
 
+  // من /medical/stats بنفس فلاتر السجلات: مرضى الطبيب المحدد، أو أطباء المريض، أو كل الأطباء
   const chartData = useMemo(() => {
-    const base =
-      fPatient || fDoctor || singleDate || selIcd
-        ? rows
-        : chartRows.length
-        ? chartRows
-        : rows;
-
-    const by: Record<string, number> = {};
-    if (chartMode === "byPatientForDoctor") {
-      base.forEach((r) => {
-        if (toTitle(r.doctor_name) !== fDoctor) return;
-        const key = toTitle(r.patient_name || "").trim();
-        if (!key || key.toLowerCase() === "nan") return;
-        by[key] = (by[key] ?? 0) + 1;
-      });
-    } else if (chartMode === "byDoctorForPatient") {
-      base.forEach((r) => {
-        if (toTitle(r.patient_name) !== fPatient) return;
-        const key = toTitle(r.doctor_name || "").trim();
-        if (!key || key.toLowerCase() === "nan") return;
-        by[key] = (by[key] ?? 0) + 1;
-      });
-    } else {
-      base.forEach((r) => {
-        const key = firstNameOf(r.doctor_name || "");
-        if (!key || key.toLowerCase() === "nan") return;
-        by[key] = (by[key] ?? 0) + 1;
-      });
-    }
+    const by =
+      chartMode === "byPatientForDoctor"
+        ? foldCounts(chartStats?.by_patient, toTitle)
+        : chartMode === "byDoctorForPatient"
+        ? foldCounts(chartStats?.by_doctor, toTitle)
+        : foldCounts(chartStats?.by_doctor, firstNameOf);
 
     return Object.entries(by)
       .map(([label, count]) => ({ label, count }))
       .sort((a, b) => b.count - a.count);
-  }, [rows, chartRows, fPatient, fDoctor, singleDate, selIcd, chartMode]);
+  }, [chartStats, chartMode]);
 
   const yMeta = useMemo(() => {
     const max = chartData.reduce((m, c) => Math.max(m, c.count), 0);
@@ -1352,13 +1383,22 @@ export default function MedicalRecords() {
     );
   }, [rows]);
 
-  // KPI rows (مثل صفحة التأمين)
-  const kpiRows = useMemo(
-    () =>
-      fDoctor || fPatient || hasSearched || singleDate || selIcd
-        ? rows
-        : chartRows,
-    [rows, chartRows, fDoctor, fPatient, hasSearched, singleDate, selIcd]
+  // KPI من نفس تجميعات الرسم (كل النتائج المفلترة، لا الصفحة المعروضة فقط)
+  const kpi = useMemo(
+    () => ({
+      total: chartStats?.total_records ?? 0,
+      doctors: distinctCount(
+        chartStats?.by_doctor,
+        chartStats?.by_doctor_total,
+        firstNameOf
+      ),
+      patients: distinctCount(
+        chartStats?.by_patient,
+        chartStats?.by_patient_total,
+        toTitle
+      ),
+    }),
+    [chartStats]
   );
 
   // rows الخاصة بالبطاقات (تتأثر بالـ control bar)
@@ -1580,7 +1620,7 @@ export default function MedicalRecords() {
             </div>
           )}
 
-          {(!firstLoadDone || loading) && kpiRows.length === 0 ? (
+          {(!firstLoadDone || loading) && !chartStats ? (
             <div className="mt-6 grid gap-4">
               <div className="h-20 bg-white rounded-2xl animate-pulse" />
               <div className="h-80 bg-white rounded-2xl animate-pulse" />
@@ -1592,19 +1632,19 @@ export default function MedicalRecords() {
           <div className="mt-6 grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-4 relative z-0">
             <KpiCard
               title="عدد الزيارات"
-              value={kpis(kpiRows).total}
+              value={kpi.total}
               color="#3B82F6"
               icon={<ClipboardList />}
             />
             <KpiCard
               title="عدد الأطباء"
-              value={kpis(kpiRows).doctors}
+              value={kpi.doctors}
               color="#D97706"
               icon={<UserPlus />}
             />
             <KpiCard
               title="عدد المرضى"
-              value={kpis(kpiRows).patients}
+              value={kpi.patients}
               color="#E05252"
               icon={<Users />}
             />
@@ -2008,39 +2048,6 @@ export default function MedicalRecords() {
   );
 }
 
-/* ===================== Derived: KPIs ===================== */
-function kpis(list: MedRow[]) {
-  const byDoc: Record<string, number> = {};
-  const patSet = new Set<string>();
-  let alerts = 0;
-
-  list.forEach((r) => {
-    const n = firstNameOf(r.doctor_name || "");
-    if (n && n.toLowerCase() !== "nan") {
-      byDoc[n] = (byDoc[n] ?? 0) + 1;
-    }
-
-    const pn = toTitle(r.patient_name);
-    if (pn && pn.toLowerCase() !== "nan") {
-      patSet.add(pn);
-    }
-
-    if (
-      (r.emer_ind || "").toUpperCase() === "Y" ||
-      (r.refer_ind || "").toUpperCase() === "Y"
-    ) {
-      alerts++;
-    }
-  });
-
-  return {
-    total: list.length,
-    doctors: Object.keys(byDoc).length,
-    patients: patSet.size,
-    alerts,
-  };
-}
-
 /* ===================== Sub Components ===================== */
 function SideItem({
   icon,
@@ -20,7 +20,14 @@ import {
   ChevronDown,
 } from "lucide-react";
 import clsx from "clsx";
-import { apiGetDrugs, apiLogout } from "@/lib/api";
+import {
+  ENDPOINTS,
+  apiGetDrugFilters,
+  apiGetDrugStats,
+  apiGetDrugs,
+  apiGetNdjson,
+  apiLogout,
+} from "@/lib/api";
 import SmartDrugChat from "@/components/SmartDrugChat";
 
 /* ====== AG Grid (مطابق للDashboard) ====== */
@@ -96,39 +103,41 @@ function lighten(hex: string, amt = 0.15) {
 type NotiKind = "طبي" | "تأمين" | "دواء";
 type NotiSeverity = "طارئ" | "تنبيه" | "معلومة";
 
-type Noti = {
-  id: string;
-  kind: NotiKind;
-  severity: NotiSeverity;
-  // بقية الحقول غير مهمة للحساب
+type NotiCount = { total: number; unread: number };
+
+// /notifications/summary: أعداد جاهزة من الباك-اند بدل تنزيل القائمة كاملة
+type NotiSummary = {
+  total: number;
+  unread: number;
+  by_kind: Record<NotiKind, NotiCount>;
+  by_severity: Record<NotiSeverity, NotiCount>;
 };
 
 const RAW_BASE_NOTI = (import.meta as any).env?.VITE_API_BASE || "";
 const API_BASE_NOTI = String(RAW_BASE_NOTI || "");
 const USE_PROXY_NOTI = !API_BASE_NOTI;
 
-const NOTI_LIST_ENDPOINT = USE_PROXY_NOTI
-  ? "/api/notifications"
-  : "/notifications";
+const NOTI_SUMMARY_ENDPOINT = USE_PROXY_NOTI
+  ? "/api/notifications/summary"
+  : "/notifications/summary";
 
 const joinUrlNoti = (b: string, p: string) =>
   b ? `${b.replace(/\/$/, "")}${p.startsWith("/") ? p : `/${p}`}` : p;
 
 // يرجع عدد إشعارات الأدوية
 async function fetchDrugAlertsCount(): Promise<number> {
-  const full = joinUrlNoti(API_BASE_NOTI, NOTI_LIST_ENDPOINT);
+  const full = joinUrlNoti(API_BASE_NOTI, NOTI_SUMMARY_ENDPOINT);
   const url = new URL(full, window.location.origin);
 
+  // الرد يحمل ETag: المتصفح يعيد التحقق (If-None-Match) ويأخذ 304 إن لم يتغير شيء
   const r = await fetch(url.toString(), { credentials: "include" });
   if (!r.ok) throw new Error(await r.text());
 
-  const list = (await r.json()) as Noti[];
-
-  // 🟢 احسبي فقط الإشعارات التي نوعها "دواء"
-  // لو حبيتي الطارئة فقط استخدمي && n.severity === "طارئ"
-  const drugAlerts = list.filter((n) => n.kind === "دواء");
+  const summary = (await r.json()) as NotiSummary;
 
-  return drugAlerts.length;
+  // 🟢 فقط الإشعارات التي نوعها "دواء"
+  // لو حبيتي غير المقروءة فقط استخدمي .unread بدل .total
+  return summary.by_kind["دواء"]?.total ?? 0;
 }
 
 /* ============================== Types ============================== */
@@ -155,6 +164,16 @@ type RecordsResponse = {
   records: DrugRow[];
 };
 
+// /drugs/stats: تجميعات كل النتائج المفلترة (وليس الصفحة فقط)
+type StatsItem = { key: string; records: number };
+type StatsResponse = {
+  total_operations: number;
+  by_drug: StatsItem[];
+  by_doctor: StatsItem[];
+  by_drug_total?: number;
+  by_doctor_total?: number;
+};
+
 type SuggestItem = {
   label: string;
   kind: "doctor" | "patient" | "drug" | "code" | "text";
@@ -195,6 +214,22 @@ const extractErr = (e: any): string | null => {
   return null;
 };
 
+const toDrugRow = (r: any, i: number): DrugRow => ({
+  id: r.id ?? i + 1,
+  doctor_name: r.doctor_name || "—",
+  patient_name: r.patient_name || "—",
+  service_code: r.service_code || "—",
+  service_description: r.service_description || "—",
+  quantity: r.quantity ?? 0,
+  item_unit_price: r.item_unit_price ?? 0,
+  gross_amount: r.gross_amount ?? 0,
+  vat_amount: r.vat_amount ?? 0,
+  discount: r.discount ?? 0,
+  net_amount: r.net_amount ?? 0,
+  date: r.date || "—",
+  ai_analysis: r.ai_analysis || "",
+});
+
 /* ============================== CSV Export ============================== */
 const csvEscape = (value: string) => {
   const v = value ?? "";
@@ -225,9 +260,12 @@ type DonutSlice = { label: string; value: number; color?: string };
 export default function Drugs() {
   const navigate = useNavigate();
 
-  // بيانات أساسية
+  // بيانات أساسية: صفحة واحدة من السيرفر + تجميعات كل النتائج من /stats
   const [rows, setRows] = useState<DrugRow[]>([]);
   const [totalOps, setTotalOps] = useState<number>(0);
+  const [page, setPage] = useState(1);
+  const [stats, setStats] = useState<StatsResponse | null>(null);
+  const [donutStats, setDonutStats] = useState<StatsResponse | null>(null);
   const [topDrug, setTopDrug] = useState<string>("—");
   const [alertsCount, setAlertsCount] = useState<number>(0);
   // عدد التنبيهات الخاصة بالأدوية من نظام الإشعارات
@@ -325,37 +363,18 @@ export default function Drugs() {
     return "none";
   }, [selDoctor, selDrug]);
 
-  const sameNorm = (a?: string, b?: string) => {
-    const na = normalize(a || "");
-    const nb = normalize(b || "");
-    if (!na || !nb) return false;
-    return na === nb || na.includes(nb) || nb.includes(na);
-  };
-
-  // الخيارات داخل الليستة حسب الوضع
+  // الخيارات داخل الليستة حسب الوضع (من تجميعات السيرفر لكل النتائج)
   const linkFilterOptions = useMemo(() => {
     if (linkFilterMode === "drugByDoctor") {
-      const set = new Set<string>();
-      rows.forEach((r) => {
-        if (sameNorm(r.doctor_name, selDoctor) && r.service_description) {
-          set.add(r.service_description);
-        }
-      });
-      return Array.from(set).sort();
+      return (stats?.by_drug ?? []).map((s) => s.key).sort();
     }
 
     if (linkFilterMode === "doctorByDrug") {
-      const set = new Set<string>();
-      rows.forEach((r) => {
-        if (sameNorm(r.service_description, selDrug) && r.doctor_name) {
-          set.add(r.doctor_name);
-        }
-      });
-      return Array.from(set).sort();
+      return (stats?.by_doctor ?? []).map((s) => s.key).sort();
     }
 
     return [];
-  }, [linkFilterMode, rows, selDoctor, selDrug]);
+  }, [linkFilterMode, stats]);
 
   // كل ما تغيّر الطبيب/الدواء الأساسي نعيد ضبط قيمة الفلتر
   useEffect(() => {
@@ -383,7 +402,58 @@ export default function Drugs() {
     return () => clearTimeout(id);
   }, [q]);
 
-  /* ---------- تحميل السجلات من الباك ---------- */
+  /* ---------- الفلاتر كما يفهمها السيرفر (/records و /stats و /export) ---------- */
+  const filterParams = useMemo(() => {
+    const params: Record<string, string | boolean> = {};
+    if (selDate === "الأسبوع الأخير") params["last_week"] = true;
+    if (qKey) params["q"] = qKey;
+    if (selDoctor !== "الكل") params["doctor"] = selDoctor;
+    if (selDrug !== "الكل") params["drug"] = selDrug;
+    return params;
+  }, [selDate, qKey, selDoctor, selDrug]);
+
+  // + فلتر الرابط الإضافي والترتيب حسب الأولوية
+  const recordParams = useMemo(() => {
+    const params: Record<string, string | boolean> = { ...filterParams };
+    if (linkFilterMode === "drugByDoctor" && linkFilterValue)
+      params["drug"] = linkFilterValue;
+    if (linkFilterMode === "doctorByDrug" && linkFilterValue)
+      params["doctor"] = linkFilterValue;
+    if (prioMode === "amount") {
+      params["sort"] = "net_amount";
+      params["order"] = "desc";
+    } else if (prioMode === "recency") {
+      params["sort"] = "date";
+      params["order"] = "desc";
+    }
+    // prioMode === "urgency" حالياً بدون تأثير
+    return params;
+  }, [filterParams, linkFilterMode, linkFilterValue, prioMode]);
+
+  const pageCount = Math.max(1, Math.ceil(totalOps / pageSize));
+
+  // أي تغيير في الفلاتر أو حجم الصفحة يرجعنا للصفحة الأولى
+  useEffect(() => {
+    setPage(1);
+  }, [recordParams, pageSize]);
+
+  /* ---------- قوائم الاقتراحات (أطباء + أدوية) مرة واحدة ---------- */
+  useEffect(() => {
+    (async () => {
+      try {
+        const data = (await apiGetDrugFilters()) as {
+          doctors?: string[];
+          drugs?: string[];
+        };
+        setDoctors(data?.doctors ?? []);
+        setDrugs(data?.drugs ?? []);
+      } catch (e) {
+        console.error("فشل تحميل قوائم الأطباء والأدوية", e);
+      }
+    })();
+  }, []);
+
+  /* ---------- تحميل صفحة السجلات من الباك ---------- */
   useEffect(() => {
     let cancel = false;
     (async () => {
@@ -392,44 +462,21 @@ export default function Drugs() {
         setLoading(true);
         setAiMsg(null);
 
-        const params: Record<string, string | boolean> = {};
-        if (selDate === "الأسبوع الأخير") params["last_week"] = true;
-
-        const data = (await apiGetDrugs(params)) as unknown as RecordsResponse;
+        const data = (await apiGetDrugs({
+          ...recordParams,
+          page,
+          page_size: pageSize,
+        })) as unknown as RecordsResponse;
         if (cancel) return;
 
-        const list = (data?.records ?? []).map((r: any, i: number) => ({
-          id: r.id ?? i + 1,
-          doctor_name: r.doctor_name || "—",
-          patient_name: r.patient_name || "—",
-          service_code: r.service_code || "—",
-          service_description: r.service_description || "—",
-          quantity: r.quantity ?? 0,
-          item_unit_price: r.item_unit_price ?? 0,
-          gross_amount: r.gross_amount ?? 0,
-          vat_amount: r.vat_amount ?? 0,
-          discount: r.discount ?? 0,
-          net_amount: r.net_amount ?? 0,
-          date: r.date || "—",
-          ai_analysis: r.ai_analysis || "",
-        }));
+        const list = (data?.records ?? []).map(toDrugRow);
 
         setRows(list);
         setTotalOps(data?.total_operations ?? list.length);
         setTopDrug(data?.top_drug || "—");
         setAlertsCount(data?.alerts_count ?? 0);
 
-        // قوائم مخصصة للاقتراحات الذكية
-        setDoctors(
-          Array.from(
-            new Set(list.map((r) => r.doctor_name).filter(Boolean))
-          ).sort()
-        );
-        setDrugs(
-          Array.from(
-            new Set(list.map((r) => r.service_description).filter(Boolean))
-          ).sort()
-        );
+        // المرضى والأكواد من الصفحة الحالية فقط (لا نحمّل كل السجلات للاقتراحات)
         setPatients(
           Array.from(
             new Set(list.map((r) => r.patient_name).filter(Boolean))
@@ -452,7 +499,30 @@ export default function Drugs() {
     return () => {
       cancel = true;
     };
-  }, [selDate]);
+  }, [recordParams, page, pageSize]);
+
+  /* ---------- تجميعات الـ KPIs وقوائم فلتر الرابط + الدونات (بدون فلتر الدواء) ---------- */
+  useEffect(() => {
+    let cancel = false;
+    const noDrug = { ...filterParams };
+    delete noDrug["drug"];
+    (async () => {
+      try {
+        const [all, byDrug] = await Promise.all([
+          apiGetDrugStats({ ...filterParams, limit: 500 }),
+          apiGetDrugStats({ ...noDrug, limit: 6 }),
+        ]);
+        if (cancel) return;
+        setStats(all as StatsResponse);
+        setDonutStats(byDrug as StatsResponse);
+      } catch (e) {
+        if (!cancel) console.error("فشل تحميل إحصاءات الأدوية", e);
+      }
+    })();
+    return () => {
+      cancel = true;
+    };
+  }, [filterParams]);
 
   /* ---------- عناصر الاقتراحات بناءً على النص ---------- */
   const suggestItems = useMemo<SuggestItem[]>(() => {
@@ -525,113 +595,22 @@ export default function Drugs() {
     handleRunSearch(s.label);
   };
 
-  /* ---------- تصفية الجدول (تشمل كل الفلاتر) ---------- */
-  const filtered = useMemo(() => {
-    let out = rows;
-
-    if (selDoctor !== "الكل")
-      out = out.filter(
-        (r) => normalize(r.doctor_name) === normalize(selDoctor)
-      );
-
-    if (selDrug !== "الكل")
-      out = out.filter(
-        (r) => normalize(r.service_description) === normalize(selDrug)
-      );
-
-    // 🔹 فلتر الرابط الإضافي
-    if (linkFilterMode === "drugByDoctor" && linkFilterValue) {
-      out = out.filter((r) => sameNorm(r.service_description, linkFilterValue));
-    }
-    if (linkFilterMode === "doctorByDrug" && linkFilterValue) {
-      out = out.filter((r) => sameNorm(r.doctor_name, linkFilterValue));
-    }
-
-    if (qKey) {
-      out = out.filter((r) =>
-        [
-          r.doctor_name,
-          r.patient_name,
-          r.service_code,
-          r.service_description,
-          r.quantity,
-          r.item_unit_price,
-          r.gross_amount,
-          r.vat_amount,
-          r.discount,
-          r.net_amount,
-          r.date,
-        ]
-          .filter((v) => v !== undefined && v !== null)
-          .map((v) => normalize(String(v)))
-          .some((v) => v.includes(qKey))
-      );
-    }
-    return out;
-  }, [rows, selDoctor, selDrug, qKey, linkFilterMode, linkFilterValue]);
-
   /* ---------- بيانات البطاقات (لواجهة الكروت) ---------- */
+  // الفلترة والترتيب والترقيم على السيرفر؛ "صافي بين" يضيّق الصفحة الحالية فقط
   const cardRows = useMemo(() => {
-    let out = filtered;
-
-    // فلترة بالصافي بين
     const min = rangeMin ? Number(rangeMin) : null;
     const max = rangeMax ? Number(rangeMax) : null;
+    if (min === null && max === null) return rows;
+
+    return rows.filter((r) => {
+      const val = Number(r.net_amount ?? 0);
+      if (!Number.isFinite(val)) return false;
+      if (min !== null && val < min) return false;
+      if (max !== null && val > max) return false;
+      return true;
+    });
+  }, [rows, rangeMin, rangeMax]);
 
-    if (min !== null || max !== null) {
-      out = out.filter((r) => {
-        const val = Number(r.net_amount ?? 0);
-        if (!Number.isFinite(val)) return false;
-        if (min !== null && val < min) return false;
-        if (max !== null && val > max) return false;
-        return true;
-      });
-    }
-
-    // ترتيب حسب الأولوية
-    if (prioMode === "amount") {
-      out = [...out].sort(
-        (a, b) => Number(b.net_amount ?? 0) - Number(a.net_amount ?? 0)
-      );
-    } else if (prioMode === "recency") {
-      out = [...out].sort((a, b) =>
-        String(b.date || "").localeCompare(String(a.date || ""))
-      );
-    }
-    // prioMode === "urgency" حالياً بدون تأثير
-
-    return out.slice(0, pageSize);
-  }, [filtered, rangeMin, rangeMax, prioMode, pageSize]);
-
-  /* ---------- نسخة للدونات: بدون فلتر الدواء ---------- */
-  const filteredNoDrug = useMemo(() => {
-    let out = rows;
-    if (selDoctor !== "الكل")
-      out = out.filter(
-        (r) => normalize(r.doctor_name) === normalize(selDoctor)
-      );
-    if (qKey) {
-      out = out.filter((r) =>
-        [
-          r.doctor_name,
-          r.patient_name,
-          r.service_code,
-          r.service_description,
-          r.quantity,
-          r.item_unit_price,
-          r.gross_amount,
-          r.vat_amount,
-          r.discount,
-          r.net_amount,
-          r.date,
-        ]
-          .filter((v) => v !== undefined && v !== null)
-          .map((v) => normalize(String(v)))
-          .some((v) => v.includes(qKey))
-      );
-    }
-    return out;
-  }, [rows, selDoctor, qKey]);
   useEffect(() => {
     const handler = (e: Event) => {
       const detail = (e as CustomEvent).detail as { query: string };
@@ -645,13 +624,8 @@ export default function Drugs() {
 
   /* ---------- توزيع الدونات (حسب الدواء) ---------- */
   const donut = useMemo<DonutSlice[]>(() => {
-    if (!filteredNoDrug.length) return [];
-    const counts = new Map<string, number>();
-    filteredNoDrug.forEach((r) => {
-      const key = r.service_description || "-";
-      counts.set(key, (counts.get(key) ?? 0) + 1);
-    });
-    const total = Array.from(counts.values()).reduce((a, b) => a + b, 0) || 1;
+    if (!donutStats?.by_drug?.length) return [];
+    const total = donutStats.total_operations || 1;
     const palette = [
       "#3B82F6",
       "#103062ff",
@@ -660,15 +634,12 @@ export default function Drugs() {
       "#E78C6A",
       "#F04770",
     ];
-    return Array.from(counts.entries())
-      .sort((a, b) => b[1] - a[1])
-      .slice(0, 6)
-      .map(([label, c], i) => ({
-        label,
-        value: Math.round((c / total) * 100),
-        color: palette[i % palette.length],
-      }));
-  }, [filteredNoDrug]);
+    return donutStats.by_drug.slice(0, 6).map((s, i) => ({
+      label: s.key,
+      value: Math.round((s.records / total) * 100),
+      color: palette[i % palette.length],
+    }));
+  }, [donutStats]);
 
   const topDrugLocal = useMemo(() => {
     if (topDrug && topDrug !== "-") return topDrug;
@@ -676,27 +647,13 @@ export default function Drugs() {
     return donut.reduce((a, b) => (a.value >= b.value ? a : b)).label;
   }, [topDrug, donut]);
 
-  /* ---------- KPIs ---------- */
-  const kpiSource = useMemo(
-    () =>
-      selDoctor !== "الكل" || selDrug !== "الكل" || qKey ? filtered : rows,
-    [filtered, rows, selDoctor, selDrug, qKey]
-  );
-
-  const doctorCount = useMemo(
-    () => new Set(kpiSource.map((r) => r.doctor_name).filter(Boolean)).size,
-    [kpiSource]
-  );
-
-  const drugCount = useMemo(
-    () =>
-      new Set(kpiSource.map((r) => r.service_description).filter(Boolean)).size,
-    [kpiSource]
-  );
+  /* ---------- KPIs (لكل النتائج المفلترة من /stats) ---------- */
+  const doctorCount = stats?.by_doctor_total ?? 0;
+  const drugCount = stats?.by_drug_total ?? 0;
 
   /* ---------- بيانات الجدول المتحكم بها من الـ Control Bar ---------- */
   const gridRows = useMemo(() => {
-    let base = filtered;
+    let base = rows;
     if (showTopOnly && donut.length) {
       const allowed = new Set(
         donut.map((d) => normalize(d.label)) // الأدوية الأعلى صرفاً
@@ -706,7 +663,7 @@ export default function Drugs() {
       );
     }
     return base.slice(0, rowLimit);
-  }, [filtered, showTopOnly, donut, rowLimit]);
+  }, [rows, showTopOnly, donut, rowLimit]);
 
   async function doLogout() {
     try {
@@ -722,7 +679,10 @@ export default function Drugs() {
     try {
       setExporting(true);
 
-      const list = filtered;
+      // كل النتائج المفلترة (بنفس الترتيب) من /drugs/export وليس الصفحة الحالية فقط
+      const list = (
+        await apiGetNdjson<any>(ENDPOINTS.drugExport, recordParams)
+      ).map(toDrugRow);
       if (!list.length) {
         alert("لا توجد سجلات لتصديرها بناءً على التصفية أو البحث الحالي.");
         return;
@@ -1105,13 +1065,13 @@ export default function Drugs() {
           )}
 
           {/* محتوى بعد التحميل */}
-          {!loading && firstLoadDone && (
+          {firstLoadDone && (
             <>
               {/* KPI Cards */}
               <div className="mt-6 grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-4 relative z-0">
                 <KpiCard
                   title="عدد عمليات صرف الدواء"
-                  value={kpiSource.length || totalOps}
+                  value={totalOps}
                   color="#3B82F6"
                   icon={<ClipboardList />}
                 />
@@ -1275,6 +1235,31 @@ export default function Drugs() {
                   />
                 </div>
 
+                {/* ترقيم الصفحات (من السيرفر) */}
+                <div className="flex items-center gap-2">
+                  <button
+                    onClick={() => setPage((p) => Math.max(1, p - 1))}
+                    disabled={page <= 1 || loading}
+                    className="h-10 px-4 rounded-full text-sm border bg-white hover:bg-black/5 transition disabled:opacity-50"
+                    style={{ borderColor: "#D0E2D5" }}
+                    title="الصفحة السابقة"
+                  >
+                    السابق
+                  </button>
+                  <span className="text-sm tabular-nums" style={{ color: "#64748B" }}>
+                    صفحة {page} من {pageCount}
+                  </span>
+                  <button
+                    onClick={() => setPage((p) => Math.min(pageCount, p + 1))}
+                    disabled={page >= pageCount || loading}
+                    className="h-10 px-4 rounded-full text-sm border bg-white hover:bg-black/5 transition disabled:opacity-50"
+                    style={{ borderColor: "#D0E2D5" }}
+                    title="الصفحة التالية"
+                  >
+                    التالي
+                  </button>
+                </div>
+
                 {/* زر عرض / إخفاء */}
                 <div className="ml-auto flex items-center gap-2">
                   {!showCards ? (
@@ -90,14 +90,6 @@ const nrm = (s: string) =>
     .replace(/\s+/g, " ")
     .trim();
 
-// company fuzzy match (UI label vs contract/company in row)
-const coMatches = (rowCompany: string, selected: string) => {
-  const a = nrm(rowCompany);
-  const b = nrm(selected);
-  if (!a || !b) return false;
-  return a === b || a.startsWith(b) || b.startsWith(a) || a.includes(b);
-};
-
 // ✅ abbreviate using LAST 3 words for axis only
 const abbreviateCompany = (s: string, maxWords = 3) => {
   const cleaned = (s || "")
@@ -159,39 +151,41 @@ const csvEscape = (value: string) => {
 type NotiKind = "طبي" | "تأمين" | "دواء";
 type NotiSeverity = "طارئ" | "تنبيه" | "معلومة";
 
-type Noti = {
-  id: string;
-  kind: NotiKind;
-  severity: NotiSeverity;
-  // بقية الحقول غير مهمة للحساب
+type NotiCount = { total: number; unread: number };
+
+// /notifications/summary: أعداد جاهزة من الباك-اند بدل تنزيل القائمة كاملة
+type NotiSummary = {
+  total: number;
+  unread: number;
+  by_kind: Record<NotiKind, NotiCount>;
+  by_severity: Record<NotiSeverity, NotiCount>;
 };
 
 const RAW_BASE_NOTI = (import.meta as any).env?.VITE_API_BASE || "";
 const API_BASE_NOTI = String(RAW_BASE_NOTI || "");
 const USE_PROXY_NOTI = !API_BASE_NOTI;
 
-const NOTI_LIST_ENDPOINT = USE_PROXY_NOTI
-  ? "/api/notifications"
-  : "/notifications";
+const NOTI_SUMMARY_ENDPOINT = USE_PROXY_NOTI
+  ? "/api/notifications/summary"
+  : "/notifications/summary";
 
 const joinUrlNoti = (b: string, p: string) =>
   b ? `${b.replace(/\/$/, "")}${p.startsWith("/") ? p : `/${p}`}` : p;
 
 // يرجع عدد إشعارات الأدوية
 async function fetchDrugAlertsCount(): Promise<number> {
-  const full = joinUrlNoti(API_BASE_NOTI, NOTI_LIST_ENDPOINT);
+  const full = joinUrlNoti(API_BASE_NOTI, NOTI_SUMMARY_ENDPOINT);
   const url = new URL(full, window.location.origin);
 
+  // الرد يحمل ETag: المتصفح يعيد التحقق (If-None-Match) ويأخذ 304 إن لم يتغير شيء
   const r = await fetch(url.toString(), { credentials: "include" });
   if (!r.ok) throw new Error(await r.text());
 
-  const list = (await r.json()) as Noti[];
+  const summary = (await r.json()) as NotiSummary;
 
-  // 🟢 احسبي فقط الإشعارات التي نوعها "دواء"
-  // لو حبيتي الطارئة فقط استخدمي && n.severity === "طارئ"
-  const drugAlerts = list.filter((n) => n.kind === "دواء");
-
-  return drugAlerts.length;
+  // 🟢 فقط الإشعارات التي نوعها "دواء"
+  // لو حبيتي غير المقروءة فقط استخدمي .unread بدل .total
+  return summary.by_kind["دواء"]?.total ?? 0;
 }
 
 /* ===================== Types ===================== */
@@ -217,6 +211,17 @@ type RecordsResponse = {
   alerts_count: number;
   records: InsRow[];
 };
+// /insurance/stats: totals of all filtered claims (not just one page)
+type StatsItem = { key: string; records: number };
+type StatsResponse = {
+  total_claims: number;
+  total_companies: number;
+  alerts_count: number;
+  by_company: StatsItem[];
+  by_claim_type: StatsItem[];
+  by_pay_to: StatsItem[];
+  by_pay_to_total?: number;
+};
 
 /* أعمدة التصدير */
 const EXPORT_COLUMNS: { key: keyof InsRow; label: string }[] = [
@@ -242,6 +247,8 @@ const API_BASE = String(RAW_BASE || "");
 const USE_PROXY = !API_BASE;
 const ENDPOINTS = {
   records: USE_PROXY ? "/api/insurance/records" : "/insurance/records",
+  stats: USE_PROXY ? "/api/insurance/stats" : "/insurance/stats",
+  export: USE_PROXY ? "/api/insurance/export" : "/insurance/export",
 };
 const joinUrl = (b: string, p: string) =>
   b ? `${b.replace(/\/$/, "")}${p.startsWith("/") ? p : `/${p}`}` : p;
@@ -263,6 +270,27 @@ async function httpGet<T>(path: string, params?: Record<string, string>) {
   return r.json() as Promise<T>;
 }
 
+// all filtered claims from /export as NDJSON (one JSON record per line)
+async function httpGetNdjson<T>(path: string, params: Record<string, string>) {
+  const full = joinUrl(API_BASE, path);
+  const url = new URL(full, window.location.origin);
+  Object.entries({ ...params, format: "ndjson" }).forEach(([k, v]) => {
+    if (v) url.searchParams.set(k, v);
+  });
+  const r = await fetch(url.toString(), { credentials: "include" });
+  if (!r.ok) throw new Error(await r.text());
+  return (await r.text())
+    .split("\n")
+    .filter((line) => line.trim())
+    .map((line) => JSON.parse(line) as T);
+}
+
+const statsKeys = (items?: StatsItem[]) =>
+  (items || [])
+    .map((s) => s.key)
+    .filter((k) => k && k.toLowerCase() !== "nan")
+    .sort();
+
 /* ===================== Page ===================== */
 type CtxMode = "" | "company" | "claim";
 type ChartMode = "byCompanyGlobal" | "byClaimForCompany" | "byCompanyForClaim";
@@ -289,9 +317,11 @@ export default function Insurance() {
     })();
   }, []);
 
-  // data
+  // data: one server page of claims + totals of all filtered claims
   const [rows, setRows] = useState<InsRow[]>([]);
-  const [chartRows, setChartRows] = useState<InsRow[]>([]);
+  const [totalClaims, setTotalClaims] = useState<number>(0);
+  const [page, setPage] = useState<number>(1);
+  const [chartStats, setChartStats] = useState<StatsResponse | null>(null);
 
   // master lists (suggestions)
   const [allCompanies, setAllCompanies] = useState<string[]>([]);
@@ -347,56 +377,16 @@ export default function Insurance() {
   const inputRef = useRef<HTMLInputElement>(null);
   const suggestRef = useRef<HTMLDivElement>(null);
 
-  /* Boot load once */
+  /* Boot load once: suggestion lists from the unfiltered rollup */
   useEffect(() => {
     (async () => {
       try {
-        const data = await httpGet<RecordsResponse>(ENDPOINTS.records, {});
-        const list = (data.records || []).map((r) => ({ ...r }));
-        // masters
-        const companies = new Set<string>(),
-          claims = new Set<string>(),
-          payees = new Set<string>();
-        list.forEach((r) => {
-          const co = toTitle(r.company);
-          if (co && co.toLowerCase() !== "nan") companies.add(co);
-          const cl = toTitle(r.claim_type);
-          if (cl && cl.toLowerCase() !== "nan") claims.add(cl);
-          const p = toTitle(r.pay_to);
-          if (p && p.toLowerCase() !== "nan") payees.add(p);
-        });
-        const cc = Array.from(companies).sort();
-        const tt = Array.from(claims).sort();
-        const pp = Array.from(payees).sort();
-        setAllCompanies(cc);
-        setAllClaims(tt);
-        setAllPayees(pp);
-
-        // mappings
-        const byClaimForCo: Record<string, Set<string>> = {};
-        const byCoForClaim: Record<string, Set<string>> = {};
-        list.forEach((r) => {
-          const co = toTitle(r.company);
-          const cl = toTitle(r.claim_type);
-          if (co) {
-            byClaimForCo[co] = byClaimForCo[co] || new Set<string>();
-            if (cl) byClaimForCo[co].add(cl);
-          }
-          if (cl) {
-            byCoForClaim[cl] = byCoForClaim[cl] || new Set<string>();
-            if (co) byCoForClaim[cl].add(co);
-          }
+        const data = await httpGet<StatsResponse>(ENDPOINTS.stats, {
+          limit: "5000",
         });
-        const map1: Record<string, string[]> = {};
-        const map2: Record<string, string[]> = {};
-        Object.entries(byClaimForCo).forEach(
-          ([k, v]) => (map1[k] = Array.from(v).sort())
-        );
-        Object.entries(byCoForClaim).forEach(
-          ([k, v]) => (map2[k] = Array.from(v).sort())
-        );
-        setClaimsByCompany(map1);
-        setCompaniesByClaim(map2);
+        setAllCompanies(statsKeys(data.by_company));
+        setAllClaims(statsKeys(data.by_claim_type));
+        setAllPayees(statsKeys(data.by_pay_to));
       } catch (e) {
         console.error(e);
       } finally {
@@ -407,6 +397,35 @@ export default function Insurance() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
+  /* context filter options (claim types of a company / companies of a claim type) */
+  useEffect(() => {
+    if (ctxMode === "company" && fCompany && !claimsByCompany[fCompany]) {
+      httpGet<StatsResponse>(ENDPOINTS.stats, { company: fCompany, limit: "500" })
+        .then((data) =>
+          setClaimsByCompany((m) => ({
+            ...m,
+            [fCompany]: statsKeys(data.by_claim_type),
+          }))
+        )
+        .catch(() => {
+          /* noop */
+        });
+    }
+    if (ctxMode === "claim" && fClaim && !companiesByClaim[fClaim]) {
+      httpGet<StatsResponse>(ENDPOINTS.stats, { claim_type: fClaim, limit: "500" })
+        .then((data) =>
+          setCompaniesByClaim((m) => ({
+            ...m,
+            [fClaim]: statsKeys(data.by_company),
+          }))
+        )
+        .catch(() => {
+          /* noop */
+        });
+    }
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [ctxMode, fCompany, fClaim]);
+
   /* outside click: suggestions */
   useEffect(() => {
     const onDoc = (e: MouseEvent) => {
@@ -435,6 +454,7 @@ export default function Insurance() {
       claim_type?: string;
       date?: string;
       hasSearched?: boolean;
+      page?: number;
     };
   }) {
     try {
@@ -450,28 +470,28 @@ export default function Insurance() {
       if (o?.claim_type ?? fClaim)
         params.claim_type = (o?.claim_type ?? fClaim)!;
       if (o?.date ?? date) params.date = (o?.date ?? date)!;
+      // amount/recency are sorted by the server across all pages
+      if (prioMode === "amount") {
+        params.sort = "net_amount";
+        params.order = "desc";
+      } else if (prioMode === "recency") {
+        params.sort = "date";
+        params.order = "desc";
+      }
+      params.page = String(o?.page ?? page);
+      params.page_size = String(pageSize);
 
       const data = await httpFetch(params);
-      // sorting & range apply on the UI level for cards
+      setTotalClaims(data.total_claims ?? 0);
+      // urgency & range apply on the UI level to the current page
       let list = (data.records || []).slice();
 
       // priority ordering (for cards)
-      if (prioMode !== "none") {
-        const score = (r: InsRow) => {
-          if (prioMode === "urgency")
-            return (
-              ((r.emer_ind || "").toUpperCase() === "Y" ? 2 : 0) +
-              ((r.refer_ind || "").toUpperCase() === "Y" ? 1 : 0)
-            );
-          if (prioMode === "amount") return Number(r.net_amount || 0);
-          // recency
-          return (r.treatment_date || "").localeCompare("");
-        };
-        list.sort((a, b) =>
-          prioMode === "recency"
-            ? (b.treatment_date || "").localeCompare(a.treatment_date || "")
-            : score(b) - score(a)
-        );
+      if (prioMode === "urgency") {
+        const score = (r: InsRow) =>
+          ((r.emer_ind || "").toUpperCase() === "Y" ? 2 : 0) +
+          ((r.refer_ind || "").toUpperCase() === "Y" ? 1 : 0);
+        list.sort((a, b) => score(b) - score(a));
       }
 
       // net range filter (when user typed any)
@@ -515,18 +535,20 @@ export default function Insurance() {
         params.claim_type = (o?.claim_type ?? fClaim)!;
       if (o?.date ?? date) params.date = (o?.date ?? date)!;
 
-      const data = await httpFetch(params);
-      setChartRows(data.records || []);
+      params.limit = "500";
+      const data = await httpGet<StatsResponse>(ENDPOINTS.stats, params);
+      setChartStats(data);
     } catch {
       /* noop */
     }
   }
 
-  // re-fetch when filters change
+  // re-fetch when filters change (back to the first page)
   useEffect(() => {
     fetchChartData();
+    setPage(1);
     // only fetch cards if currently shown
-    if (showCards) fetchData();
+    if (showCards) fetchData({ override: { page: 1 } });
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [
     fCompany,
@@ -541,6 +563,13 @@ export default function Insurance() {
     showCards,
   ]);
 
+  function goToPage(next: number) {
+    setPage(next);
+    fetchData({ override: { page: next } });
+  }
+
+  const pageCount = Math.max(1, Math.ceil(totalClaims / pageSize));
+
   /* Context builder */
   useEffect(() => {
     if (!hasSearched) {
@@ -635,9 +664,8 @@ export default function Insurance() {
       if (fClaim) params.claim_type = fClaim;
       if (date) params.date = date;
 
-      // نجلب نفس البيانات حسب الفلاتر الحالية
-      const data = await httpFetch(params);
-      const list = data.records || [];
+      // كل النتائج المفلترة من /insurance/export (وليس الصفحة المعروضة فقط)
+      const list = await httpGetNdjson<InsRow>(ENDPOINTS.export, params);
 
       if (!list.length) {
         alert("لا توجد بيانات لتصديرها بناءً على التصفية أو البحث الحالي.");
@@ -709,34 +737,14 @@ export default function Insurance() {
   }, [chartMode, hasSearched]);
 
   const chartData = useMemo(() => {
-    const base =
-      fCompany || fClaim || date ? rows : chartRows.length ? chartRows : rows;
-    const by: Record<string, number> = {};
-    if (chartMode === "byClaimForCompany") {
-      base.forEach((r) => {
-        if (!coMatches(r.company || "", fCompany)) return;
-        const key = toTitle(r.claim_type || "").trim();
-        if (!key || key.toLowerCase() === "nan") return;
-        by[key] = (by[key] ?? 0) + 1;
-      });
-    } else if (chartMode === "byCompanyForClaim") {
-      base.forEach((r) => {
-        if (nrm(r.claim_type || "") !== nrm(fClaim)) return;
-        const key = toTitle(r.company || "").trim();
-        if (!key || key.toLowerCase() === "nan") return;
-        by[key] = (by[key] ?? 0) + 1;
-      });
-    } else {
-      base.forEach((r) => {
-        const key = toTitle(r.company || "");
-        if (!key || key.toLowerCase() === "nan") return;
-        by[key] = (by[key] ?? 0) + 1;
-      });
-    }
-    return Object.entries(by)
-      .map(([label, count]) => ({ label, count }))
-      .sort((a, b) => b.count - a.count);
-  }, [rows, chartRows, fCompany, fClaim, date, chartMode]);
+    const items =
+      chartMode === "byClaimForCompany"
+        ? chartStats?.by_claim_type
+        : chartStats?.by_company;
+    return (items || [])
+      .filter((s) => s.key && s.key.toLowerCase() !== "nan")
+      .map((s) => ({ label: s.key, count: s.records }));
+  }, [chartStats, chartMode]);
 
   const yMeta = useMemo(() => {
     const max = chartData.reduce((m, c) => Math.max(m, c.count), 0);
@@ -755,12 +763,6 @@ export default function Insurance() {
     return "عدد المطالبات لكل شركة";
   }, [chartMode, fCompany, fClaim]);
 
-  // KPI figures
-  const kpiRows = useMemo(
-    () => (fCompany || fClaim || hasSearched ? rows : chartRows),
-    [rows, chartRows, fCompany, fClaim, hasSearched]
-  );
-
   /* ===================== Render ===================== */
   return (
     <div className="min-h-screen" style={{ background: pageBg }}>
@@ -934,7 +936,7 @@ export default function Insurance() {
               <X className="size-4" /> <span className="text-sm">{err}</span>
             </div>
           )}
-          {(!firstLoadDone || loading) && kpiRows.length === 0 ? (
+          {(!firstLoadDone || loading) && !chartStats ? (
             <div className="mt-6 grid gap-4">
               <div className="h-20 bg-white rounded-2xl animate-pulse" />
               <div className="h-80 bg-white rounded-2xl animate-pulse" />
@@ -946,19 +948,19 @@ export default function Insurance() {
           <div className="mt-6 grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-4 relative z-0">
             <KpiCard
               title="عدد المطالبات"
-              value={kpiRows.length}
+              value={chartStats?.total_claims ?? 0}
               color="#3B82F6"
               icon={<ClipboardList />}
             />
             <KpiCard
               title="عدد الشركات"
-              value={new Set(kpiRows.map((r) => toTitle(r.company))).size}
+              value={chartStats?.total_companies ?? 0}
               color="#D97706"
               icon={<UserPlus />}
             />
             <KpiCard
               title="عدد المستفيدين"
-              value={new Set(kpiRows.map((r) => toTitle(r.pay_to))).size}
+              value={chartStats?.by_pay_to_total ?? 0}
               color="#E05252"
               icon={<Users />}
             />
@@ -1214,6 +1216,31 @@ export default function Insurance() {
               />
             </div>
 
+            {/* server-side pages */}
+            <div className="flex items-center gap-2">
+              <button
+                onClick={() => goToPage(Math.max(1, page - 1))}
+                disabled={page <= 1 || loading}
+                className="h-10 px-4 rounded-full text-sm border bg-white hover:bg-black/5 transition disabled:opacity-50"
+                style={{ borderColor: ui.selectBorder }}
+                title="الصفحة السابقة"
+              >
+                السابق
+              </button>
+              <span className="text-sm tabular-nums" style={{ color: ui.hint }}>
+                صفحة {page} من {pageCount}
+              </span>
+              <button
+                onClick={() => goToPage(Math.min(pageCount, page + 1))}
+                disabled={page >= pageCount || loading}
+                className="h-10 px-4 rounded-full text-sm border bg-white hover:bg-black/5 transition disabled:opacity-50"
+                style={{ borderColor: ui.selectBorder }}
+                title="الصفحة التالية"
+              >
+                التالي
+              </button>
+            </div>
+
             <div className="ml-auto flex items-center gap-2">
               {!showCards ? (
                 <button
@@ -1259,9 +1286,7 @@ export default function Insurance() {
                   لا توجد بيانات مطابقة — غيّري التاريخ أو البحث.
                 </div>
               ) : (
-                rows
-                  .slice(0, pageSize)
-                  .map((r, i) => <RecordCard key={`${r.inv_no}-${i}`} r={r} />)
+                rows.map((r, i) => <RecordCard key={`${r.inv_no}-${i}`} r={r} />)
               )}
             </div>
           )}
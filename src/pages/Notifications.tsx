@@ -211,6 +211,15 @@ export default function Notifications() {
           /* ignore */
         }
       };
+      // السيرفر لم يعد يملك كل ما فاتنا أثناء الانقطاع: نعيد تحميل القائمة مرة واحدة
+      es.addEventListener("resync", async () => {
+        try {
+          const data = await httpGet<Noti[]>(ENDPOINTS.list);
+          setItems(data || []);
+        } catch {
+          /* ignore */
+        }
+      });
       es.onerror = () => {
         // ممكن لاحقاً نعمل retry
       };